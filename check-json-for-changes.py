@@ -1,529 +1,733 @@
-import os
-import glob
-import json
-import csv
+import time
+import argparse
 import urllib.parse
 import urllib.request
 import urllib.error
 
-dir_name = input("Which directory would you like to check? [data formats], [datasets], [both] ")
+from dats_http import fetch_all
+from dats_cache import ResponseCache
+from dats_json_parser import API_URL, CONTENTS_URL, stream_contents
+import dats_decode
+import dats_diff
+import dats_metrics
+import dats_replay
+import dats_snapshot_store
 
+METADATA_PATH = "/identifiers/metadata?identifier="
+METADATA_API_URL = API_URL + METADATA_PATH
+HEADER = {"Accept": "application/json"}
 
-if dir_name == "datasets":
-    current_dir = os.listdir(".")
+# Number of metadata requests kept in flight at once
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = 30
+FETCH_RETRIES = 3
 
-    for sub_dir in current_dir:
-        if "dats-info" in sub_dir:
-            sub_dir = sub_dir + "/*"
-            file_list = glob.glob(sub_dir)
-            latest_f = max(file_list, key=os.path.getmtime)
+# Metadata responses are cached on disk and revalidated with the server once they are older than CACHE_TTL seconds.
+# With CACHE_OFFLINE set, only cached responses are used and the API is never called.
+CACHE_DIR = ".dats-cache"
+CACHE_TTL = 24 * 60 * 60
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_OFFLINE = False
 
-            with open(latest_f, encoding="latin-1") as t_name:
-                reader = csv.DictReader(t_name, dialect="excel-tab")
-                print("Pulling information from ", sub_dir, "...")
+# Records that haven't been released are harvested with this in place of their identifier
+UNRELEASED_IDENTIFIER = "identifier will be created at time of release"
 
-                for row in reader:
+# Every harvest in the *-dats-info directories is imported into this store, and the newest one of each category is
+# the baseline that gets checked.
+SNAPSHOT_STORE = dats_snapshot_store.DEFAULT_STORE
+
+
+def metadata_url(id_stored):
+    """Builds the metadata API URL for a stored identifier."""
+
+    return METADATA_API_URL + urllib.parse.quote(id_stored, safe="")
+
+
+def normalize_row(row):
+    """Renames the camelCase columns of older snapshots to the names write_to_file uses today (see
+    dats_diff.COLUMN_ALIASES), so rows from every harvest are checked under the same names.
+    """
+
+    return {dats_diff.COLUMN_ALIASES.get(name, name): value for name, value in row.items()}
+
+
+def row_identifier(row):
+    """Returns the identifier stored in a snapshot row under any of dats_snapshot_store.IDENTIFIER_COLUMNS, or None
+    if the row has none.
+    """
+
+    for column in dats_snapshot_store.IDENTIFIER_COLUMNS:
+        if row.get(column) and row[column] != "null":
+            return row[column]
+    return None
+
+
+def checked_identifier(row):
+    """Returns the identifier a snapshot row is looked up and checked by, or None if it can't be: the row has no
+    identifier, or the placeholder of a record that hasn't been released. The metadata is fetched for the same rows
+    that are checked, so both go through this.
+    """
+
+    id_stored = row_identifier(row)
+    if id_stored == UNRELEASED_IDENTIFIER:
+        return None
+    return id_stored
+
+
+def stored_identifiers(rows):
+    """Lists the identifiers of a snapshot's rows that can be looked up (see checked_identifier)."""
+
+    identifiers = list()
+
+    for row in rows:
+        id_stored = checked_identifier(row)
+        if id_stored is not None:
+            identifiers.append(id_stored)
+    return identifiers
+
+
+def prefetch_metadata(rows):
+    """Fetches the current DATS for every identifier in a snapshot concurrently and returns a dictionary that maps
+    each metadata URL to a (data, error) pair.
+    """
+
+    urls = [metadata_url(id_stored) for id_stored in stored_identifiers(rows)]
+
+    # Recording and replaying skip the response cache, so every request reaches the fixture archive
+    cache = None
+    if dats_replay.ACTIVE is None:
+        cache = ResponseCache(CACHE_DIR, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES, offline=CACHE_OFFLINE)
+    with dats_metrics.stage("fetch"):
+        fetched = fetch_all(urls, HEADER, max_workers=FETCH_WORKERS, timeout=FETCH_TIMEOUT, retries=FETCH_RETRIES,
+                            cache=cache)
+    dats_metrics.count("fetched", len(urls))
+    dats_metrics.count("fetch_errors", sum(error is not None for data, error in fetched.values()))
+    return fetched
+
+
+def load_contents(source=CONTENTS_URL):
+    """Fetches the contents payload once and returns a dictionary that maps the identifier of every record in it to
+    the record's DATS, which is what the metadata API returns for that identifier. If two records share an
+    identifier, the first one is kept.
+    """
+
+    contents = dict()
+    with dats_metrics.stage("contents"):
+        for element in stream_contents(source, HEADER):
+            try:
+                identifier = element["content"]["identifier"]["identifier"]
+            except (KeyError, TypeError):
+                continue
+            if identifier in contents:
+                dats_metrics.count("duplicate_identifiers")
+            else:
+                contents[identifier] = element["content"]
+    dats_metrics.count("contents_records", len(contents))
+    return contents
+
+
+def lookup_metadata(rows, contents):
+    """Looks up the DATS of every identifier in a snapshot in a map built by load_contents() and returns the same
+    dictionary as prefetch_metadata(). An identifier that isn't in the contents gets the 404 HTTPError the metadata
+    API would answer with.
+    """
+
+    fetched = dict()
+    for id_stored in stored_identifiers(rows):
+        url = metadata_url(id_stored)
+        if id_stored in contents:
+            fetched[url] = (contents[id_stored], None)
+        else:
+            fetched[url] = (None, urllib.error.HTTPError(url, 404, "Not Found", None, None))
+    dats_metrics.count("fetched", len(fetched))
+    dats_metrics.count("fetch_errors", sum(error is not None for data, error in fetched.values()))
+    return fetched
+
+
+def get_metadata(rows):
+    """Returns the current DATS of every identifier in a snapshot, from the contents payload in batch mode and from
+    the metadata API otherwise.
+    """
+
+    if batch_contents is not None:
+        return lookup_metadata(rows, batch_contents)
+    return prefetch_metadata(rows)
+
+
+arg_parser = argparse.ArgumentParser(description="Checks the newest harvest of each category against the current DATS "
+                                                 "in the MDC.")
+arg_parser.add_argument("--check", choices=["data formats", "datasets", "both"],
+                        help="which snapshots to check; asked for interactively if left out")
+arg_parser.add_argument("--batch", action="store_true",
+                        help="fetch the contents payload once and check every row against it, instead of requesting "
+                             "each identifier's metadata")
+arg_parser.add_argument("--api", default=API_URL, metavar="URL",
+                        help="base URL of the MDC deployment to check against (default: %(default)s)")
+arg_parser.add_argument("--contents", metavar="SOURCE",
+                        help="contents API URL, or the path of a saved contents response, for --batch (default: the "
+                             "contents endpoint of --api)")
+arg_parser.add_argument("--metrics", nargs="?", const="-", metavar="FILE",
+                        help="time the import, fetch, and compare stages and count what was checked; written to FILE "
+                             "at the end of the run, or to stderr")
+arg_parser.add_argument("--metrics-format", choices=["json", "prometheus"], default="json")
+arg_parser.add_argument("--json-decoder", choices=["auto"] + sorted(dats_decode.DECODERS), default="json",
+                        help="JSON decoder for metadata responses; 'auto' uses orjson when it is installed")
+fixture_options = arg_parser.add_mutually_exclusive_group()
+fixture_options.add_argument("--record", metavar="FIXTURES",
+                             help="save every metadata response into this fixture archive, e.g. dats-fixtures.sqlite")
+fixture_options.add_argument("--replay", metavar="FIXTURES",
+                             help="serve every metadata response from this fixture archive instead of the network")
+arg_parser.add_argument("--replay-latency", type=float, default=0.0, metavar="SECONDS",
+                        help="with --replay, wait this long before serving each response (default: 0)")
+args = arg_parser.parse_args()
+METADATA_API_URL = args.api.rstrip("/") + METADATA_PATH
+if args.contents is None:
+    args.contents = args.api.rstrip("/") + "/contents"
+dats_decode.use_decoder(args.json_decoder)
+if args.record:
+    dats_replay.record(args.record)
+elif args.replay:
+    dats_replay.replay(args.replay, args.replay_latency)
+metrics = dats_metrics.enable() if args.metrics else None
+
+dir_name = args.check
+if dir_name is None:
+    dir_name = input("Which directory would you like to check? [data formats], [datasets], [both] ")
+
+
+batch_contents = None
+if args.batch:
+    print("Pulling information from", args.contents, "...")
+    batch_contents = load_contents(args.contents)
+
+store = dats_snapshot_store.open_store(SNAPSHOT_STORE)
+with dats_metrics.stage("import_history"):
+    dats_snapshot_store.import_history(store, ".")
+
+if dir_name in ("datasets", "both"):
+    for category in dats_snapshot_store.categories(store):
+        if category != "data-formats":
+            print("Pulling information from ", category, dats_snapshot_store.latest_harvest(store, category), "...")
+            rows = [normalize_row(row) for row in dats_snapshot_store.harvest_rows(store, category)]
+            with dats_metrics.stage(category):
+                fetched = get_metadata(rows)
+            dats_metrics.count("checked", len(rows), category=category)
+            compare_start = time.perf_counter()
+
+            for row in rows:
+                id_stored = checked_identifier(row)
+                if id_stored is None:
+                    if row_identifier(row) is None:
+                        dats_metrics.count("missing_identifier", category=category)
+                        print("No identifier stored for ", row.get("title"), " in ", category)
+                    continue
+                try:
+                    data, error = fetched[metadata_url(id_stored)]
+                    if error is not None:
+                        raise error
+
+                    # Check identifier
                     try:
-                        id_stored = row["datasetIdentifier"]
-                        if id_stored == "identifier will be created at time of release" : continue
-                        formatted_id = urllib.parse.quote(id_stored, safe="")
-                        metadata_api_url = "http://betaweb.rods.pitt.edu:80/digital-commons-dev/api/v1/identifiers/metadata?identifier="
-                        header = {"Accept": "application/json"}
-                        url = metadata_api_url + formatted_id
-
-                        r = urllib.request.Request(url, headers=header)
-                        rhand = urllib.request.urlopen(r)
-                        convert_to_string = rhand.read().decode("latin-1")
-                        data = json.loads(convert_to_string)
-
-                        # Check identifier
-                        try:
-                            id_json = data["identifier"]["identifier"]
-
-                            if id_json != id_stored:
-                                print("identifier_current: ", id_json, " /// ",
-                                      "identifier_stored: ", id_stored, " /// ")
-                        except KeyError:
-                            print("Identifier ", id_stored, " not found.")
-
-                        # Check title
-                        try:
-                            title_json = data["title"]
-                            title_stored = row["title"]
-
-                            if title_json != title_stored:
-                                print("title_current: ", title_json, " /// ",
-                                      "title_stored: ", title_stored, " /// ",
-                                      "identifier: ", id_stored)
-                        except KeyError:
-                            print("Title not found for ", id_stored)
-
-                        # Check description
-                        try:
-                            description_json = data["description"]
-                            description_stored = row["description"]
+                        id_json = data["identifier"]["identifier"]
 
-                            if description_json != description_stored:
-                                print("description_current: ", description_json, " /// ",
-                                      "description_stored: ", description_stored, " /// ",
-                                      "identifier: ", id_stored)
-                        except KeyError:
-                            print("Description not found for ", id_stored)
-
-                        # Check disease name
-                        try:
-                            disease_json = ""
-                            for attr in data["isAbout"]:
-                                if attr["identifier"]["identifierSource"] == "https://biosharing.org/bsg-s000098":
-                                    disease_json = attr["name"]
-                            if not disease_json:
-                                disease_json = "null"
-
-                            disease_stored = row["disease"]
-
-                            if not disease_stored:
-                                disease_stored = "null"
-
-                            if disease_json != disease_stored:
-                                print("disease_name_current: ", disease_json, " /// ",
-                                      "disease_name_stored: ", disease_stored, " /// ",
-                                      "identifier: ", id_stored)
-                        except KeyError:
-                            print("Disease name not found for ", id_stored)
-
-                        # Check authors
-                        try:
-                            author_list = list()
-                            authors_json = ""
-                            authors_stored = row["authors"]
-                            s = ", "
-
-                            for a in data["creators"]:
-                                last = a["lastName"]
-                                first = a["firstName"]
-
-                                if last or first:
-                                    full_name = first + " " + last
-                                    author_list.append(full_name)
-
-                            if not author_list:
-                                authors_json = "null"
-                            else:
-                                authors_json = s.join(author_list)
-
-                                if authors_json != authors_stored:
-                                    print("authors_current: ", authors_json, " /// ",
-                                          "authors_stored: ", authors_stored, " /// ",
-                                          "identifier: ", id_stored)
-                        except KeyError:
-                            print("Author list not found for ", id_stored)
-
-                        # Check dates created, modified, and accessed
-                        try:
-                            created_json = ""
-                            modified_json = ""
-                            accessed_json = ""
-                            created_stored = row["created"]
-                            modified_stored = row["modified"]
-                            accessed_stored = row["accessed"]
-
-                            for d in data["distributions"]:
-                                if not d["dates"]:
-                                    created_json = "null"
-                                    modified_json = "null"
-                                    accessed_json = "null"
-                                else:
-                                    for e in d["dates"]:
-                                        if e["type"]["value"] == "creation":
-                                            created_json = e["date"]
-                                        if e["type"]["value"] == "modified":
-                                            modified_json = e["date"]
-                                        if e["type"]["value"] == "accessed":
-                                            accessed_json = e["date"]
-
-                            if not created_json:
-                                created_json = "null"
-                            if not modified_json:
-                                modified_json = "null"
-                            if not accessed_json:
-                                accessed_json = "null"
+                        if id_json != id_stored:
+                            print("identifier_current: ", id_json, " /// ",
+                                  "identifier_stored: ", id_stored, " /// ")
+                    except KeyError:
+                        print("Identifier ", id_stored, " not found.")
 
-                            if created_json != created_stored:
-                                print("created_date_current:", created_json, "///",
-                                      "created_date_stored:", created_stored, "///",
-                                      "identifier:", id_stored)
-                        except KeyError:
-                            print("Creation, modification, and access dates not found for ", id_stored)
-
-                        # Check landing page
-                        try:
-                            landing_page_json = data["distributions"][0]["access"]["landingPage"]
-                            landing_page_stored = row["landingPage"]
-
-                            if landing_page_json != landing_page_stored:
-                                print("landing_page_current:", landing_page_json, " /// ",
-                                      "landing_page_stored:", landing_page_stored, " /// ",
-                                      "identifier:", id_stored)
-                        except KeyError:
-                            print("Landing page not found for ", id_stored)
-
-                        # Check access page
-                        try:
-                            access_page_json = data["distributions"][0]["access"]["accessURL"]
-                            access_page_stored = row["accessPage"]
-
-                            if access_page_json != access_page_stored:
-                                print("access_page_current:", access_page_json, " /// ",
-                                      "access_page_stored:", access_page_stored, " /// ",
-                                      "identifier:", id_stored)
-                        except KeyError:
-                            print("Access page not found for ", id_stored)
-
-                        # Check format
-                        try:
-                            s = ", "
-                            format_json = s.join(data["distributions"][0]["formats"])
-                            format_stored = row["format"]
-
-                            if not format_json:
-                                format_json = "null"
-
-                            if format_json != format_stored:
-                                print("format_current:", format_json, " /// ",
-                                      "format_stored:", format_stored, " /// ",
-                                      "identifier:", id_stored)
-                        except KeyError:
-                            if format_stored == "null":
-                                format_json = "null"
-                            elif format_json == format_stored : continue
-                            else:
-                                print("Format(s) not found for ", id_stored)
-
-                        # Check schema
-                        try:
-                            schema_json = data["distributions"][0]["conformsTo"][0]["name"]
-                            schema_stored = row["conformsTo"]
-
-                            if schema_json != schema_stored:
-                                print("schema_current:", schema_json, " /// ",
-                                      "schema_stored:", schema_stored, " /// ",
-                                      "identifier:", id_stored)
-                        except KeyError:
-                            print("Schema not found for ", id_stored)
-
-                        # Check license
-                        try:
-                            license_json = ""
-                            license_stored = row["license"]
-
-                            if not data["licenses"]:
-                                license_json = "null"
-                            else:
-                                for license in data["licenses"]:
-                                    if not license["name"]:
-                                        license_json = "null"
-                                    else:
-                                        license_json = license["name"]
-
-                            if license_json != license_stored:
-                                print("liense_current:", license_json, " /// ",
-                                      "license_stored:", license_stored, " /// ",
-                                      "identifier:", id_stored)
-                        except KeyError:
-                            if license_stored == "null":
-                                license_json = "null"
-                            else:
-                                print("License not found for ", id_stored)
+                    # Check title
+                    try:
+                        title_json = data["title"]
+                        title_stored = row["title"]
 
-                        # Check geography
-                        try:
-                            geo_lst = list()
-                            geo_json = ""
-                            geo_stored = row["geography"]
-                            s = ", "
+                        if title_json != title_stored:
+                            print("title_current: ", title_json, " /// ",
+                                  "title_stored: ", title_stored, " /// ",
+                                  "identifier: ", id_stored)
+                    except KeyError:
+                        print("Title not found for ", id_stored)
 
-                            if not data["spatialCoverage"]:
-                                geo_json = "null"
+                    # Check description
+                    try:
+                        description_json = data["description"]
+                        description_stored = row["description"]
 
-                            for region in data["spatialCoverage"]:
-                                if not region["name"] : continue
-                                else:
-                                    geo_lst.append(region["name"])
+                        if description_json != description_stored:
+                            print("description_current: ", description_json, " /// ",
+                                  "description_stored: ", description_stored, " /// ",
+                                  "identifier: ", id_stored)
+                    except KeyError:
+                        print("Description not found for ", id_stored)
 
-                            if not geo_lst:
-                                geo_json = "null"
-                            else:
-                                geo_json = s.join(geo_lst)
+                    # Check disease name
+                    try:
+                        disease_json = ""
+                        for attr in data["isAbout"]:
+                            if attr["identifier"]["identifierSource"] == "https://biosharing.org/bsg-s000098":
+                                disease_json = attr["name"]
+                        if not disease_json:
+                            disease_json = "null"
+
+                        disease_stored = row["disease"]
+
+                        if not disease_stored:
+                            disease_stored = "null"
+
+                        if disease_json != disease_stored:
+                            print("disease_name_current: ", disease_json, " /// ",
+                                  "disease_name_stored: ", disease_stored, " /// ",
+                                  "identifier: ", id_stored)
+                    except KeyError:
+                        print("Disease name not found for ", id_stored)
+
+                    # Check authors
+                    try:
+                        author_list = list()
+                        authors_json = ""
+                        authors_stored = row["authors"]
+                        s = ", "
 
-                            if geo_json != geo_stored:
-                                print("geo_current:", geo_json, " /// ",
-                                      "geo_stored:", geo_stored, " /// ",
-                                      "identifier:", id_stored)
-                        except KeyError:
-                            print("Geographical regions not found for ", id_stored)
+                        for a in data["creators"]:
+                            last = a["lastName"]
+                            first = a["firstName"]
 
-                        # Check Apollo location code
-                        alc_json = ""
-                        alc_stored = row["apolloLocationCode"]
+                            if last or first:
+                                full_name = first + " " + last
+                                author_list.append(full_name)
 
-                        if not data["spatialCoverage"]:
-                            alc_json = "null"
+                        if not author_list:
+                            authors_json = "null"
                         else:
-                            for s in data["spatialCoverage"]:
-                                if not s["identifier"]:
-                                    alc_json = "null"
-                                elif not s["identifier"]["identifier"]:
-                                    alc_json = "null"
-                                else:
-                                    alc_json = s["identifier"]["identifier"]
+                            authors_json = s.join(author_list)
 
-                        if alc_json != alc_stored:
-                            print("apollo_location_code_current:", alc_json, " /// ",
-                                  "apollo_location_code_stored:", alc_stored, " /// ",
-                                  "identifier:", id_stored)
+                            if authors_json != authors_stored:
+                                print("authors_current: ", authors_json, " /// ",
+                                      "authors_stored: ", authors_stored, " /// ",
+                                      "identifier: ", id_stored)
+                    except KeyError:
+                        print("Author list not found for ", id_stored)
 
-                        # Check ISO location codes
-                        try:
-                            iso3166_json = ""
-                            iso3166_1_json = ""
-                            iso3166a3_json = ""
-                            iso3166_stored = row["ISO_3166"]
-                            iso3166_1_stored = row["ISO_3166-1"]
-                            iso3166a3_stored = row["ISO_3166-1_alpha-3"]
-
-                            if not data["spatialCoverage"]:
-                                iso3166a3_json = "null"
-                                iso3166_1_json = "null"
-                                iso3166_json = "null"
+                    # Check dates created, modified, and accessed
+                    try:
+                        created_json = ""
+                        modified_json = ""
+                        accessed_json = ""
+                        created_stored = row["created"]
+                        modified_stored = row["modified"]
+                        accessed_stored = row["accessed"]
+
+                        for d in data["distributions"]:
+                            if not d["dates"]:
+                                created_json = "null"
+                                modified_json = "null"
+                                accessed_json = "null"
                             else:
-                                for identifier in data["spatialCoverage"]:
-                                    if not identifier["alternateIdentifiers"]:
-                                        iso3166a3_json = "null"
-                                        iso3166_1_json = "null"
-                                        iso3166_json = "null"
-                                    else:
-                                        for code in identifier["alternateIdentifiers"]:
-                                            if code["identifierSource"] == "ISO 3166-1 alpha-3":
-                                                iso3166a3_json = code["identifier"]
-                                            if code["identifierSource"] == "ISO 3166-1":
-                                                iso3166_1_json = code["identifier"]
-                                            if code["identifierSource"] == "ISO 3166":
-                                                iso3166_json = code["identifier"]
-
-                                    if not iso3166a3_json:
-                                        iso3166a3_json = "null"
-                                    if not iso3166_1_json:
-                                        iso3166_1_json = "null"
-                                    if not iso3166_json:
-                                        iso3166_json = "null"
-
-                            if iso3166a3_json != iso3166a3_stored:
-                                print("iso_3166_1_alpha_3_current:", iso3166a3_json, " /// ",
-                                      "iso_3166_1_alpha_3_stored:", iso3166a3_stored, " /// ",
-                                      "identifier:", id_stored)
-                            if iso3166_1_json != iso3166_1_stored:
-                                print("iso_3166_1_current:", iso3166_1_json, " /// ",
-                                      "iso_3166_1_stored:", iso3166_1_stored, " /// ",
-                                      "identifier:", id_stored)
-                            if iso3166_json != iso3166_stored:
-                                print("iso_3166_current:", iso3166_json, " /// ",
-                                      "iso_3166_stored:", iso3166_stored, " /// ",
-                                      "identifier:", id_stored)
-                        except KeyError:
-                            print("ISO-3166, ISO3166-1, and ISO-3166-1 alpha-3 codes not found for: ", id_stored)
-
-
-                    except : continue
-
-if dir_name == "data formats":
-    current_dir = os.listdir(".")
-
-    for sub_dir in current_dir:
-        if "data-formats" in sub_dir:
-            sub_dir = sub_dir + "/*"
-            file_list = glob.glob(sub_dir)
-            latest_f = max(file_list, key=os.path.getmtime)
-
-            with open(latest_f) as t_name:
-                reader = csv.DictReader(t_name, dialect="excel-tab")
-                print("Pulling information from data-formats-info/...")
-
-                for row in reader:
+                                for e in d["dates"]:
+                                    if e["type"]["value"] == "creation":
+                                        created_json = e["date"]
+                                    if e["type"]["value"] == "modified":
+                                        modified_json = e["date"]
+                                    if e["type"]["value"] == "accessed":
+                                        accessed_json = e["date"]
+
+                        if not created_json:
+                            created_json = "null"
+                        if not modified_json:
+                            modified_json = "null"
+                        if not accessed_json:
+                            accessed_json = "null"
+
+                        if created_json != created_stored:
+                            print("created_date_current:", created_json, "///",
+                                  "created_date_stored:", created_stored, "///",
+                                  "identifier:", id_stored)
+                    except KeyError:
+                        print("Creation, modification, and access dates not found for ", id_stored)
+
+                    # Check landing page
                     try:
-                        id_stored = row["identifier"]
-                        formatted_id = urllib.parse.quote(id_stored, safe="")
-                        metadata_api_url = "http://betaweb.rods.pitt.edu:80/digital-commons-dev/api/v1/identifiers/metadata?identifier="
-                        header = {"Accept": "application/json"}
-                        url = metadata_api_url + formatted_id
-
-                        r = urllib.request.Request(url, headers=header)
-                        rhand = urllib.request.urlopen(r)
-                        convert_to_string = rhand.read().decode("latin-1")
-                        data = json.loads(convert_to_string)
-
-                        # Check identifier
-                        try:
-                            id_json = data["identifier"]["identifier"]
-
-                            if id_json != id_stored:
-                                print("identifier_current: ", id_json, " /// ",
-                                      "identifier_stored: ", id_stored, " /// ")
-                        except KeyError:
-                            print("Identifier", id_stored, " not found.")
-
-                        # Check name
-                        name_json = data["name"]
-                        name_stored = row["name"]
-
-                        if name_json != name_stored:
-                            print("name_current:", name_json, " /// ",
-                                  "name_stored:", name_stored, " /// ",
+                        landing_page_json = data["distributions"][0]["access"]["landingPage"]
+                        landing_page_stored = row["landing_page"]
+
+                        if landing_page_json != landing_page_stored:
+                            print("landing_page_current:", landing_page_json, " /// ",
+                                  "landing_page_stored:", landing_page_stored, " /// ",
                                   "identifier:", id_stored)
+                    except KeyError:
+                        print("Landing page not found for ", id_stored)
 
-                        # Check identifier source
-                        try:
-                            id_source_json = data["identifier"]["identifierSource"]
-                            id_source_stored = row["identifier_source"]
+                    # Check access page
+                    try:
+                        access_page_json = data["distributions"][0]["access"]["accessURL"]
+                        access_page_stored = row["access_page"]
 
-                            if id_source_json != id_source_stored:
-                                print("identifier_source_current: ", id_source_json, " /// ",
-                                      "identifier_source_stored:", id_source_stored, " /// ",
-                                      "identifier: ", id_stored)
-                        except KeyError:
-                            print("Identifier source not found for ", id_stored)
+                        if access_page_json != access_page_stored:
+                            print("access_page_current:", access_page_json, " /// ",
+                                  "access_page_stored:", access_page_stored, " /// ",
+                                  "identifier:", id_stored)
+                    except KeyError:
+                        print("Access page not found for ", id_stored)
 
-                        # Check type
-                        try:
-                            type_json = data["type"]["value"]
-                            type_stored = row["type"]
+                    # Check format
+                    format_json = ""
+                    format_stored = row["format"]
+                    try:
+                        s = ", "
+                        format_json = s.join(data["distributions"][0]["formats"])
 
-                            if not type_json:
-                                type_json = "null"
+                        if not format_json:
+                            format_json = "null"
 
-                            if type_json != type_stored:
-                                print("type_current: ", type_json, " /// ",
-                                      "type_stored: ", type_stored, " /// ",
-                                      "identifier: ", id_stored)
-                        except KeyError:
-                            print("Type not found for ", id_stored)
+                        if format_json != format_stored:
+                            print("format_current:", format_json, " /// ",
+                                  "format_stored:", format_stored, " /// ",
+                                  "identifier:", id_stored)
+                    except KeyError:
+                        if format_stored == "null":
+                            format_json = "null"
+                        elif format_json == format_stored : continue
+                        else:
+                            print("Format(s) not found for ", id_stored)
+
+                    # Check schema
+                    try:
+                        schema_json = data["distributions"][0]["conformsTo"][0]["name"]
+                        schema_stored = row["conforms_to"]
 
-                        # Check type_IRI
-                        try:
-                            type_iri_json = data["type"]["valueIRI"]
-                            type_iri_stored = row["type_IRI"]
+                        if schema_json != schema_stored:
+                            print("schema_current:", schema_json, " /// ",
+                                  "schema_stored:", schema_stored, " /// ",
+                                  "identifier:", id_stored)
+                    except KeyError:
+                        print("Schema not found for ", id_stored)
 
-                            if not type_iri_json:
-                                type_iri_json = "null"
+                    # Check license
+                    try:
+                        license_json = ""
+                        license_stored = row["license"]
 
-                            if type_iri_json != type_iri_stored:
-                                print("type_IRI_current: ", type_iri_json, " /// ",
-                                      "type_IRI_stored: ", type_iri_stored, " /// ",
-                                      "identifier: ", id_stored)
-                        except KeyError:
-                            print("Type IRI not found for ", id_stored)
+                        if not data["licenses"]:
+                            license_json = "null"
+                        else:
+                            for license in data["licenses"]:
+                                if not license["name"]:
+                                    license_json = "null"
+                                else:
+                                    license_json = license["name"]
 
-                        # Check description
-                        try:
-                            description_json = data["description"]
-                            description_stored = row["description"]
+                        if license_json != license_stored:
+                            print("liense_current:", license_json, " /// ",
+                                  "license_stored:", license_stored, " /// ",
+                                  "identifier:", id_stored)
+                    except KeyError:
+                        if row.get("license") == "null":
+                            license_json = "null"
+                        else:
+                            print("License not found for ", id_stored)
 
-                            if description_json != description_stored:
-                                print("description_current: ", description_json, " /// ",
-                                      "description_stored: ", description_stored, " /// ",
-                                      "identifier: ", id_stored)
-                        except KeyError:
-                            print("Description not found for ", id_stored)
+                    # Check geography
+                    try:
+                        geo_lst = list()
+                        geo_json = ""
+                        geo_stored = row["geography"]
+                        s = ", "
 
-                        # Check licenses
-                        try:
-                            license_json = ""
-                            license_stored = row["licenses"]
+                        if not data["spatialCoverage"]:
+                            geo_json = "null"
 
-                            if not data["licenses"]:
-                                license_json = "null"
-                            else:
-                                for license in data["licenses"]:
-                                    if not license["name"]:
-                                        license_json = "null"
-                                    else:
-                                        license_json = license["name"]
-
-                            if license_json != license_stored:
-                                print("liense_current:", license_json, " /// ",
-                                      "license_stored:", license_stored, " /// ",
-                                      "identifier:", id_stored)
-                        except KeyError:
-                            if license_stored == "null":
-                                license_json = "null"
+                        for region in data["spatialCoverage"]:
+                            if not region["name"] : continue
                             else:
-                                print("License not found for ", id_stored)
+                                geo_lst.append(region["name"])
 
-                        # Check version
-                        try:
-                            version_json = data["version"]
-                            version_stored = row["version"]
+                        if not geo_lst:
+                            geo_json = "null"
+                        else:
+                            geo_json = s.join(geo_lst)
 
-                            if not version_json:
-                                version_json = "null"
+                        if geo_json != geo_stored:
+                            print("geo_current:", geo_json, " /// ",
+                                  "geo_stored:", geo_stored, " /// ",
+                                  "identifier:", id_stored)
+                    except KeyError:
+                        print("Geographical regions not found for ", id_stored)
+
+                    # Check Apollo location code
+                    alc_json = ""
+                    alc_stored = row["apollo_location_code"]
+
+                    if not data["spatialCoverage"]:
+                        alc_json = "null"
+                    else:
+                        for s in data["spatialCoverage"]:
+                            if not s["identifier"]:
+                                alc_json = "null"
+                            elif not s["identifier"]["identifier"]:
+                                alc_json = "null"
+                            else:
+                                alc_json = s["identifier"]["identifier"]
 
-                            if version_json != version_stored:
-                                print("version_current: ", version_json, " /// ",
-                                      "version_stored: ", version_stored, " /// ",
-                                      "identifier: ", id_stored)
-                        except KeyError:
-                            print("Version not found for ", id_stored)
-
-                        # Check human_readable_data_format_specification_value
-                        try:
-                            extra_properties = data["extraProperties"]
-
-                            human_readable_value_stored = row["human-readable_data_format_specification_value"]
-                            human_readable_value_iri_stored = row["human-readable_data_format_specification_value_IRI"]
-                            machine_readable_value_stored = row["machine-readable_data_format_specification_value"]
-                            machine_readable_value_iri_stored = row["machine-readable_data_format_specification_value_IRI"]
-
-                            human_readable_value_json = ""
-                            human_readable_value_iri_json = ""
-                            machine_readable_value_json = ""
-                            machine_readable_value_iri_json = ""
-
-                            if extra_properties:
-                                for property in extra_properties:
-                                    if "human" in property["category"]:
-                                        human_readable_value_json = property["values"][0]["value"]
-                                        human_readable_value__iri_json = property["values"][0]["valueIRI"]
-                                    if "machine" in property["category"]:
-                                        machine_readable_value_json = property["values"][0]["value"]
-                                        machine_readable_value_iri_json = property["values"][0]["valueIRI"]
-
-                            if not human_readable_value_json:
-                                human_readable_value_json = "null"
-                            if not human_readable_value_iri_json:
-                                human_readable_value_iri_json = "null"
-                            if not machine_readable_value_json:
-                                machine_readable_value_json = "null"
-                            if not machine_readable_value_iri_json:
-                                machine_readable_value_iri_json = "null"
-
-                            if human_readable_value_json != human_readable_value_stored:
-                                print("human_readable_value_current: ", human_readable_value_json, " /// ",
-                                      "human_readable_value_stored: ", human_readable_value_stored, " /// ",
-                                      "identifier: ", id_stored)
-                            if human_readable_value_iri_json != human_readable_value_iri_stored:
-                                print("human_readable_value_iri_current: ", human_readable_value_iri_json, " /// ",
-                                      "human_readable_value_iri_stored: ", human_readable_value_iri_stored, " /// ",
-                                      "identifier: ", id_stored)
-                            if machine_readable_value_json != machine_readable_value_stored:
-                                print("machine_readable_value_current: ", machine_readable_value_json, " /// ",
-                                      "machine_readable_value_stored: ", machine_readable_value_stored, " /// ",
-                                      "identifier: ", id_stored)
-                            if machine_readable_value_iri_json != machine_readable_value_iri_stored:
-                                print("machine_readable_value_iri_current: ", machine_readable_value_iri_json, " /// ",
-                                      "machine_readable_value_iri_stored: ", machine_readable_value_iri_stored, " /// ",
-                                      "identifier: ", id_stored)
-                        except KeyError:
-                            print("Human- and machine-readable data format value specifications not found for ", id_stored)
+                    if alc_json != alc_stored:
+                        print("apollo_location_code_current:", alc_json, " /// ",
+                              "apollo_location_code_stored:", alc_stored, " /// ",
+                              "identifier:", id_stored)
 
+                    # Check ISO location codes
+                    try:
+                        iso3166_json = ""
+                        iso3166_1_json = ""
+                        iso3166a3_json = ""
+                        iso3166_stored = row["iso_3166"]
+                        iso3166_1_stored = row["iso_3166_1"]
+                        iso3166a3_stored = row["iso_3166_1_alpha_3"]
 
-                    except urllib.error.HTTPError:
-                        print("404 not found for ", id_stored)
\ No newline at end of file
+                        if not data["spatialCoverage"]:
+                            iso3166a3_json = "null"
+                            iso3166_1_json = "null"
+                            iso3166_json = "null"
+                        else:
+                            for identifier in data["spatialCoverage"]:
+                                if not identifier["alternateIdentifiers"]:
+                                    iso3166a3_json = "null"
+                                    iso3166_1_json = "null"
+                                    iso3166_json = "null"
+                                else:
+                                    for code in identifier["alternateIdentifiers"]:
+                                        if code["identifierSource"] == "ISO 3166-1 alpha-3":
+                                            iso3166a3_json = code["identifier"]
+                                        if code["identifierSource"] == "ISO 3166-1":
+                                            iso3166_1_json = code["identifier"]
+                                        if code["identifierSource"] == "ISO 3166":
+                                            iso3166_json = code["identifier"]
+
+                                if not iso3166a3_json:
+                                    iso3166a3_json = "null"
+                                if not iso3166_1_json:
+                                    iso3166_1_json = "null"
+                                if not iso3166_json:
+                                    iso3166_json = "null"
+
+                        if iso3166a3_json != iso3166a3_stored:
+                            print("iso_3166_1_alpha_3_current:", iso3166a3_json, " /// ",
+                                  "iso_3166_1_alpha_3_stored:", iso3166a3_stored, " /// ",
+                                  "identifier:", id_stored)
+                        if iso3166_1_json != iso3166_1_stored:
+                            print("iso_3166_1_current:", iso3166_1_json, " /// ",
+                                  "iso_3166_1_stored:", iso3166_1_stored, " /// ",
+                                  "identifier:", id_stored)
+                        if iso3166_json != iso3166_stored:
+                            print("iso_3166_current:", iso3166_json, " /// ",
+                                  "iso_3166_stored:", iso3166_stored, " /// ",
+                                  "identifier:", id_stored)
+                    except KeyError:
+                        print("ISO-3166, ISO3166-1, and ISO-3166-1 alpha-3 codes not found for: ", id_stored)
+
+
+                except urllib.error.HTTPError as e:
+                    dats_metrics.count("not_found", category=category)
+                    print(e.code, e.reason, "for ", id_stored)
+                except Exception as e:
+                    dats_metrics.count("skipped_rows", category=category)
+                    print("Could not check ", id_stored, ": ", repr(e))
+
+            dats_metrics.add_time(category + "/compare", time.perf_counter() - compare_start)
+
+if dir_name in ("data formats", "both"):
+    print("Pulling information from data-formats", dats_snapshot_store.latest_harvest(store, "data-formats"), "...")
+    rows = dats_snapshot_store.harvest_rows(store, "data-formats")
+    with dats_metrics.stage("data-formats"):
+        fetched = get_metadata(rows)
+    dats_metrics.count("checked", len(rows), category="data-formats")
+    compare_start = time.perf_counter()
+
+    for row in rows:
+        id_stored = checked_identifier(row)
+        if id_stored is None:
+            if row_identifier(row) is None:
+                dats_metrics.count("missing_identifier", category="data-formats")
+                print("No identifier stored for ", row.get("name"), " in data-formats")
+            continue
+        try:
+            data, error = fetched[metadata_url(id_stored)]
+            if error is not None:
+                raise error
+
+            # Check identifier
+            try:
+                id_json = data["identifier"]["identifier"]
+
+                if id_json != id_stored:
+                    print("identifier_current: ", id_json, " /// ",
+                          "identifier_stored: ", id_stored, " /// ")
+            except KeyError:
+                print("Identifier", id_stored, " not found.")
+
+            # Check name
+            name_json = data["name"]
+            name_stored = row["name"]
+
+            if name_json != name_stored:
+                print("name_current:", name_json, " /// ",
+                      "name_stored:", name_stored, " /// ",
+                      "identifier:", id_stored)
+
+            # Check identifier source
+            try:
+                id_source_json = data["identifier"]["identifierSource"]
+                id_source_stored = row["identifier_source"]
+
+                if id_source_json != id_source_stored:
+                    print("identifier_source_current: ", id_source_json, " /// ",
+                          "identifier_source_stored:", id_source_stored, " /// ",
+                          "identifier: ", id_stored)
+            except KeyError:
+                print("Identifier source not found for ", id_stored)
+
+            # Check type
+            try:
+                type_json = data["type"]["value"]
+                type_stored = row["type"]
+
+                if not type_json:
+                    type_json = "null"
+
+                if type_json != type_stored:
+                    print("type_current: ", type_json, " /// ",
+                          "type_stored: ", type_stored, " /// ",
+                          "identifier: ", id_stored)
+            except KeyError:
+                print("Type not found for ", id_stored)
+
+            # Check type_IRI
+            try:
+                type_iri_json = data["type"]["valueIRI"]
+                type_iri_stored = row["type_IRI"]
+
+                if not type_iri_json:
+                    type_iri_json = "null"
+
+                if type_iri_json != type_iri_stored:
+                    print("type_IRI_current: ", type_iri_json, " /// ",
+                          "type_IRI_stored: ", type_iri_stored, " /// ",
+                          "identifier: ", id_stored)
+            except KeyError:
+                print("Type IRI not found for ", id_stored)
+
+            # Check description
+            try:
+                description_json = data["description"]
+                description_stored = row["description"]
+
+                if description_json != description_stored:
+                    print("description_current: ", description_json, " /// ",
+                          "description_stored: ", description_stored, " /// ",
+                          "identifier: ", id_stored)
+            except KeyError:
+                print("Description not found for ", id_stored)
+
+            # Check licenses
+            try:
+                license_json = ""
+                license_stored = row["licenses"]
+
+                if not data["licenses"]:
+                    license_json = "null"
+                else:
+                    for license in data["licenses"]:
+                        if not license["name"]:
+                            license_json = "null"
+                        else:
+                            license_json = license["name"]
+
+                if license_json != license_stored:
+                    print("liense_current:", license_json, " /// ",
+                          "license_stored:", license_stored, " /// ",
+                          "identifier:", id_stored)
+            except KeyError:
+                if license_stored == "null":
+                    license_json = "null"
+                else:
+                    print("License not found for ", id_stored)
+
+            # Check version
+            try:
+                version_json = data["version"]
+                version_stored = row["version"]
+
+                if not version_json:
+                    version_json = "null"
+
+                if version_json != version_stored:
+                    print("version_current: ", version_json, " /// ",
+                          "version_stored: ", version_stored, " /// ",
+                          "identifier: ", id_stored)
+            except KeyError:
+                print("Version not found for ", id_stored)
+
+            # Check human_readable_data_format_specification_value
+            try:
+                extra_properties = data["extraProperties"]
+
+                human_readable_value_stored = row["human-readable_data_format_specification_value"]
+                human_readable_value_iri_stored = row["human-readable_data_format_specification_value_IRI"]
+                machine_readable_value_stored = row["machine-readable_data_format_specification_value"]
+                machine_readable_value_iri_stored = row["machine-readable_data_format_specification_value_IRI"]
+
+                human_readable_value_json = ""
+                human_readable_value_iri_json = ""
+                machine_readable_value_json = ""
+                machine_readable_value_iri_json = ""
+
+                if extra_properties:
+                    for property in extra_properties:
+                        if "human" in property["category"]:
+                            human_readable_value_json = property["values"][0]["value"]
+                            human_readable_value__iri_json = property["values"][0]["valueIRI"]
+                        if "machine" in property["category"]:
+                            machine_readable_value_json = property["values"][0]["value"]
+                            machine_readable_value_iri_json = property["values"][0]["valueIRI"]
+
+                if not human_readable_value_json:
+                    human_readable_value_json = "null"
+                if not human_readable_value_iri_json:
+                    human_readable_value_iri_json = "null"
+                if not machine_readable_value_json:
+                    machine_readable_value_json = "null"
+                if not machine_readable_value_iri_json:
+                    machine_readable_value_iri_json = "null"
+
+                if human_readable_value_json != human_readable_value_stored:
+                    print("human_readable_value_current: ", human_readable_value_json, " /// ",
+                          "human_readable_value_stored: ", human_readable_value_stored, " /// ",
+                          "identifier: ", id_stored)
+                if human_readable_value_iri_json != human_readable_value_iri_stored:
+                    print("human_readable_value_iri_current: ", human_readable_value_iri_json, " /// ",
+                          "human_readable_value_iri_stored: ", human_readable_value_iri_stored, " /// ",
+                          "identifier: ", id_stored)
+                if machine_readable_value_json != machine_readable_value_stored:
+                    print("machine_readable_value_current: ", machine_readable_value_json, " /// ",
+                          "machine_readable_value_stored: ", machine_readable_value_stored, " /// ",
+                          "identifier: ", id_stored)
+                if machine_readable_value_iri_json != machine_readable_value_iri_stored:
+                    print("machine_readable_value_iri_current: ", machine_readable_value_iri_json, " /// ",
+                          "machine_readable_value_iri_stored: ", machine_readable_value_iri_stored, " /// ",
+                          "identifier: ", id_stored)
+            except KeyError:
+                print("Human- and machine-readable data format value specifications not found for ", id_stored)
+
+
+        except urllib.error.HTTPError:
+            dats_metrics.count("not_found", category="data-formats")
+            print("404 not found for ", id_stored)
+
+    dats_metrics.add_time("data-formats/compare", time.perf_counter() - compare_start)
+
+if args.record:
+    print("Recorded", dats_replay.ACTIVE.recorded, "responses to", args.record)
+elif args.replay:
+    print("Replayed", dats_replay.ACTIVE.replayed, "responses from", args.replay, "with",
+          dats_replay.ACTIVE.missing, "not recorded")
+
+if metrics is not None:
+    metrics.write(None if args.metrics == "-" else args.metrics, args.metrics_format)
@@ -0,0 +1,254 @@
+import os
+import sys
+import glob
+import array
+import hashlib
+import sqlite3
+import argparse
+
+import dats_snapshot_store
+
+
+DEFAULT_ARCHIVE = "dats-archive.sqlite"
+DIGEST_SIZE = hashlib.sha256().digest_size
+
+# Each distinct cell value is stored once; each distinct row once, as the list of its cell ids, under the hash of its
+# bytes; each snapshot as a manifest of its row hashes in order.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    id INTEGER PRIMARY KEY,
+    hash BLOB NOT NULL UNIQUE,
+    value BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rows (
+    hash BLOB PRIMARY KEY,
+    cells BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    harvested_at TEXT,
+    size INTEGER NOT NULL,
+    digest BLOB NOT NULL,
+    manifest BLOB NOT NULL,
+    PRIMARY KEY (category, name)
+);
+"""
+
+
+def open_archive(fname=DEFAULT_ARCHIVE):
+    """Opens the archive, creating its tables if needed, and returns the SQLite connection."""
+
+    conn = sqlite3.connect(fname)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def split_records(data):
+    """Splits the bytes of a snapshot into its records, line terminators included. A quoted value that spans lines
+    stays in one record, so joining the records gives back the exact bytes.
+    """
+
+    records = list()
+    pending = list()
+    quotes = 0
+
+    for line in data.splitlines(keepends=True):
+        pending.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            records.append(b"".join(pending))
+            pending = list()
+            quotes = 0
+    if pending:
+        records.append(b"".join(pending))
+    return records
+
+
+def pack_ids(ids):
+    """Packs cell ids into 4-byte little-endian integers."""
+
+    packed = array.array("I", ids)
+    if sys.byteorder != "little":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_ids(blob):
+    """Unpacks the cell ids of a row."""
+
+    ids = array.array("I")
+    ids.frombytes(blob)
+    if sys.byteorder != "little":
+        ids.byteswap()
+    return ids
+
+
+def cell_id(conn, value):
+    """Returns the id of a cell value, storing the value if the archive doesn't have it yet."""
+
+    digest = hashlib.sha256(value).digest()
+    found = conn.execute("SELECT id FROM cells WHERE hash = ?", (digest,)).fetchone()
+    if found is not None:
+        return found[0]
+    return conn.execute("INSERT INTO cells (hash, value) VALUES (?, ?)", (digest, value)).lastrowid
+
+
+def archive_data(conn, category, name, data, harvested_at=None):
+    """Adds the bytes of one snapshot to the archive. Only rows the archive hasn't seen before are split into cells
+    and stored, so the cost of a harvest follows how much changed. Returns the number of rows in the snapshot and
+    the number of them that were new, or (0, 0) if the snapshot was already archived.
+    """
+
+    if conn.execute("SELECT 1 FROM snapshots WHERE category = ? AND name = ?", (category, name)).fetchone():
+        return 0, 0
+
+    records = split_records(data)
+    hashes = list()
+    new_rows = 0
+
+    with conn:
+        for record in records:
+            digest = hashlib.sha256(record).digest()
+            hashes.append(digest)
+            if conn.execute("SELECT 1 FROM rows WHERE hash = ?", (digest,)).fetchone():
+                continue
+
+            ids = [cell_id(conn, value) for value in record.split(b"\t")]
+            conn.execute("INSERT INTO rows (hash, cells) VALUES (?, ?)", (digest, pack_ids(ids)))
+            new_rows += 1
+
+        conn.execute("INSERT INTO snapshots (category, name, harvested_at, size, digest, manifest) "
+                     "VALUES (?, ?, ?, ?, ?, ?)",
+                     (category, name, harvested_at, len(data), hashlib.sha256(data).digest(), b"".join(hashes)))
+    return len(records), new_rows
+
+
+def archive_snapshot(conn, fname, category=None):
+    """Adds a '*-dats-info-*.txt' snapshot file to the archive. The category defaults to the name of the file's
+    '*-dats-info' directory; a category the harvest names differently is filed under the directory's name, so a
+    category's whole history is archived under one name.
+    """
+
+    if category is None:
+        category = dats_snapshot_store.snapshot_category(fname)
+    else:
+        category = dats_snapshot_store.history_category(category)
+    with open(fname, "rb") as t_name:
+        data = t_name.read()
+    return archive_data(conn, category, os.path.basename(fname), data, dats_snapshot_store.snapshot_timestamp(fname))
+
+
+def archive_history(conn, root="."):
+    """Archives every snapshot in the '*-dats-info' directories under 'root' that isn't archived yet. Returns the
+    number of snapshots and new rows added.
+    """
+
+    added = 0
+    new_rows = 0
+    for fname in sorted(glob.glob(os.path.join(root, "*-dats-info", "*.txt"))):
+        rows, new = archive_snapshot(conn, fname)
+        added += rows > 0
+        new_rows += new
+    return added, new_rows
+
+
+def snapshots(conn, category=None):
+    """Lists the category, name, and harvest timestamp of the archived snapshots."""
+
+    if category is None:
+        cursor = conn.execute("SELECT category, name, harvested_at FROM snapshots ORDER BY category, harvested_at")
+    else:
+        cursor = conn.execute("SELECT category, name, harvested_at FROM snapshots WHERE category = ? "
+                              "ORDER BY harvested_at", (category,))
+    return cursor.fetchall()
+
+
+def reconstruct_snapshot(conn, category, name):
+    """Rebuilds the exact bytes of an archived snapshot from its manifest. Raises a KeyError if the snapshot isn't
+    archived and a ValueError if the rebuilt bytes don't match the digest taken when it was archived.
+    """
+
+    found = conn.execute("SELECT manifest, digest FROM snapshots WHERE category = ? AND name = ?",
+                         (category, name)).fetchone()
+    if found is None:
+        raise KeyError("{} is not archived under {}".format(name, category))
+    manifest, expected = found
+
+    row_cells = dict()
+    cell_values = dict()
+    parts = list()
+
+    for start in range(0, len(manifest), DIGEST_SIZE):
+        digest = manifest[start:start + DIGEST_SIZE]
+        if digest not in row_cells:
+            (blob,) = conn.execute("SELECT cells FROM rows WHERE hash = ?", (digest,)).fetchone()
+            row_cells[digest] = unpack_ids(blob)
+
+        values = list()
+        for i in row_cells[digest]:
+            if i not in cell_values:
+                (cell_values[i],) = conn.execute("SELECT value FROM cells WHERE id = ?", (i,)).fetchone()
+            values.append(cell_values[i])
+        parts.append(b"\t".join(values))
+
+    data = b"".join(parts)
+    if hashlib.sha256(data).digest() != expected:
+        raise ValueError("{} in {} does not match its digest".format(name, category))
+    return data
+
+
+def archive_stats(conn):
+    """Returns how many snapshots and bytes of text the archive holds, and how many bytes it stores them in."""
+
+    (count, text_bytes) = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM snapshots").fetchone()
+    (cells, cell_bytes) = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM cells").fetchone()
+    (rows, row_bytes) = conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(cells)), 0) FROM rows").fetchone()
+    (page_count,) = conn.execute("PRAGMA page_count").fetchone()
+    (page_size,) = conn.execute("PRAGMA page_size").fetchone()
+
+    return {"snapshots": count, "text_bytes": text_bytes, "rows": rows, "row_bytes": row_bytes, "cells": cells,
+            "cell_bytes": cell_bytes, "archive_bytes": page_count * page_size}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Keeps the '*-dats-info' snapshot history in a deduplicated "
+                                                     "archive and restores snapshots from it.")
+    arg_parser.add_argument("--archive", default=DEFAULT_ARCHIVE, help="archive file (default: %(default)s)")
+    subparsers = arg_parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="archive every snapshot under a directory")
+    add_parser.add_argument("root", nargs="?", default=".")
+    list_parser = subparsers.add_parser("list", help="list the archived snapshots")
+    list_parser.add_argument("category", nargs="?")
+    restore_parser = subparsers.add_parser("restore", help="write an archived snapshot back out")
+    restore_parser.add_argument("category", help="e.g. tycho")
+    restore_parser.add_argument("name", help="e.g. tycho-dats-info-2019-05-01_T14-31.txt")
+    restore_parser.add_argument("-o", "--output", help="file to write (defaults to the snapshot name)")
+    subparsers.add_parser("verify", help="rebuild every archived snapshot and check it against its digest")
+    args = arg_parser.parse_args()
+
+    archive = open_archive(args.archive)
+
+    if args.command == "add":
+        added, new_rows = archive_history(archive, args.root)
+        print("Archived", added, "snapshots,", new_rows, "new rows")
+        stats = archive_stats(archive)
+        print("\t", "Snapshots: ", stats["snapshots"], "holding", stats["text_bytes"], "bytes of text")
+        print("\t", "Distinct rows: ", stats["rows"], " Distinct cells: ", stats["cells"])
+        print("\t", "Archive size: ", stats["archive_bytes"], "bytes")
+
+    if args.command == "list":
+        for category, name, harvested_at in snapshots(archive, args.category):
+            print(category, name, harvested_at, sep="\t")
+
+    if args.command == "restore":
+        output_fname = args.output or args.name
+        with open(output_fname, "wb") as restored_f:
+            restored_f.write(reconstruct_snapshot(archive, args.category, args.name))
+        print("Restored", args.name, "to", output_fname)
+
+    if args.command == "verify":
+        for category, name, harvested_at in snapshots(archive):
+            reconstruct_snapshot(archive, category, name)
+        print("Verified", archive_stats(archive)["snapshots"], "snapshots")
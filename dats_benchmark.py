@@ -0,0 +1,641 @@
+import io
+import os
+import sys
+import csv
+import json
+import time
+import resource
+import argparse
+import tempfile
+import subprocess
+import datetime as dt
+from csv import DictWriter
+from collections import deque
+
+import dats_crawler
+import dats_decode
+import dats_replay
+import dats_json_parser as parser
+from dats_catalog_generator import generate_catalog, DATASET_TYPE, DATA_STANDARD_TYPE
+
+
+DEFAULT_SNAPSHOT = "tycho-dats-info/tycho-dats-info-2019-05-01_T14-31.txt"
+DEFAULT_RESULTS = "benchmark-results.jsonl"
+
+
+# Verbatim copies of the parse_* functions as they were before their columns were extracted by compiled code
+# (dats_json_parser.DATASET_EXTRACTORS) and before parse_iso_codes shared its walk with parse_spatial_coverage. They
+# are the reference the benchmark checks today's output against, so they must not call into dats_json_parser.
+
+def parse_format(jsn):
+    """Parses the contents of the 'formats' JSON array in the DATS and returns them as a string."""
+
+    try:
+        s = "; "
+
+        formats = s.join(jsn["distributions"][0]["formats"])
+    except Exception:
+        formats = "null"
+    return formats
+
+
+def parse_standard(jsn):
+    """Parses the name and identifier of the data standard in the DATS and returns each of them as a string."""
+
+    try:
+        standard_name = jsn["distributions"][0]["conformsTo"][0]["name"]
+        standard_identifier = jsn["distributions"][0]["conformsTo"][0]["identifier"]["identifier"]
+        standard = standard_name + "; " + standard_identifier
+    except Exception:
+        standard = "null"
+    return standard
+
+
+def parse_landing_page(jsn):
+    """Parses the URL of the landing page in the DATS and returns it as a string."""
+
+    try:
+        url = jsn["distributions"][0]["access"]["landingPage"]
+    except Exception:
+        url = "null"
+    return url
+
+
+def parse_access_page(jsn):
+    """Parses the URL of the access page in the DATS and returns it as a string."""
+
+    try:
+        url = jsn["distributions"][0]["access"]["accessURL"]
+    except Exception:
+        url = "null"
+    return url
+
+
+def parse_dataset_id(jsn):
+    """Parses the dataset identifier in the DATS and returns it as a string."""
+
+    try:
+        if jsn["identifier"]["identifier"] == "":
+            id = "null"
+        else:
+            id = jsn["identifier"]["identifier"]
+    except Exception:
+        id = "null"
+    return id
+
+
+def parse_iso_codes(jsn):
+    """Parses ISO 3166, ISO 3166-1, and ISO 3166-1 alpha-3 codes in the DATS and returns it as a string."""
+
+    iso_codes = dict()
+    iso3166_lst = list()
+    iso3166_1_lst = list()
+    iso3166_1_alpha3_lst = list()
+
+    s = "; "
+
+    try:
+        for attr in jsn["spatialCoverage"]:
+            try:
+                 if not attr["relatedIdentifiers"]:
+                     iso3166_lst.append("null")
+                     iso3166_1_lst.append("null")
+                     iso3166_1_alpha3_lst.append("null")
+                 else:
+                     iso_lst = list()
+
+                     for sub_attr in attr["relatedIdentifiers"]:
+                         if sub_attr["identifierSource"] == "ISO 3166":
+                             iso3166_lst.append(sub_attr["identifier"])
+                             iso_lst.append(sub_attr["identifierSource"])
+                         elif sub_attr["identifierSource"] == "ISO 3166-1 numeric":
+                             iso3166_1_lst.append(sub_attr["identifier"])
+                             iso_lst.append(sub_attr["identifierSource"])
+                         elif sub_attr["identifierSource"] == "ISO 3166-1 alpha-3":
+                             iso3166_1_alpha3_lst.append(sub_attr["identifier"])
+                             iso_lst.append(sub_attr["identifierSource"])
+
+                     if "ISO 3166" not in iso_lst:
+                         print("iso list:", iso_lst)
+                         iso3166_lst.append("null")
+                     if "ISO 3166-1 numeric" not in iso_lst:
+                         iso3166_1_lst.append("null")
+                     if "ISO 3166-1 alpha-3" not in iso_lst:
+                         iso3166_1_alpha3_lst.append("null")
+            except Exception:
+                try:
+                    if not attr["alternateIdentifiers"]:
+                        iso3166_lst.append("null")
+                        iso3166_1_lst.append("null")
+                        iso3166_1_alpha3_lst.append("null")
+                    else:
+                        iso_lst = list()
+
+                        for sub_attr in attr["alternateIdentifiers"]:
+                            if sub_attr["identifierSource"] == "ISO 3166":
+                                iso3166_lst.append(sub_attr["identifier"])
+                                iso_lst.append(sub_attr["identifierSource"])
+                            elif sub_attr["identifierSource"] == "ISO 3166-1 numeric":
+                                iso3166_1_lst.append(sub_attr["identifier"])
+                                iso_lst.append(sub_attr["identifierSource"])
+                            elif sub_attr["identifierSource"] == "ISO 3166-1 alpha-3":
+                                iso3166_1_alpha3_lst.append(sub_attr["identifier"])
+                                iso_lst.append(sub_attr["identifierSource"])
+
+                        if "ISO 3166" not in iso_lst:
+                            iso3166_lst.append("null")
+                        if "ISO 3166-1 numeric" not in iso_lst:
+                            iso3166_1_lst.append("null")
+                        if "ISO 3166-1 alpha-3" not in iso_lst:
+                            iso3166_1_alpha3_lst.append("null")
+
+                except Exception:
+                    iso3166_lst.append("null")
+                    iso3166_1_lst.append("null")
+                    iso3166_1_alpha3_lst.append("null")
+
+    except KeyError:
+        iso3166_lst.append("null")
+        iso3166_1_lst.append("null")
+        iso3166_1_alpha3_lst.append("null")
+
+    iso_codes["ISO_3166"] = s.join(iso3166_lst)
+    iso_codes["ISO_3166_1"] = s.join(iso3166_1_lst)
+    iso_codes["ISO_3166_1_alpha_3"] = s.join(iso3166_1_alpha3_lst)
+    return iso_codes
+
+
+def legacy_parse_datasets(data):
+    """The per-field parse_datasets that calls parse_dates, parse_iso_codes, and parse_stored_in once per column.
+    Kept as the baseline the single-pass version is measured and checked against; the fields that today's parser
+    extracts differently are parsed by the reference copies above.
+    """
+
+    dataset_info = dict()
+
+    dataset_info["title"] = data["title"]
+    dataset_info["description"] = parser.parse_description(data)
+    dataset_info["dataset_identifier"] = parse_dataset_id(data)
+    dataset_info["authors"] = parser.parse_authors(data)
+    dataset_info["created"] = parser.parse_dates(data).get("creation_date")
+    dataset_info["modified"] = parser.parse_dates(data).get("modification_date")
+    dataset_info["accessed"] = parser.parse_dates(data).get("accessed_date")
+    dataset_info["landing_page"] = parse_landing_page(data)
+    dataset_info["access_page"] = parse_access_page(data)
+    dataset_info["format"] = parse_format(data)
+    dataset_info["conforms_to"] = parse_standard(data)
+    dataset_info["license"] = parser.parse_licenses(data)
+    dataset_info["geography"] = parser.parse_geo(data)
+    dataset_info["apollo_location_code"] = parser.parse_geo_id(data)
+    dataset_info["iso_3166"] = parse_iso_codes(data).get("ISO_3166")
+    dataset_info["iso_3166_1"] = parse_iso_codes(data).get("ISO_3166_1")
+    dataset_info["iso_3166_1_alpha_3"] = parse_iso_codes(data).get("ISO_3166_1_alpha_3")
+    dataset_info["disease"] = parser.parse_disease_name(data)
+    dataset_info["apollo_enabled"] = parser.check_if_apollo_enabled(parser.parse_stored_in(data))
+    dataset_info["on_olympus"] = parser.check_if_on_olympus(parser.parse_stored_in(data))
+    return dataset_info
+
+
+def split_field(value):
+    """Splits a '; '-joined snapshot column back into its values, returning an empty list for 'null'."""
+
+    if not value or value == "null":
+        return list()
+    return value.split("; ")
+
+
+def dats_from_row(row):
+    """Rebuilds a dataset DATS record from one row of a dataset snapshot so parse_datasets can be run over inputs
+    with the same size and shape as a real harvest.
+    """
+
+    identifier = row.get("dataset_identifier") or row.get("datasetIdentifier") or ""
+
+    creators = list()
+    for name in split_field(row.get("authors")):
+        first, _, last = name.rpartition(" ")
+        creators.append({"firstName": first, "lastName": last})
+
+    dates = list()
+    for column, date_type in (("created", "creation"), ("modified", "modification"), ("accessed", "accessed")):
+        if row.get(column) and row[column] != "null":
+            dates.append({"date": row[column], "type": {"value": date_type}})
+
+    distribution = {"access": {"landingPage": row.get("landing_page") or row.get("landingPage") or "",
+                               "accessURL": row.get("access_page") or row.get("accessPage") or ""},
+                    "formats": split_field(row.get("format")),
+                    "dates": dates}
+
+    conforms_to = split_field(row.get("conforms_to") or row.get("conformsTo"))
+    if len(conforms_to) == 2:
+        distribution["conformsTo"] = [{"name": conforms_to[0], "identifier": {"identifier": conforms_to[1]}}]
+    if row.get("on_olympus") == "TRUE":
+        distribution["storedIn"] = {"name": "MIDAS Digital Commons"}
+    elif row.get("apollo_enabled") == "TRUE":
+        distribution["storedIn"] = {"name": "Apollo Library"}
+
+    names = split_field(row.get("geography"))
+    codes = split_field(row.get("apollo_location_code") or row.get("apolloLocationCode"))
+    iso3166 = split_field(row.get("iso_3166") or row.get("ISO_3166"))
+    iso3166_1 = split_field(row.get("iso_3166_1") or row.get("ISO_3166-1"))
+    iso3166_1_alpha3 = split_field(row.get("iso_3166_1_alpha_3") or row.get("ISO_3166-1_alpha-3"))
+
+    spatial_coverage = list()
+    for index, name in enumerate(names):
+        related_identifiers = list()
+        for source, values in (("ISO 3166", iso3166),
+                               ("ISO 3166-1 numeric", iso3166_1),
+                               ("ISO 3166-1 alpha-3", iso3166_1_alpha3)):
+            if index < len(values):
+                related_identifiers.append({"identifier": values[index], "identifierSource": source})
+
+        location = {"name": name, "relatedIdentifiers": related_identifiers}
+        if index < len(codes):
+            location["identifier"] = {"identifier": codes[index]}
+        spatial_coverage.append(location)
+
+    record = {"title": row.get("title") or "",
+              "description": row.get("description") or "",
+              "identifier": {"identifier": identifier},
+              "creators": creators,
+              "distributions": [distribution],
+              "spatialCoverage": spatial_coverage,
+              "licenses": [{"name": row.get("license") or ""}]}
+
+    if row.get("disease") and row["disease"] != "null":
+        record["isAbout"] = [{"name": row["disease"],
+                              "identifier": {"identifierSource": "https://biosharing.org/bsg-s000098"}}]
+    return record
+
+
+def load_snapshot_records(fname):
+    """Reads a dataset snapshot and returns one rebuilt DATS record per row."""
+
+    with open(fname, encoding="latin-1") as snapshot_f:
+        reader = csv.DictReader(snapshot_f, dialect="excel-tab")
+        return [dats_from_row(row) for row in reader]
+
+
+def render_rows(rows):
+    """Renders parsed dataset rows exactly as write_to_file would and returns the text."""
+
+    buf = io.StringIO()
+    dict_writer = DictWriter(buf, fieldnames=parser.DATASET_FIELDNAMES, delimiter="\t")
+    dict_writer.writeheader()
+    for row in rows:
+        dict_writer.writerow(row)
+    return buf.getvalue()
+
+
+def time_parser(parse, records, repeat):
+    """Runs a parse function over every record 'repeat' times and returns the best records/sec along with the rows
+    from the last run.
+    """
+
+    best = None
+    rows = list()
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = [parse(record) for record in records]
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return len(records) / best, rows
+
+
+def benchmark_parse_datasets(fname=DEFAULT_SNAPSHOT, repeat=5, count=None):
+    """Benchmarks the per-field and the single-pass parse_datasets on records rebuilt from a dataset snapshot, or on
+    the datasets of a synthetic catalog of 'count' records, checks that both render byte-identical output, and prints
+    records/sec for each. process_dataset, which classifies every record before parsing it, is timed too, so the cost
+    the classifier adds on top of the parse shows up next to it.
+    """
+
+    if count:
+        records = synthetic_datasets(count)
+        source = "a synthetic catalog"
+    else:
+        records = load_snapshot_records(fname)
+        source = fname
+    legacy_rate, legacy_rows = time_parser(legacy_parse_datasets, records, repeat)
+    single_pass_rate, single_pass_rows = time_parser(parser.parse_datasets, records, repeat)
+    dispatcher = parser.compile_rules(parser.DATASET_RULES)
+    process_rate, _ = time_parser(lambda record: parser.process_dataset(record, dispatcher), records, repeat)
+
+    if render_rows(legacy_rows) != render_rows(single_pass_rows):
+        raise AssertionError("Single-pass parse_datasets output differs from the per-field output")
+
+    print("parse_datasets on", len(records), "records from", source)
+    print("\t", "per-field:        {:10.0f} records/sec".format(legacy_rate))
+    print("\t", "single-pass:      {:10.0f} records/sec".format(single_pass_rate))
+    print("\t", "speedup:          {:10.2f}x".format(single_pass_rate / legacy_rate))
+    print("\t", "classify + parse: {:10.0f} records/sec".format(process_rate))
+
+
+def run_harvest(catalog, workers):
+    """Classifies and parses a catalog with harvest_datasets and returns the rows fanned out per category, the rule
+    hits, and the elapsed seconds.
+    """
+
+    dispatcher = parser.compile_rules(parser.DATASET_RULES)
+    dset_dicts = dict()
+
+    start = time.perf_counter()
+    items = ((record, None) for record in catalog)
+    for categories, dataset_info, _, _ in parser.harvest_datasets(items, dispatcher, workers=workers):
+        if dataset_info is not None:
+            for category in categories:
+                dset_dicts.setdefault(category, list()).append(dataset_info)
+    elapsed = time.perf_counter() - start
+    return dset_dicts, dispatcher["hits"], elapsed
+
+
+def synthetic_datasets(count, seed=0):
+    """Returns the DATS content of the datasets in a synthetic catalog of 'count' records."""
+
+    return [element["content"] for element in generate_catalog(count, seed=seed) if element["type"] == DATASET_TYPE]
+
+
+def benchmark_parallel(count=100000, max_workers=None):
+    """Benchmarks classification and parse_datasets on a synthetic catalog with 1 to 'max_workers' processes, checks
+    that every worker count renders the same output as the serial run, and prints records/sec and speedup.
+    """
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    catalog = synthetic_datasets(count)
+    print("harvest_datasets on a synthetic catalog of", len(catalog), "records")
+
+    serial_rows, serial_hits, serial_elapsed = run_harvest(catalog, 1)
+    serial_output = {category: render_rows(rows) for category, rows in serial_rows.items()}
+
+    for workers in range(1, max_workers + 1):
+        if workers == 1:
+            elapsed = serial_elapsed
+        else:
+            rows, hits, elapsed = run_harvest(catalog, workers)
+            output = {category: render_rows(category_rows) for category, category_rows in rows.items()}
+            if output != serial_output or hits != serial_hits:
+                raise AssertionError("Output with {} workers differs from the serial output".format(workers))
+
+        print("\t", "{:2d} worker(s): {:10.0f} records/sec  {:5.2f}x".format(workers, len(catalog) / elapsed,
+                                                                            serial_elapsed / elapsed))
+
+
+def time_decode(decode, fname, repeat):
+    """Decodes a contents dump 'repeat' times and returns the best seconds along with the elements from the last
+    run.
+    """
+
+    best = None
+    elements = None
+
+    for _ in range(repeat):
+        elements = None
+        start = time.perf_counter()
+        with open(fname, "rb") as dump_f:
+            elements = decode(dump_f)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, elements
+
+
+def benchmark_decode(fname=None, count=100000, repeat=3):
+    """Benchmarks decoding a contents dump whole with today's read-decode-loads path and with every installed
+    dats_decode decoder, and element by element with the streaming decoder, as latin-1 (saved dumps and responses
+    without a charset) and as UTF-8 (responses that declare it). Checks that every decoder returns the same elements
+    as the json module for the same encoding, and prints MB/sec for each. Without a dump, a synthetic catalog of
+    'count' records is written to a temporary file first.
+    """
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if fname is None:
+            fname = os.path.join(tmp_dir, "contents.json")
+            with open(fname, "w", encoding="utf-8") as dump_f:
+                json.dump(list(generate_catalog(count)), dump_f, ensure_ascii=False)
+
+        megabytes = os.path.getsize(fname) / (1024 * 1024)
+        print("Decoding", fname, "({:.1f} MB)".format(megabytes))
+
+        for encoding in (dats_decode.DEFAULT_ENCODING, "utf-8"):
+            elapsed, expected = time_decode(lambda f: json.loads(f.read().decode(encoding)), fname, repeat)
+            print("\t", "{:24s} {:8.1f} MB/sec".format(encoding + ", read + json.loads", megabytes / elapsed))
+            baseline = elapsed
+
+            # The harvest handles each streamed element and lets it go, so the elements aren't kept while timing
+            elapsed, _ = time_decode(lambda f: deque(parser.iter_json_array(f, encoding), maxlen=0), fname, repeat)
+            with open(fname, "rb") as dump_f:
+                if list(parser.iter_json_array(dump_f, encoding)) != expected:
+                    raise AssertionError("Streamed elements differ from json.loads")
+            print("\t", "{:24s} {:8.1f} MB/sec  {:5.2f}x".format(encoding + ", streamed", megabytes / elapsed,
+                                                                 baseline / elapsed))
+
+            for name in dats_decode.available_decoders():
+                decoder = dats_decode.use_decoder(name)
+                try:
+                    elapsed, elements = time_decode(lambda f: dats_decode.load(f, encoding), fname, repeat)
+                finally:
+                    dats_decode.use_decoder("json")
+                if elements != expected:
+                    raise AssertionError("The {} decoder's elements differ from json.loads".format(decoder.name))
+                print("\t", "{:24s} {:8.1f} MB/sec  {:5.2f}x".format(encoding + ", " + decoder.name,
+                                                                     megabytes / elapsed, baseline / elapsed))
+            expected = elements = None
+
+
+def time_bulk_harvest(contents_url, header):
+    """Classifies and parses every dataset in the contents payload like the bulk harvest, without writing them.
+    Returns the rows by identifier, the number of datasets parsed, and the elapsed seconds.
+    """
+
+    dispatcher = parser.compile_rules(parser.DATASET_RULES)
+    rows = dict()
+    parsed = 0
+
+    start = time.perf_counter()
+    for element in parser.stream_contents(contents_url, header):
+        if "Dataset" in element["type"]:
+            categories, dataset_info = parser.process_dataset(element["content"], dispatcher)
+            if dataset_info is not None:
+                rows.setdefault(dataset_info["dataset_identifier"], dataset_info)
+                parsed += 1
+    return rows, parsed, time.perf_counter() - start
+
+
+def time_crawl_harvest(api_url, header, workers):
+    """Crawls the identifiers of an API with 'workers' identifiers in flight and parses every dataset it files, with
+    no response cache. Returns the rows by identifier, the Crawler, and the elapsed seconds.
+    """
+
+    crawler = dats_crawler.Crawler(api_url, header, workers=workers)
+    rows = dict()
+
+    start = time.perf_counter()
+    for identifier, categories, content, error in crawler.crawl():
+        if content is not None:
+            try:
+                rows[identifier] = parser.parse_datasets(content)
+            except KeyError:
+                continue
+    elapsed = time.perf_counter() - start
+    crawler.close()
+    return rows, crawler, elapsed
+
+
+def benchmark_crawl(api_url=parser.API_URL, max_workers=16):
+    """Benchmarks harvesting the datasets of an API from the bulk contents payload and by crawling its identifiers
+    with 1 to 'max_workers' identifiers in flight, doubling each time. Checks that every dataset the crawl parses
+    renders the same row as it does from the contents payload, and prints datasets/sec and API calls for each.
+    """
+
+    header = {"Accept": "application/json"}
+    api_url = api_url.rstrip("/")
+    bulk_rows, parsed, bulk_elapsed = time_bulk_harvest(api_url + "/contents", header)
+
+    print("Dataset harvest from", api_url)
+    print("\t", "{:18s} {:10.0f} datasets/sec  {:8.2f} s  {:8d} calls".format("bulk contents", parsed / bulk_elapsed,
+                                                                              bulk_elapsed, 1))
+
+    workers = 1
+    while workers <= max_workers:
+        rows, crawler, elapsed = time_crawl_harvest(api_url, header, workers)
+        for row in rows.values():
+            expected = bulk_rows.get(row["dataset_identifier"])
+            if expected is not None and render_rows([row]) != render_rows([expected]):
+                raise AssertionError("The crawled row of {} differs from the contents row".format(
+                    row["dataset_identifier"]))
+
+        label = "crawl, {} worker{}".format(workers, "s" if workers > 1 else "")
+        print("\t", "{:18s} {:10.0f} datasets/sec  {:8.2f} s  {:8d} calls  {:5.2f}x bulk".format(
+            label, len(rows) / elapsed, elapsed, sum(crawler.requests.values()),
+            (len(rows) / elapsed) / (parsed / bulk_elapsed)))
+        workers *= 2
+
+
+def peak_rss_kb():
+    """Returns the peak resident set size of this process in kilobytes."""
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def git_revision():
+    """Returns the commit the working tree is at, or None outside a git checkout."""
+
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_suite(count=20000, seed=0, results_fname=DEFAULT_RESULTS):
+    """Runs the harvest stages over a synthetic catalog and reports records/sec and time per stage for
+    classification, parse_datasets, parse_data_standard, and write_to_file, plus the peak RSS. The results are
+    appended to 'results_fname' and compared with the last saved run of the same size, so regressions show up.
+    """
+
+    catalog = list(generate_catalog(count, seed=seed))
+    datasets = [element["content"] for element in catalog if element["type"] == DATASET_TYPE]
+    data_standards = [element["content"] for element in catalog if element["type"] == DATA_STANDARD_TYPE]
+    timings = dict()
+
+    dispatcher = parser.compile_rules(parser.DATASET_RULES)
+    start = time.perf_counter()
+    classified = [(jsn, parser.classify_dataset(jsn, dispatcher)) for jsn in datasets]
+    timings["classify"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dset_dicts = dict()
+    for jsn, categories in classified:
+        if categories:
+            try:
+                dataset_info = parser.parse_datasets(jsn)
+            except KeyError:
+                continue
+            for category in categories:
+                dset_dicts.setdefault(category, list()).append(dataset_info)
+    timings["parse_datasets"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    dstandard_dicts = [parser.parse_data_standard(jsn) for jsn in data_standards]
+    timings["parse_data_standard"] = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        start = time.perf_counter()
+        for category, rows in dset_dicts.items():
+            parser.write_to_file(os.path.join(output_dir, category + ".txt"), rows, "dataset")
+        parser.write_to_file(os.path.join(output_dir, "data-formats.txt"), dstandard_dicts, "data-format")
+        timings["write_to_file"] = time.perf_counter() - start
+
+    total = sum(timings.values())
+    result = {"timestamp": dt.datetime.now().isoformat(timespec="seconds"),
+              "revision": git_revision(),
+              "records": len(catalog),
+              "seed": seed,
+              "records_per_sec": len(catalog) / total,
+              "seconds": timings,
+              "peak_rss_kb": peak_rss_kb()}
+
+    previous = None
+    if results_fname and os.path.exists(results_fname):
+        with open(results_fname) as results_f:
+            for line in results_f:
+                saved = json.loads(line)
+                if saved["records"] == result["records"] and saved["seed"] == result["seed"]:
+                    previous = saved
+
+    print("Harvest stages on a synthetic catalog of", len(catalog), "records")
+    print("\t", "{:20s} {:10.0f} records/sec".format("total", result["records_per_sec"]), end="")
+    if previous:
+        print("  ({:+.1f}% vs {})".format(100 * (result["records_per_sec"] / previous["records_per_sec"] - 1),
+                                          previous["revision"] or previous["timestamp"]), end="")
+    print()
+    for stage, seconds in timings.items():
+        print("\t", "{:20s} {:10.3f} s".format(stage, seconds), end="")
+        if previous and previous["seconds"].get(stage):
+            print("  ({:+.1f}%)".format(100 * (seconds / previous["seconds"][stage] - 1)), end="")
+        print()
+    print("\t", "{:20s} {:10d} kB".format("peak RSS", result["peak_rss_kb"]))
+
+    if results_fname:
+        with open(results_fname, "a") as results_f:
+            results_f.write(json.dumps(result) + "\n")
+    return result
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Benchmarks the DATS parser.")
+    arg_parser.add_argument("benchmark", nargs="?", choices=["parse", "parallel", "suite", "decode", "crawl"],
+                            default="parse")
+    arg_parser.add_argument("--snapshot", default=DEFAULT_SNAPSHOT,
+                            help="dataset snapshot whose rows are rebuilt into DATS records (parse)")
+    arg_parser.add_argument("--records", type=int,
+                            help="size of the synthetic catalog (parallel, suite, decode, and parse instead of "
+                                 "--snapshot)")
+    arg_parser.add_argument("--dump", help="saved contents response to decode instead of a synthetic one (decode)")
+    arg_parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic catalog (suite)")
+    arg_parser.add_argument("--max-workers", type=int, help="largest worker count to try (parallel, crawl)")
+    arg_parser.add_argument("--api", default=parser.API_URL, help="MDC API to harvest from (crawl)")
+    arg_parser.add_argument("--replay", metavar="FIXTURES",
+                            help="serve the API responses from this fixture archive instead of the network (crawl)")
+    arg_parser.add_argument("--replay-latency", type=float, default=0.0, metavar="SECONDS",
+                            help="with --replay, wait this long before serving each response (crawl)")
+    arg_parser.add_argument("--results", default=DEFAULT_RESULTS, help="file the suite appends its results to")
+    args = arg_parser.parse_args()
+
+    if args.benchmark == "parallel":
+        benchmark_parallel(args.records or 100000, args.max_workers)
+    elif args.benchmark == "decode":
+        benchmark_decode(args.dump, args.records or 100000)
+    elif args.benchmark == "crawl":
+        if args.replay:
+            dats_replay.replay(args.replay, args.replay_latency)
+        benchmark_crawl(args.api, args.max_workers or 16)
+    elif args.benchmark == "suite":
+        benchmark_suite(args.records or 20000, args.seed, args.results)
+    else:
+        benchmark_parse_datasets(args.snapshot, count=args.records)
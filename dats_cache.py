@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import hashlib
+import threading
+import urllib.error
+import urllib.request
+
+import dats_decode
+import dats_replay
+
+
+DEFAULT_CACHE_DIR = ".dats-cache"
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def urlopen_response(url, header):
+    """Sends a GET request with urllib and returns the status, response headers, and body bytes. A 304 response is
+    returned like any other instead of being raised as an error.
+    """
+
+    r = urllib.request.Request(url, headers=header)
+    try:
+        with dats_replay.urlopen(r) as rhand:
+            return rhand.status, rhand.headers, rhand.read()
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return e.code, e.headers, b""
+        raise
+
+
+class ResponseCache:
+    """On-disk cache of API responses keyed by a hash of the request URL.
+
+    A cached response younger than 'ttl' seconds is served without touching the network. An older one is revalidated
+    with If-None-Match/If-Modified-Since, so an unchanged record costs a 304 and no body. The least recently used
+    responses are evicted once the cache grows past 'max_bytes'. In offline mode only cached responses are served and
+    a miss raises a 504 HTTPError, as an only-if-cached request would.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(os.path.getsize(path) for path in self.body_paths())
+
+    def key(self, url):
+        """Returns the cache key for a URL."""
+
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def path(self, key, suffix):
+        """Returns the path of a cached body ('.body') or its metadata ('.json')."""
+
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def body_paths(self):
+        """Lists the paths of every cached body."""
+
+        paths = list()
+        for sub_dir in os.listdir(self.directory):
+            sub_path = os.path.join(self.directory, sub_dir)
+            if os.path.isdir(sub_path):
+                paths.extend(os.path.join(sub_path, f) for f in os.listdir(sub_path) if f.endswith(".body"))
+        return paths
+
+    def write_atomic(self, fname, content):
+        """Writes bytes to a temporary file next to 'fname' and renames it into place."""
+
+        tmp_fname = "{}.{}.tmp".format(fname, threading.get_ident())
+        with open(tmp_fname, "wb") as tmp_f:
+            tmp_f.write(content)
+        os.replace(tmp_fname, fname)
+
+    def lookup(self, url):
+        """Returns the metadata of the cached response for a URL, or None if there isn't one."""
+
+        key = self.key(url)
+        try:
+            with open(self.path(key, ".json")) as meta_f:
+                entry = json.load(meta_f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self.path(key, ".body")):
+            return None
+        entry["key"] = key
+        return entry
+
+    def is_fresh(self, entry):
+        """Checks if a cached response is younger than the TTL."""
+
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def read(self, entry):
+        """Returns the body of a cached response and marks it as recently used."""
+
+        body_fname = self.path(entry["key"], ".body")
+        with open(body_fname, "rb") as body_f:
+            body = body_f.read()
+        try:
+            os.utime(body_fname)
+        except OSError:
+            pass
+        return body
+
+    def store(self, url, headers, body):
+        """Saves a response body with its validators, then evicts old responses if the cache is over its size cap."""
+
+        key = self.key(url)
+        os.makedirs(os.path.join(self.directory, key[:2]), exist_ok=True)
+        entry = {"url": url,
+                 "etag": headers.get("ETag") if headers else None,
+                 "last_modified": headers.get("Last-Modified") if headers else None,
+                 "charset": dats_decode.response_charset(headers, None),
+                 "fetched_at": time.time()}
+
+        body_fname = self.path(key, ".body")
+        try:
+            old_size = os.path.getsize(body_fname)
+        except OSError:
+            old_size = 0
+
+        self.write_atomic(body_fname, body)
+        self.write_atomic(self.path(key, ".json"), json.dumps(entry).encode("utf-8"))
+
+        with self.lock:
+            self.total_bytes += len(body) - old_size
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    def refresh(self, entry, headers):
+        """Restarts the TTL of a cached response after the server confirmed it is unchanged."""
+
+        entry = dict(entry)
+        key = entry.pop("key")
+        entry["fetched_at"] = time.time()
+        if headers is not None:
+            entry["etag"] = headers.get("ETag") or entry.get("etag")
+            entry["last_modified"] = headers.get("Last-Modified") or entry.get("last_modified")
+        self.write_atomic(self.path(key, ".json"), json.dumps(entry).encode("utf-8"))
+
+    def evict(self):
+        """Deletes the least recently used responses until the cache is back under its size cap. Expects the lock to
+        be held.
+        """
+
+        by_last_use = list()
+        for body_fname in self.body_paths():
+            try:
+                by_last_use.append((os.path.getmtime(body_fname), os.path.getsize(body_fname), body_fname))
+            except OSError:
+                continue
+        by_last_use.sort()
+
+        self.total_bytes = sum(size for _, size, _ in by_last_use)
+        for _, size, body_fname in by_last_use:
+            if self.total_bytes <= self.max_bytes:
+                break
+            for fname in (body_fname, body_fname[:-len(".body")] + ".json"):
+                try:
+                    os.remove(fname)
+                except OSError:
+                    pass
+            self.total_bytes -= size
+
+    def fetch(self, url, header, send=urlopen_response):
+        """Returns the body for a URL from the cache when it is fresh, revalidating or downloading it otherwise.
+
+        'send' takes a URL and request headers and returns the status, response headers, and body bytes.
+        """
+
+        return self.fetch_with_charset(url, header, send)[0]
+
+    def fetch_with_charset(self, url, header, send=urlopen_response):
+        """Like fetch(), but returns the body together with the charset its response declared, or None if it didn't
+        declare one or was cached before charsets were recorded.
+        """
+
+        entry = self.lookup(url)
+
+        if entry is not None and (self.offline or self.is_fresh(entry)):
+            return self.read(entry), entry.get("charset")
+        if self.offline:
+            raise urllib.error.HTTPError(url, 504, "Not in cache (offline mode)", None, None)
+
+        request_header = dict(header)
+        if entry is not None:
+            if entry.get("etag"):
+                request_header["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                request_header["If-Modified-Since"] = entry["last_modified"]
+
+        status, headers, body = send(url, request_header)
+
+        if status == 304 and entry is not None:
+            self.refresh(entry, headers)
+            return self.read(entry), entry.get("charset")
+
+        if status == 200:
+            self.store(url, headers, body)
+        return body, dats_decode.response_charset(headers, None)
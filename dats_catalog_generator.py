@@ -0,0 +1,175 @@
+import sys
+import json
+import random
+import argparse
+
+
+DATASET_TYPE = "edu.pitt.isg.mdc.dats2_2.Dataset"
+DATA_STANDARD_TYPE = "edu.pitt.isg.mdc.dats2_2.DataStandard"
+
+DISEASES = ["Dengue", "Measles", "Chikungunya", "Zika virus disease", "Ebola virus disease", "Sudan virus disease",
+            "Influenza", "Pertussis", "Rabies", "Malaria"]
+LOCATIONS = [("UNITED STATES", "1216", "US", "840", "USA"), ("BRAZIL", "38", "BR", "076", "BRA"),
+             ("TUVALU", "275", "TV", "798", "TUV"), ("SOLOMON ISLANDS", "274", "SB", "090", "SLB"),
+             ("INDIA", "85129", "IN", "356", "IND"), ("GUINEA", "56", "GN", "324", "GIN"),
+             ("SIERRA LEONE", "65", "SL", "694", "SLE"), ("COLOMBIA", "147", "CO", "170", "COL"),
+             ("MEXICO", "4956", "MX", "484", "MEX"), ("PHILIPPINES", "5019", "PH", "608", "PHL")]
+FIRST_NAMES = ["Willem", "Anne", "Donald", "Maria", "Chen", "Amina", "John", "Priya"]
+LAST_NAMES = ["Van Panhuis", "Cross", "Burke", "Silva", "Li", "Diallo", "Smith", "Rao"]
+FORMATS = ["CSV", "JSON", "XML", "Shapefile", "PDF"]
+LICENSES = ["Attribution-NonCommercial-ShareAlike 4.0 International", "CC0", "Creative Commons Attribution 4.0", ""]
+REPOSITORIES = ["MIDAS Digital Commons", "Apollo Library", "Zenodo"]
+
+
+def generate_creators(rng):
+    """Generates a 'creators' array of people or, sometimes, a single organization."""
+
+    if rng.random() < 0.15:
+        return [{"name": "Project Tycho"}]
+    if rng.random() < 0.05:
+        return list()
+    return [{"firstName": rng.choice(FIRST_NAMES), "lastName": rng.choice(LAST_NAMES)}
+            for _ in range(rng.randint(1, 4))]
+
+
+def generate_dates(rng):
+    """Generates the 'dates' array of a distribution with a random subset of the creation, modification, and access
+    dates.
+    """
+
+    dates = list()
+    for date_type in ("creation", "modification", "accessed"):
+        if rng.random() < 0.6:
+            date = "20{:02d}-{:02d}-{:02d}".format(rng.randint(10, 19), rng.randint(1, 12), rng.randint(1, 28))
+            if rng.random() < 0.1:
+                date = ""
+            dates.append({"date": date, "type": {"value": date_type}})
+    return dates
+
+
+def generate_location(rng):
+    """Generates one 'spatialCoverage' entry with its ISO codes under 'relatedIdentifiers' or
+    'alternateIdentifiers'.
+    """
+
+    name, apollo_code, alpha2, numeric, alpha3 = rng.choice(LOCATIONS)
+    codes = [{"identifier": alpha2, "identifierSource": "ISO 3166"},
+             {"identifier": numeric, "identifierSource": "ISO 3166-1 numeric"},
+             {"identifier": alpha3, "identifierSource": "ISO 3166-1 alpha-3"}]
+    codes = [code for code in codes if rng.random() < 0.85]
+
+    location = {"name": name, "identifier": {"identifier": apollo_code}}
+    if rng.random() < 0.7:
+        location["relatedIdentifiers"] = codes
+    else:
+        location["alternateIdentifiers"] = codes
+    return location
+
+
+def generate_identifier(rng, index):
+    """Generates a dataset identifier that exercises the identifier-based classification rules."""
+
+    roll = rng.random()
+    if roll < 0.5:
+        return "10.25337/T7/ptycho.v2.0/XX.{}".format(index)
+    if roll < 0.6:
+        return "MDC:WS-{:06d}".format(index)
+    if roll < 0.65:
+        return rng.choice(["MDC:WS-000487", "MDC:WS-000494", "http://doi.org/10.5281/zenodo.580104",
+                           "http://data.cdc.gov/api/views/cjae-szjv"])
+    return "10.5281/zenodo.{}".format(index)
+
+
+def generate_dataset(rng, index, max_locations=12):
+    """Generates the DATS content of one dataset."""
+
+    disease = rng.choice(DISEASES)
+    locations = [generate_location(rng) for _ in range(rng.choice([0, 1, 1, 1, 2, 3, rng.randint(4, max_locations)]))]
+    place = locations[0]["name"] if locations else "UNITED STATES"
+
+    content = {"title": "Counts of {} reported in {}: {}-{}".format(disease, place, rng.randint(1900, 2000),
+                                                                    rng.randint(2001, 2019)),
+               "description": rng.choice(["Project Tycho datasets contain case counts for reported disease "
+                                          "conditions for countries around the world.",
+                                          "Synthetic population generated with SPEW.",
+                                          "Line list of cases collected during an outbreak."]) * rng.randint(1, 4),
+               "creators": generate_creators(rng),
+               "distributions": [{"access": {"landingPage": "http://example.org/dataset/{}/".format(index),
+                                             "accessURL": "http://example.org/dataset/download/{}".format(index)},
+                                  "formats": rng.sample(FORMATS, rng.randint(0, 2)),
+                                  "conformsTo": [{"name": "Project Tycho Data Standard",
+                                                  "identifier": {"identifier": "https://fairsharing.org/bsg-s000718"}}],
+                                  "storedIn": {"name": rng.choice(REPOSITORIES)},
+                                  "dates": generate_dates(rng)}],
+               "spatialCoverage": locations,
+               "licenses": [{"name": rng.choice(LICENSES)}],
+               "isAbout": [{"name": disease, "identifier": {"identifierSource": "https://biosharing.org/bsg-s000098"}}],
+               "types": [{"information": {"value": rng.choice(["epidemic", "case counts", "population"])}}]}
+
+    if rng.random() < 0.95:
+        content["identifier"] = {"identifier": generate_identifier(rng, index)}
+    if rng.random() < 0.05:
+        content["types"] += [{"method": {"value": "synthetic"}}, {"platform": {"value": "SYNTHIA"}}]
+    if rng.random() < 0.2:
+        content["extraProperties"] = [{"category": rng.choice(["website", "dataset category"]), "values": list()}]
+    return content
+
+
+def generate_data_standard(rng, index):
+    """Generates the DATS content of one data format."""
+
+    extra_properties = list()
+    for category in ("human-readable specification of data format", "machine-readable specification of data format",
+                     "validator"):
+        if rng.random() < 0.7:
+            extra_properties.append({"category": category,
+                                     "values": [{"value": "" if rng.random() < 0.1 else "spec {}".format(index),
+                                                 "valueIRI": "http://example.org/spec/{}".format(index)}]})
+
+    return {"name": "Data format {}".format(index),
+            "identifier": {"identifier": "MDC:DF-{:06d}".format(index), "identifierSource": "MDC"},
+            "type": {"value": "data format", "valueIRI": "http://edamontology.org/format_1915"},
+            "description": "A data format.\nUsed for testing.",
+            "licenses": [{"name": rng.choice(LICENSES)}],
+            "version": rng.choice(["1.0", "2.1", ""]),
+            "extraProperties": extra_properties}
+
+
+def generate_catalog(count, seed=0, data_standard_share=0.05, max_locations=12):
+    """Yields 'count' elements shaped like the ones in the contents API response, mostly datasets with a share of
+    data formats. The same seed always gives the same catalog.
+    """
+
+    rng = random.Random(seed)
+    for index in range(count):
+        if rng.random() < data_standard_share:
+            yield {"type": DATA_STANDARD_TYPE, "content": generate_data_standard(rng, index)}
+        else:
+            yield {"type": DATASET_TYPE, "content": generate_dataset(rng, index, max_locations)}
+
+
+def write_catalog(fp, elements):
+    """Writes elements to a text file as a JSON array, one element at a time."""
+
+    fp.write("[")
+    for index, element in enumerate(elements):
+        if index:
+            fp.write(",\n")
+        json.dump(element, fp)
+    fp.write("]\n")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Writes a synthetic MDC contents response for benchmarking.")
+    arg_parser.add_argument("records", type=int, help="number of records in the catalog")
+    arg_parser.add_argument("-o", "--output", help="file to write (defaults to stdout)")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--max-locations", type=int, default=12, help="largest spatialCoverage fan-out")
+    args = arg_parser.parse_args()
+
+    catalog = generate_catalog(args.records, seed=args.seed, max_locations=args.max_locations)
+    if args.output:
+        with open(args.output, "w") as catalog_f:
+            write_catalog(catalog_f, catalog)
+    else:
+        write_catalog(sys.stdout, catalog)
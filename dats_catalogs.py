@@ -0,0 +1,123 @@
+import os
+import time
+import queue
+import threading
+import urllib.parse
+from collections import namedtuple
+
+
+# Elements are handed from the fetching threads to the harvest in batches, so the queue isn't locked per element
+FAN_IN_BATCH_SIZE = 256
+# Batches buffered between the fetching threads and the harvest; a full queue pauses the threads
+FAN_IN_QUEUE_SIZE = 64
+PUT_TIMEOUT = 0.1
+
+# The column multi-catalog harvests tag every row with
+SOURCE_COLUMN = "source"
+
+Catalog = namedtuple("Catalog", ["name", "source"])
+
+
+def catalog_name(source):
+    """Derives a catalog name from its contents source: the deployment in an MDC API URL, such as
+    'digital-commons-dev', or the base name of a saved contents response.
+    """
+
+    parsed = urllib.parse.urlsplit(source)
+    if parsed.scheme in ("http", "https"):
+        steps = [step for step in parsed.path.split("/") if step]
+        if "api" in steps and steps.index("api") > 0:
+            return steps[steps.index("api") - 1]
+        return parsed.netloc.split(":")[0]
+    return os.path.splitext(os.path.basename(source))[0]
+
+
+def parse_catalog(spec):
+    """Parses a catalog given on the command line as NAME=SOURCE, or as a bare SOURCE named by catalog_name()."""
+
+    name, separator, source = spec.partition("=")
+    if separator and name and "/" not in name and ":" not in name:
+        return Catalog(name, source)
+    return Catalog(catalog_name(spec), spec)
+
+
+def parse_catalogs(specs):
+    """Parses a list of catalogs, and raises a ValueError if two of them end up with the same name."""
+
+    catalogs = [parse_catalog(spec) for spec in specs]
+    names = [catalog.name for catalog in catalogs]
+    for name in names:
+        if names.count(name) > 1:
+            raise ValueError("Two catalogs are named '{}'; name them with NAME=SOURCE".format(name))
+    return catalogs
+
+
+class FanIn:
+    """Streams the contents of several catalogs at once, one thread each, and yields their elements as (catalog name,
+    element) pairs in the order they arrive. The elements of one catalog keep their order, but those of different
+    catalogs are interleaved however the responses happen to come in, so the whole pass takes about as long as the
+    slowest catalog instead of the sum of them all.
+
+    'open_stream' turns a catalog's source into an iterator over its elements, e.g. stream_contents. If a catalog
+    fails, the others are stopped and the error is raised from the iteration. The records and seconds of each catalog
+    are kept in 'records' and 'seconds'.
+    """
+
+    def __init__(self, catalogs, open_stream, batch_size=FAN_IN_BATCH_SIZE, queue_size=FAN_IN_QUEUE_SIZE):
+        self.catalogs = catalogs
+        self.open_stream = open_stream
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.records = {catalog.name: 0 for catalog in catalogs}
+        self.seconds = dict()
+
+    def __iter__(self):
+        batches = queue.Queue(self.queue_size)
+        stopping = threading.Event()
+
+        def put(item):
+            while not stopping.is_set():
+                try:
+                    batches.put(item, timeout=PUT_TIMEOUT)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce(catalog):
+            start = time.perf_counter()
+            try:
+                batch = list()
+                for element in self.open_stream(catalog.source):
+                    batch.append(element)
+                    if len(batch) >= self.batch_size:
+                        if not put((catalog.name, batch, None)):
+                            return
+                        batch = list()
+                if batch and not put((catalog.name, batch, None)):
+                    return
+                self.seconds[catalog.name] = time.perf_counter() - start
+                put((catalog.name, None, None))
+            except Exception as e:
+                put((catalog.name, None, e))
+
+        threads = [threading.Thread(target=produce, args=(catalog,), name="fan-in-" + catalog.name, daemon=True)
+                   for catalog in self.catalogs]
+        for thread in threads:
+            thread.start()
+
+        try:
+            running = len(threads)
+            while running:
+                name, batch, error = batches.get()
+                if error is not None:
+                    raise RuntimeError("Could not harvest catalog '{}': {}".format(name, error)) from error
+                if batch is None:
+                    running -= 1
+                    continue
+                self.records[name] += len(batch)
+                for element in batch:
+                    yield name, element
+        finally:
+            # A thread still waiting on its response exits at its next batch; it isn't waited for here
+            stopping.set()
@@ -0,0 +1,207 @@
+import os
+import glob
+import argparse
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+import dats_diff
+import dats_snapshot_store
+
+
+COLUMNAR_FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+COMPRESSION = "zstd"
+DEFAULT_HISTORY_DIR = "dats-columnar"
+
+
+def require_pyarrow():
+    """Raises an ImportError that says how to get columnar output if pyarrow isn't installed."""
+
+    if pyarrow is None:
+        raise ImportError("Parquet and Arrow output need pyarrow, which can be installed with 'pip install pyarrow'")
+
+
+def columnar_fname(fname, output_format):
+    """Returns the name of the columnar copy of a text snapshot, e.g. 'tycho-dats-info-2019-05-01_T14-31.parquet'."""
+
+    return os.path.splitext(fname)[0] + COLUMNAR_FORMATS[output_format]
+
+
+def build_table(columns, fieldnames, metadata=None):
+    """Builds an Arrow table with one dictionary-encoded string column per fieldname, in fieldname order, so the
+    repeated titles, descriptions, and locations of a snapshot are stored once per file.
+    """
+
+    require_pyarrow()
+    arrays = [pyarrow.array(columns[name], type=pyarrow.string()).dictionary_encode() for name in fieldnames]
+    table = pyarrow.table(arrays, names=list(fieldnames))
+    if metadata:
+        table = table.replace_schema_metadata({key: str(value) for key, value in metadata.items()})
+    return table
+
+
+def write_table(table, fname, output_format="parquet"):
+    """Writes a table as compressed Parquet or Arrow IPC. The file is written under a temporary name and renamed into
+    place, like the text snapshots. Returns the size of the file in bytes.
+    """
+
+    require_pyarrow()
+    tmp_fname = "{}.{}.tmp".format(fname, os.getpid())
+    try:
+        if output_format == "parquet":
+            pyarrow.parquet.write_table(table, tmp_fname, compression=COMPRESSION, use_dictionary=True)
+        elif output_format == "arrow":
+            options = pyarrow.ipc.IpcWriteOptions(compression=COMPRESSION)
+            with pyarrow.OSFile(tmp_fname, "wb") as sink:
+                with pyarrow.ipc.new_file(sink, table.schema, options=options) as ipc_writer:
+                    ipc_writer.write_table(table)
+        else:
+            raise ValueError("Unknown columnar format: " + output_format)
+    except BaseException:
+        if os.path.exists(tmp_fname):
+            os.remove(tmp_fname)
+        raise
+
+    size = os.path.getsize(tmp_fname)
+    os.replace(tmp_fname, fname)
+    return size
+
+
+def read_table(fname):
+    """Reads a Parquet or Arrow snapshot through a memory map."""
+
+    require_pyarrow()
+    if fname.endswith(COLUMNAR_FORMATS["arrow"]):
+        return pyarrow.ipc.open_file(pyarrow.memory_map(fname)).read_all()
+    return pyarrow.parquet.read_table(fname, memory_map=True)
+
+
+class ColumnarSink:
+    """A snapshot sink with the same interface as dats_writer.SnapshotSink that collects the rows column by column
+    and writes them as one columnar file when committed.
+    """
+
+    output_format = "parquet"
+
+    def __init__(self, fname, fieldnames):
+        require_pyarrow()
+        self.fname = fname
+        self.fieldnames = list(fieldnames)
+        self.columns = {name: list() for name in self.fieldnames}
+        self.rows = 0
+        self.bytes = 0
+
+    def write(self, row):
+        """Adds one row. Missing and None values become empty strings, as they do in the text snapshots."""
+
+        for name in self.fieldnames:
+            value = row.get(name)
+            self.columns[name].append("" if value is None else str(value))
+        self.rows += 1
+
+    def commit(self):
+        """Writes the collected rows to the columnar file."""
+
+        table = build_table(self.columns, self.fieldnames)
+        self.bytes = write_table(table, self.fname, self.output_format)
+        self.columns = None
+
+    def abort(self):
+        """Discards the collected rows."""
+
+        self.columns = None
+
+
+class ParquetSink(ColumnarSink):
+    output_format = "parquet"
+
+
+class ArrowSink(ColumnarSink):
+    output_format = "arrow"
+
+
+COLUMNAR_SINKS = {"parquet": ParquetSink, "arrow": ArrowSink}
+
+
+def snapshot_encoding(fname):
+    """Returns the encoding of a text snapshot. Most were written as UTF-8; the few that aren't are read as latin-1,
+    which accepts any byte.
+    """
+
+    try:
+        with open(fname, encoding="utf-8") as t_name:
+            for line in t_name:
+                pass
+    except UnicodeDecodeError:
+        return "latin-1"
+    return "utf-8"
+
+
+def convert_snapshot(fname, out_fname, output_format="parquet"):
+    """Converts a '*-dats-info-*.txt' snapshot into a columnar file. Older camelCase columns get today's names, and
+    the category and harvest timestamp are kept in the schema metadata. Returns the number of rows and the size of
+    the columnar file.
+    """
+
+    columns = dats_diff.load_columns(fname, encoding=snapshot_encoding(fname))
+    fieldnames = list(columns)
+    metadata = {"category": dats_snapshot_store.snapshot_category(fname),
+                "harvested_at": dats_snapshot_store.snapshot_timestamp(fname) or "",
+                "source": os.path.basename(fname)}
+    table = build_table(columns, fieldnames, metadata)
+    return table.num_rows, write_table(table, out_fname, output_format)
+
+
+def convert_history(root=".", out_root=DEFAULT_HISTORY_DIR, output_format="parquet"):
+    """Converts every snapshot in the '*-dats-info' directories under 'root' into the same directory layout under
+    'out_root'. Snapshots whose columnar copy is newer than the text are skipped. Returns, per converted snapshot,
+    its name, rows, text size, and columnar size.
+    """
+
+    require_pyarrow()
+    converted = list()
+    for fname in sorted(glob.glob(os.path.join(root, "*-dats-info", "*.txt"))):
+        out_dir = os.path.join(out_root, os.path.basename(os.path.dirname(fname)))
+        out_fname = columnar_fname(os.path.join(out_dir, os.path.basename(fname)), output_format)
+        if os.path.exists(out_fname) and os.path.getmtime(out_fname) >= os.path.getmtime(fname):
+            continue
+
+        os.makedirs(out_dir, exist_ok=True)
+        rows, size = convert_snapshot(fname, out_fname, output_format)
+        converted.append({"fname": fname, "rows": rows, "text_bytes": os.path.getsize(fname), "bytes": size})
+    return converted
+
+
+def load_history(out_root=DEFAULT_HISTORY_DIR, category=None):
+    """Yields the category, harvest timestamp, and memory-mapped table of every converted snapshot, oldest first
+    within each category.
+    """
+
+    fnames = glob.glob(os.path.join(out_root, "*-dats-info", "*.parquet"))
+    fnames += glob.glob(os.path.join(out_root, "*-dats-info", "*.arrow"))
+    for fname in sorted(fnames, key=lambda f: (dats_snapshot_store.snapshot_category(f),
+                                               dats_snapshot_store.snapshot_timestamp(f) or "")):
+        snapshot_category = dats_snapshot_store.snapshot_category(fname)
+        if category is None or snapshot_category == category:
+            yield snapshot_category, dats_snapshot_store.snapshot_timestamp(fname), read_table(fname)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Converts the '*-dats-info' snapshot history into Parquet or "
+                                                     "Arrow files.")
+    arg_parser.add_argument("root", nargs="?", default=".", help="directory that holds the '*-dats-info' directories")
+    arg_parser.add_argument("-o", "--output", default=DEFAULT_HISTORY_DIR, help="where the columnar copies go")
+    arg_parser.add_argument("--format", choices=sorted(COLUMNAR_FORMATS), default="parquet")
+    args = arg_parser.parse_args()
+
+    converted = convert_history(args.root, args.output, args.format)
+    text_bytes = sum(snapshot["text_bytes"] for snapshot in converted)
+    columnar_bytes = sum(snapshot["bytes"] for snapshot in converted)
+
+    print("Converted", len(converted), "snapshots,", sum(snapshot["rows"] for snapshot in converted), "rows")
+    print("\t", "Text: ", text_bytes, "bytes")
+    print("\t", args.format.capitalize() + ": ", columnar_bytes, "bytes")
@@ -0,0 +1,223 @@
+import os
+import time
+import threading
+import urllib.parse
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import dats_cache
+import dats_http
+import dats_replay
+
+
+IDENTIFIERS_PATH = "/identifiers"
+METADATA_TYPE_PATH = "/identifiers/metadata-type?identifier="
+CATEGORY_PATH = "/identifiers/category?identifier="
+METADATA_PATH = "/identifiers/metadata?identifier="
+ENDPOINTS = ("identifiers", "metadata-type", "category", "metadata")
+
+# Number of identifiers whose API calls are in flight at once
+DEFAULT_WORKERS = 8
+
+# The category of a released dataset hardly ever changes, so its lookups are cached on disk for longer than the
+# metadata, in their own directory under the response cache
+CATEGORY_CACHE_DIR = "categories"
+CATEGORY_TTL = 7 * 24 * 60 * 60
+
+# Placeholders the API lists for records that haven't been released, which have no metadata to look up
+UNRELEASED_IDENTIFIERS = {"identifier will be created at time of release",
+                          "identifier will be created as time of release"}
+
+
+"""Classification table for the category paths the category API call returns, such as ["...", "Data", "Epidemic
+data", "Ebola epidemics"]. A rule gives the labels that levels of the path have to start with, by position, and goes
+into the dataset snapshot category of the same name. Rules are tried in order and a dataset goes into the category of
+every rule it matches, except that matching an exclusive rule stops the search.
+
+The Chikungunya, Zika, and location datasets aren't reached this way, since they have no identifiers of their own.
+"""
+CATEGORY_RULES = [
+    {"name": "tycho category", "category": "tycho",
+     "levels": {2: "Disease surveillance data", 5: "[Project Tycho Datasets]"}, "exclusive": True},
+    {"name": "disease surveillance category", "category": "disease-surveillance",
+     "levels": {2: "Disease surveillance data"}},
+    {"name": "case series category", "category": "case-series", "levels": {2: "Case series data"}},
+    {"name": "ebola epidemic category", "category": "ebola", "levels": {2: "Epidemic data", 3: "Ebola epidemics"}},
+    {"name": "infectious disease scenario category", "category": "infectious-disease",
+     "levels": {2: "Infectious disease scenario data"}},
+    {"name": "mortality category", "category": "mortality", "levels": {2: "Mortality data"}},
+    {"name": "synthia category", "category": "synthia", "levels": {3: "Synthia"}},
+    {"name": "spew category", "category": "spew", "levels": {3: "SPEW datasets"}},
+    {"name": "website category", "category": "websites-with-data", "levels": {1: "Websites with data"}},
+]
+
+
+def matches_levels(path, levels):
+    """Checks if every level of a category path that a rule names starts with the label the rule gives for it."""
+
+    for index, label in levels.items():
+        if index >= len(path) or not isinstance(path[index], str) or not path[index].startswith(label):
+            return False
+    return True
+
+
+def classify_path(path, rules=CATEGORY_RULES):
+    """Returns the indexes of the rules a category path matches, in table order."""
+
+    matched = list()
+    for index, rule in enumerate(rules):
+        if matches_levels(path, rule["levels"]):
+            matched.append(index)
+            if rule.get("exclusive"):
+                break
+    return matched
+
+
+def crawler_caches(cache_dir=dats_cache.DEFAULT_CACHE_DIR, offline=False):
+    """Returns the ResponseCache for the metadata-type and metadata calls and the one for the category calls, or
+    (None, None) when dats_replay is recording or replaying, so that every request reaches the fixture archive.
+    """
+
+    if dats_replay.ACTIVE is not None:
+        return None, None
+    return (dats_cache.ResponseCache(cache_dir, offline=offline),
+            dats_cache.ResponseCache(os.path.join(cache_dir, CATEGORY_CACHE_DIR), ttl=CATEGORY_TTL, offline=offline))
+
+
+class Crawler:
+    """Walks the global identifiers of the MDC API and fetches the DATS of every released dataset that its category
+    path puts into a snapshot category: the metadata-type call tells datasets from the other digital objects, the
+    category call gives the path they are filed under, and the metadata call returns their DATS. Objects that aren't
+    datasets or whose path matches no rule cost one or two calls instead of three.
+
+    The calls for up to 'workers' identifiers are in flight at once over a pool of persistent connections. Each
+    identifier's category is looked up once per crawler, with concurrent lookups of the same one waiting for the call
+    in flight, and each distinct path is classified once. 'cache' and 'category_cache' are ResponseCaches that keep
+    the responses between runs (see crawler_caches). The calls made to each endpoint are counted in 'requests'.
+    """
+
+    def __init__(self, api_url, header, workers=DEFAULT_WORKERS, cache=None, category_cache=None,
+                 rules=CATEGORY_RULES, timeout=dats_http.DEFAULT_TIMEOUT, retries=dats_http.DEFAULT_RETRIES):
+        self.api_url = api_url.rstrip("/")
+        self.header = header
+        self.workers = workers
+        self.cache = cache
+        self.category_cache = category_cache
+        self.rules = rules
+        self.retries = retries
+        self.pool = dats_http.ConnectionPool(timeout=timeout)
+        self.lock = threading.Lock()
+        self.category_paths = dict()
+        self.classified = dict()
+        self.hits = [0] * len(rules)
+        self.requests = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.category_reuses = 0
+        self.seconds = 0.0
+
+    def fetch(self, endpoint, path, identifier=None, cache=None):
+        """Calls an endpoint of the API, for an identifier if one is given, and returns the JSON in its response."""
+
+        url = self.api_url + path
+        if identifier is not None:
+            url = url + urllib.parse.quote(identifier, safe="")
+        with self.lock:
+            self.requests[endpoint] += 1
+        return dats_http.fetch_json(self.pool, url, self.header, retries=self.retries, cache=cache)
+
+    def identifiers(self):
+        """Returns the global identifiers of every released digital object, each once, in the order the API lists
+        them.
+        """
+
+        identifiers = self.fetch("identifiers", IDENTIFIERS_PATH)
+        return list(dict.fromkeys(identifier for identifier in identifiers
+                                  if isinstance(identifier, str) and identifier not in UNRELEASED_IDENTIFIERS))
+
+    def category_path(self, identifier):
+        """Returns the category path of an identifier as a tuple. Only the first lookup of an identifier calls the
+        API; later ones, including those made while the call is in flight, get the same answer.
+        """
+
+        with self.lock:
+            future = self.category_paths.get(identifier)
+            owner = future is None
+            if owner:
+                future = self.category_paths[identifier] = Future()
+            else:
+                self.category_reuses += 1
+
+        if owner:
+            try:
+                path = self.fetch("category", CATEGORY_PATH, identifier, self.category_cache)
+                future.set_result(tuple(path) if isinstance(path, list) else ())
+            except Exception as e:
+                # A failed lookup isn't kept, so the next one for the identifier tries again
+                with self.lock:
+                    del self.category_paths[identifier]
+                future.set_exception(e)
+        return future.result()
+
+    def classify(self, path):
+        """Returns the snapshot categories of a category path and counts a hit for each rule it matched."""
+
+        matched = self.classified.get(path)
+        if matched is None:
+            matched = self.classified[path] = classify_path(path, self.rules)
+
+        categories = list()
+        with self.lock:
+            for index in matched:
+                self.hits[index] += 1
+                if self.rules[index]["category"] not in categories:
+                    categories.append(self.rules[index]["category"])
+        return categories
+
+    def visit(self, identifier):
+        """Makes the calls for one identifier. Returns None if it isn't a dataset, and otherwise its categories, its
+        DATS (None if it is in no category), and the error that stopped it (None if nothing did).
+        """
+
+        try:
+            metadata_type = self.fetch("metadata-type", METADATA_TYPE_PATH, identifier, self.cache)
+            if not isinstance(metadata_type, dict) or metadata_type.get("datatype") != "Dataset":
+                return None
+            categories = self.classify(self.category_path(identifier))
+            if not categories:
+                return categories, None, None
+            return categories, self.fetch("metadata", METADATA_PATH, identifier, self.cache), None
+        except Exception as e:
+            return list(), None, e
+
+    def crawl(self, identifiers=None):
+        """Yields (identifier, categories, DATS, error) for every dataset among the identifiers, by default all of
+        the API's, in their order. At most twice as many identifiers as there are workers are queued at once, so the
+        crawl can be stopped early without waiting for the whole list.
+        """
+
+        if identifiers is None:
+            identifiers = self.identifiers()
+
+        start = time.perf_counter()
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            try:
+                for identifier in identifiers:
+                    pending.append((identifier, executor.submit(self.visit, identifier)))
+                    while len(pending) >= 2 * self.workers or (pending and pending[0][1].done()):
+                        identifier, future = pending.popleft()
+                        if future.result() is not None:
+                            yield (identifier,) + future.result()
+                while pending:
+                    identifier, future = pending.popleft()
+                    if future.result() is not None:
+                        yield (identifier,) + future.result()
+            finally:
+                # Identifiers that haven't started are dropped if the crawl is stopped early
+                for identifier, future in pending:
+                    future.cancel()
+                self.seconds += time.perf_counter() - start
+
+    def close(self):
+        """Closes the crawler's connections. Call it once the crawl is over."""
+
+        self.pool.close()
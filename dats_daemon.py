@@ -0,0 +1,234 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import traceback
+import urllib.request
+import datetime as dt
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import dats_json_parser as parser
+
+
+DEFAULT_INTERVAL = 60 * 60
+DEFAULT_EVENTS = "file:dats-events.jsonl"
+WEBHOOK_TIMEOUT = 10
+HEADER = {"Accept": "application/json"}
+
+
+def change_events(summary, harvested_at, source):
+    """Turns the changes of an incremental harvest into events: one per added, modified, or removed dataset, plus one
+    'harvest' event that summarizes the cycle.
+    """
+
+    events = list()
+    for change in ("added", "modified", "removed"):
+        for record in summary["changes"][change]:
+            events.append({"event": change, "key": record["key"], "title": record["title"],
+                           "harvested_at": harvested_at, "source": source})
+
+    events.append({"event": "harvest", "harvested_at": harvested_at, "source": source,
+                   "datasets": summary["datasets"], "reused": summary["reused"],
+                   "added": len(summary["changes"]["added"]), "modified": len(summary["changes"]["modified"]),
+                   "removed": len(summary["changes"]["removed"]),
+                   "files": [written["fname"] for written in summary["report"]]})
+    return events
+
+
+def emit_to_file(fname, events):
+    """Appends events to a JSON Lines file."""
+
+    with open(fname, "a", encoding="utf-8") as events_f:
+        for event in events:
+            events_f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def emit_to_webhook(url, events):
+    """POSTs the events of a cycle to a webhook as one JSON array."""
+
+    body = json.dumps(events, ensure_ascii=False).encode("utf-8")
+    request = urllib.request.Request(url, data=body, method="POST", headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT) as response:
+        response.read()
+
+
+def emit_to_spool(directory, events):
+    """Drops each event into a spool directory as its own JSON file. Files are written under a temporary name and
+    renamed, so a consumer that picks up '*.json' in name order never sees a partial event.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+    stamp = time.time_ns()
+    for sequence, event in enumerate(events):
+        fname = os.path.join(directory, "{}-{:06d}.json".format(stamp, sequence))
+        with open(fname + ".tmp", "w", encoding="utf-8") as event_f:
+            json.dump(event, event_f, ensure_ascii=False)
+        os.replace(fname + ".tmp", fname)
+
+
+EVENT_SINKS = {"file": emit_to_file, "spool": emit_to_spool, "http": emit_to_webhook, "https": emit_to_webhook}
+
+
+def event_sink(spec):
+    """Parses an events option, 'file:PATH', 'spool:DIRECTORY', or a webhook URL, into a function that takes a list
+    of events.
+    """
+
+    kind, _, target = spec.partition(":")
+    if kind not in EVENT_SINKS or not target:
+        raise argparse.ArgumentTypeError("expected file:PATH, spool:DIRECTORY, or an http:// webhook URL")
+    if kind in ("http", "https"):
+        target = spec
+    emit = EVENT_SINKS[kind]
+    return lambda events: emit(target, events)
+
+
+class Counters:
+    """Latency and throughput counters of the daemon, safe to read from the metrics server thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {"started_at": dt.datetime.now().isoformat(timespec="seconds"),
+                       "cycles": 0,
+                       "failures": 0,
+                       "events_emitted": 0,
+                       "event_failures": 0,
+                       "datasets_harvested": 0,
+                       "last_success": None,
+                       "last_error": None,
+                       "last_cycle_seconds": None,
+                       "last_emit_seconds": None,
+                       "last_datasets_per_second": None,
+                       "total_cycle_seconds": 0.0}
+
+    def update(self, **values):
+        with self.lock:
+            self.values.update(values)
+
+    def add(self, **increments):
+        with self.lock:
+            for name, increment in increments.items():
+                self.values[name] += increment
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.values)
+
+
+def serve_metrics(counters, port):
+    """Serves the counters as JSON on localhost from a background thread."""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = json.dumps(counters.snapshot()).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_cycle(args, emit, counters):
+    """Runs one incremental harvest, writes its snapshots, and emits its change events."""
+
+    today = dt.datetime.today().strftime("%Y-%m-%d_T%H-%M")
+    start = time.perf_counter()
+
+    # The data standards are picked out of the same pass over the contents, so a cycle fetches them only once
+    data_standards = list() if args.data_formats else None
+    summary = parser.harvest_dataset_categories(args.source, HEADER, today, incremental=True,
+                                                state_file=args.state_file, workers=args.workers,
+                                                columnar=args.columnar, archive=args.archive,
+                                                data_standards=data_standards)
+    if args.data_formats:
+        parser.harvest_data_formats(args.source, HEADER, today, columnar=args.columnar, archive=args.archive,
+                                    elements=data_standards)
+    harvest_seconds = time.perf_counter() - start
+
+    events = change_events(summary, dt.datetime.now().isoformat(timespec="seconds"), args.source)
+    emit_start = time.perf_counter()
+    try:
+        emit(events)
+        counters.add(events_emitted=len(events))
+    except Exception as exc:
+        counters.add(event_failures=1)
+        print("Could not emit events:", exc, file=sys.stderr)
+    emit_seconds = time.perf_counter() - emit_start
+
+    cycle_seconds = time.perf_counter() - start
+    counters.add(cycles=1, datasets_harvested=summary["datasets"], total_cycle_seconds=cycle_seconds)
+    counters.update(last_success=dt.datetime.now().isoformat(timespec="seconds"),
+                    last_cycle_seconds=round(cycle_seconds, 3),
+                    last_emit_seconds=round(emit_seconds, 3),
+                    last_datasets_per_second=round(summary["datasets"] / harvest_seconds, 1))
+    return summary
+
+
+def write_metrics(fname, counters):
+    """Replaces the metrics file with the current counters."""
+
+    with open(fname + ".tmp", "w", encoding="utf-8") as metrics_f:
+        json.dump(counters.snapshot(), metrics_f, indent=2)
+    os.replace(fname + ".tmp", fname)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Polls the MDC contents API on a schedule, harvests what changed, "
+                                                     "and emits change events.")
+    arg_parser.add_argument("source", nargs="?", default=parser.CONTENTS_URL,
+                            help="contents API URL, or the path of a saved contents response")
+    arg_parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                            help="seconds between the starts of two harvests (default: %(default)s)")
+    arg_parser.add_argument("--once", action="store_true", help="run a single harvest and exit, e.g. from cron")
+    arg_parser.add_argument("--events", type=event_sink, default=DEFAULT_EVENTS,
+                            help="where change events go: file:PATH, spool:DIRECTORY, or an http://localhost webhook "
+                                 "URL (default: %(default)s)")
+    arg_parser.add_argument("--state-file", default=parser.DEFAULT_STATE_FILE)
+    arg_parser.add_argument("--workers", type=int, default=1)
+    arg_parser.add_argument("--columnar", choices=sorted(parser.dats_columnar.COLUMNAR_FORMATS))
+    arg_parser.add_argument("--archive", metavar="ARCHIVE")
+    arg_parser.add_argument("--data-formats", action="store_true", help="write the data formats snapshot too")
+    arg_parser.add_argument("--json-decoder", choices=["auto"] + sorted(parser.dats_decode.DECODERS), default="json")
+    arg_parser.add_argument("--metrics-file", default="dats-daemon-metrics.json",
+                            help="rewritten with the counters after every harvest (default: %(default)s)")
+    arg_parser.add_argument("--metrics-port", type=int, help="also serve the counters as JSON on this localhost port")
+    args = arg_parser.parse_args()
+    parser.dats_decode.use_decoder(args.json_decoder)
+
+    counters = Counters()
+    if args.metrics_port:
+        serve_metrics(counters, args.metrics_port)
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+
+    next_start = time.monotonic()
+    while not stopping.is_set():
+        try:
+            summary = run_cycle(args, args.events, counters)
+            print(dt.datetime.now().isoformat(timespec="seconds"), "harvested", summary["datasets"], "datasets:",
+                  len(summary["changes"]["added"]), "added,", len(summary["changes"]["modified"]), "modified,",
+                  len(summary["changes"]["removed"]), "removed")
+        except Exception as exc:
+            counters.add(failures=1)
+            counters.update(last_error="{}: {}".format(type(exc).__name__, exc))
+            traceback.print_exc()
+        write_metrics(args.metrics_file, counters)
+
+        if args.once:
+            break
+        # Schedule from the planned start, not the finish, so the cadence doesn't drift with harvest time; a harvest
+        # that overran its slot is followed straight away rather than by a burst of catch-up harvests
+        next_start = max(next_start + args.interval, time.monotonic())
+        stopping.wait(max(0.0, next_start - time.monotonic()))
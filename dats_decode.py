@@ -0,0 +1,147 @@
+import gc
+import io
+import json
+import mmap
+import codecs
+from contextlib import contextmanager
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# MDC responses have always been decoded as latin-1, which maps every byte to a character, so that stays the
+# encoding of saved dumps and of responses that don't declare a charset.
+DEFAULT_ENCODING = "latin-1"
+
+
+def response_charset(headers, default=DEFAULT_ENCODING):
+    """Returns the charset declared in the Content-Type of a response, or 'default' if there is none or Python
+    doesn't know it.
+    """
+
+    if headers is None:
+        return default
+    charset = headers.get_content_charset()
+    if not charset:
+        return default
+    try:
+        return codecs.lookup(charset).name
+    except LookupError:
+        return default
+
+
+@contextmanager
+def gc_paused():
+    """Pauses the cyclic garbage collector for a block of code.
+
+    Decoding a large document allocates hundreds of thousands of dicts and lists, and every few hundred of them
+    trigger a collection that walks all the containers decoded so far, which takes most of the time of a big decode.
+    Decoded JSON can't contain reference cycles, so there is nothing for those collections to find.
+    """
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class StdlibDecoder:
+    """Decodes JSON with the json module. Bytes are decoded to text with the given encoding first, exactly as the
+    harvest always has.
+    """
+
+    name = "json"
+
+    def loads(self, data, encoding=None):
+        """Decodes a JSON document from bytes, a memoryview, or a str."""
+
+        if not isinstance(data, str):
+            data = str(data, encoding or DEFAULT_ENCODING)
+        with gc_paused():
+            return json.loads(data)
+
+
+class OrjsonDecoder(StdlibDecoder):
+    """Decodes JSON with orjson. UTF-8 bytes are handed to orjson as they are, without first being copied into a
+    str; bytes in any other encoding are decoded to text first, so both decoders see the same characters.
+
+    orjson rejects a few documents the json module accepts, such as NaN, Infinity, and lone surrogate escapes. Those
+    are decoded again with the json module, so switching decoders never changes what a harvest accepts. Integers
+    past 64 bits are the one difference that remains: orjson turns them into floats, where the json module keeps
+    them exact.
+    """
+
+    name = "orjson"
+
+    def __init__(self):
+        if orjson is None:
+            raise ImportError("The orjson decoder needs orjson, which can be installed with 'pip install orjson'")
+
+    def loads(self, data, encoding=None):
+        """Decodes a JSON document from bytes, a memoryview, or a str."""
+
+        if not isinstance(data, str) and codecs.lookup(encoding or DEFAULT_ENCODING).name != "utf-8":
+            data = str(data, encoding or DEFAULT_ENCODING)
+        try:
+            with gc_paused():
+                return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return StdlibDecoder.loads(self, data, encoding)
+
+
+DECODERS = {"json": StdlibDecoder, "orjson": OrjsonDecoder}
+
+
+def available_decoders():
+    """Lists the names of the decoders that can be used here."""
+
+    return [name for name in DECODERS if name != "orjson" or orjson is not None]
+
+
+def get_decoder(name="json"):
+    """Returns a decoder by name. 'auto' picks orjson when it is installed and the json module otherwise."""
+
+    if name == "auto":
+        name = "orjson" if orjson is not None else "json"
+    if name not in DECODERS:
+        raise ValueError("Unknown JSON decoder: " + name)
+    return DECODERS[name]()
+
+
+# The decoder call_api and dats_http decode whole responses with
+ACTIVE = StdlibDecoder()
+
+
+def use_decoder(name):
+    """Switches the decoder used for the rest of the run and returns it."""
+
+    global ACTIVE
+    ACTIVE = get_decoder(name)
+    return ACTIVE
+
+
+def loads(data, encoding=None):
+    """Decodes a JSON document with the active decoder."""
+
+    return ACTIVE.loads(data, encoding)
+
+
+def load(fp, encoding=None):
+    """Decodes the JSON document in a binary file object with the active decoder. Files on disk are memory-mapped,
+    so their bytes are handed to the decoder without being read into a copy first.
+    """
+
+    data = None
+    if isinstance(fp, io.BufferedReader):
+        try:
+            data = memoryview(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ))
+        except (OSError, ValueError):
+            pass
+    if data is None:
+        data = fp.read()
+    return loads(data, encoding)
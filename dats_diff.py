@@ -0,0 +1,130 @@
+import sys
+import csv
+import json
+import argparse
+import operator
+
+
+# Older snapshots used camelCase column names; they are compared under the names write_to_file uses today
+COLUMN_ALIASES = {"datasetIdentifier": "dataset_identifier",
+                  "landingPage": "landing_page",
+                  "accessPage": "access_page",
+                  "conformsTo": "conforms_to",
+                  "apolloLocationCode": "apollo_location_code",
+                  "ISO_3166": "iso_3166",
+                  "ISO_3166-1": "iso_3166_1",
+                  "ISO_3166-1_alpha-3": "iso_3166_1_alpha_3"}
+
+KEY_COLUMNS = ("dataset_identifier", "identifier")
+
+
+def load_columns(fname, encoding="latin-1"):
+    """Reads a snapshot into a columnar table: a dictionary that maps each column name to the list of its values."""
+
+    with open(fname, encoding=encoding, newline="") as t_name:
+        reader = csv.reader(t_name, dialect="excel-tab")
+        header = next(reader, list())
+        rows = [row for row in reader if row]
+
+    width = len(header)
+    rows = [row + [""] * (width - len(row)) if len(row) < width else row for row in rows]
+    columns = zip(*rows) if rows else [() for _ in header]
+    return {COLUMN_ALIASES.get(name, name): list(values) for name, values in zip(header, columns)}
+
+
+def table_keys(table, key_column):
+    """Returns the join key of every row. Rows that repeat a key get an occurrence suffix so they stay distinct."""
+
+    counts = dict()
+    keys = list()
+
+    for key in table[key_column]:
+        occurrence = counts.get(key, 0) + 1
+        counts[key] = occurrence
+        keys.append(key if occurrence == 1 else "{}#{}".format(key, occurrence))
+    return keys
+
+
+def gather(values, indexes):
+    """Picks the values at the given positions of a column in one C-level call."""
+
+    if not indexes:
+        return list()
+    if len(indexes) == 1:
+        return [values[indexes[0]]]
+    return list(operator.itemgetter(*indexes)(values))
+
+
+def diff_tables(old, new, key_column=None):
+    """Joins two columnar snapshot tables on their identifier column and compares them column by column. Returns a
+    report of added and removed records, added and removed columns, and every changed value per column.
+    """
+
+    if key_column is None:
+        key_column = next(column for column in KEY_COLUMNS if column in old and column in new)
+
+    old_keys = table_keys(old, key_column)
+    new_keys = table_keys(new, key_column)
+    old_index = {key: i for i, key in enumerate(old_keys)}
+    new_index = {key: i for i, key in enumerate(new_keys)}
+
+    shared = [key for key in new_keys if key in old_index]
+    old_positions = [old_index[key] for key in shared]
+    new_positions = [new_index[key] for key in shared]
+
+    report = {"key": key_column,
+              "records": {"old": len(old_keys), "new": len(new_keys), "shared": len(shared)},
+              "added": [key for key in new_keys if key not in old_index],
+              "removed": [key for key in old_keys if key not in new_index],
+              "columns_added": [column for column in new if column not in old],
+              "columns_removed": [column for column in old if column not in new],
+              "changes": dict(),
+              "modified": list()}
+
+    modified = set()
+    for column in new:
+        if column not in old or column == key_column:
+            continue
+        old_values = gather(old[column], old_positions)
+        new_values = gather(new[column], new_positions)
+
+        changed = [{"key": key, "old": a, "new": b}
+                   for key, a, b in zip(shared, old_values, new_values) if a != b]
+        if changed:
+            report["changes"][column] = changed
+            modified.update(change["key"] for change in changed)
+
+    report["modified"] = [key for key in shared if key in modified]
+    return report
+
+
+def diff_snapshots(old_fname, new_fname, key_column=None):
+    """Diffs two snapshot files and returns the change report."""
+
+    report = diff_tables(load_columns(old_fname), load_columns(new_fname), key_column)
+    report["old"] = old_fname
+    report["new"] = new_fname
+    return report
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Compares two harvest snapshots and writes a JSON change report.")
+    arg_parser.add_argument("old", help="older snapshot, e.g. tycho-dats-info/tycho-dats-info-2018-07-19_T14-37.txt")
+    arg_parser.add_argument("new", help="newer snapshot, e.g. tycho-dats-info/tycho-dats-info-2019-05-01_T14-31.txt")
+    arg_parser.add_argument("--key", help="column to join on (defaults to dataset_identifier, then identifier)")
+    arg_parser.add_argument("-o", "--output", help="write the report here instead of to stdout")
+    args = arg_parser.parse_args()
+
+    report = diff_snapshots(args.old, args.new, args.key)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as report_f:
+            json.dump(report, report_f, indent=2, ensure_ascii=False)
+    else:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+
+    print("Added: ", len(report["added"]), " Removed: ", len(report["removed"]),
+          " Modified: ", len(report["modified"]), file=sys.stderr)
+    for column, changed in report["changes"].items():
+        print("\t", column + ": ", len(changed), file=sys.stderr)
@@ -0,0 +1,404 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+import threading
+import http.client
+import urllib.error
+import urllib.request
+import datetime as dt
+
+import dats_decode
+import dats_replay
+
+
+DEFAULT_SPOOL_DIR = ".dats-downloads"
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+# The checkpoint is rewritten, after the spool file is synced, every time this many more bytes are saved
+CHECKPOINT_BYTES = 1024 * 1024
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 1.0
+PROGRESS_INTERVAL = 0.5
+
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class Progress:
+    """Counts the bytes and records of every download in the run and prints their rates to stderr, on one line that
+    is rewritten at most every 'interval' seconds. Downloads on several threads share one Progress.
+    """
+
+    def __init__(self, interval=PROGRESS_INTERVAL, stream=sys.stderr):
+        self.interval = interval
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.printed = 0.0
+        self.bytes = 0
+        self.resumed_bytes = 0
+        self.records = 0
+        self.totals = dict()
+
+    def add(self, nbytes=0, records=0):
+        with self.lock:
+            self.bytes += nbytes
+            self.records += records
+            now = time.perf_counter()
+            if now - self.printed >= self.interval:
+                self.printed = now
+                self.stream.write("\r" + self.line(now) + " ")
+                self.stream.flush()
+
+    def resumed(self, nbytes):
+        """Notes the bytes of a download that were already saved by an earlier run."""
+
+        with self.lock:
+            self.resumed_bytes += nbytes
+
+    def set_total(self, url, total):
+        with self.lock:
+            self.totals[url] = total
+
+    def line(self, now=None):
+        """Returns the progress line: bytes saved out of the total when it is known, and the byte and record rates."""
+
+        elapsed = max((now or time.perf_counter()) - self.started, 1e-9)
+        done = self.bytes + self.resumed_bytes
+        text = "{:.1f} MB".format(done / 1e6)
+        if self.totals and None not in self.totals.values():
+            total = sum(self.totals.values())
+            text += " of {:.1f} MB ({:.0%})".format(total / 1e6, done / total if total else 1.0)
+        return text + ", {:.2f} MB/s, {:.0f} records/s".format(self.bytes / elapsed / 1e6, self.records / elapsed)
+
+    def finish(self):
+        """Prints the final line and ends it."""
+
+        with self.lock:
+            self.stream.write("\r" + self.line() + "\n")
+            self.stream.flush()
+
+
+class ContentsDownload:
+    """A binary file object that reads a contents response while saving it to a spool file, so that a harvest that is
+    interrupted, by a dropped connection or by the process stopping, resumes where it stopped instead of starting over.
+
+    The response is requested in HTTP Range chunks of 'chunk_size' bytes, each resumed from the last byte saved if its
+    connection drops. A server that ignores Range is streamed whole instead, skipping the bytes that were already
+    saved. Progress is kept in a checkpoint next to the spool file: the URL, the bytes saved, the total size, and the
+    ETag or Last-Modified that the server has to still report for the saved bytes to be reused.
+
+    A new ContentsDownload for a URL with a checkpoint first hands out the saved bytes, then carries on from the
+    network. discard() removes the spool file and checkpoint once the response has been read in full.
+    """
+
+    def __init__(self, url, header, spool_fname, chunk_size=DEFAULT_CHUNK_SIZE, retries=DEFAULT_RETRIES,
+                 backoff=DEFAULT_BACKOFF, progress=None):
+        self.url = url
+        self.header = header
+        self.spool_fname = spool_fname
+        self.checkpoint_fname = spool_fname + ".checkpoint"
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.backoff = backoff
+        self.progress = progress
+
+        # Byte ranges are recorded and replayed under the URL alone, so fixture runs fetch the response whole
+        self.ranges = bool(chunk_size) and dats_replay.ACTIVE is None
+
+        self.saved = 0
+        self.position = 0
+        self.checkpointed = 0
+        self.total = None
+        self.validator = None
+        self.charset = None
+        self.response = None
+        self.response_end = None
+        self.skip = 0
+        self.attempt = 0
+        self.done = False
+
+        checkpoint = self.load_checkpoint()
+        if checkpoint is not None:
+            self.saved = self.checkpointed = checkpoint["bytes"]
+            self.total = checkpoint["total"]
+            self.validator = checkpoint["validator"]
+            self.charset = checkpoint["charset"]
+        directory = os.path.dirname(spool_fname)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.spool = open(spool_fname, "r+b" if self.saved else "w+b")
+        self.spool.truncate(self.saved)
+
+        # The first request goes out before anything is read, so a response that changed since the checkpoint is
+        # caught while the saved bytes can still be thrown away
+        try:
+            self.connect()
+        except BaseException:
+            self.close()
+            raise
+        if self.progress is not None:
+            self.progress.resumed(self.saved)
+            self.progress.set_total(url, self.total)
+
+    def load_checkpoint(self):
+        """Returns the checkpoint of an earlier run for this URL whose bytes are all in the spool file, or None."""
+
+        try:
+            with open(self.checkpoint_fname, encoding="utf-8") as checkpoint_f:
+                checkpoint = json.load(checkpoint_f)
+        except (OSError, ValueError):
+            return None
+        if checkpoint.get("url") != self.url:
+            return None
+        try:
+            if os.path.getsize(self.spool_fname) < checkpoint["bytes"]:
+                return None
+        except OSError:
+            return None
+        return checkpoint
+
+    def save_checkpoint(self):
+        """Syncs the spool file and records how much of it is saved."""
+
+        self.spool.flush()
+        os.fsync(self.spool.fileno())
+        checkpoint = {"url": self.url, "bytes": self.saved, "total": self.total, "validator": self.validator,
+                      "charset": self.charset, "saved_at": dt.datetime.now().isoformat(timespec="seconds")}
+        with open(self.checkpoint_fname + ".tmp", "w", encoding="utf-8") as checkpoint_f:
+            json.dump(checkpoint, checkpoint_f)
+        os.replace(self.checkpoint_fname + ".tmp", self.checkpoint_fname)
+        self.checkpointed = self.saved
+
+    def restart(self):
+        """Throws the saved bytes away, after the response changed under them."""
+
+        self.saved = self.position = self.checkpointed = 0
+        self.total = self.validator = None
+        self.spool.truncate(0)
+        try:
+            os.remove(self.checkpoint_fname)
+        except OSError:
+            pass
+
+    def open_response(self):
+        """Requests the bytes from the last one saved, as a Range chunk or as the whole response. When every byte is
+        already saved, only the last one is asked for, to check that the saved response is still current.
+        """
+
+        start = self.saved
+        complete = self.total is not None and self.saved >= self.total
+        if complete:
+            start = self.total - 1
+
+        header = dict(self.header)
+        if self.ranges and self.saved and self.validator:
+            header["If-Range"] = self.validator
+        if self.ranges:
+            end = start + self.chunk_size - 1
+            if self.total is not None:
+                end = min(end, self.total - 1)
+            header["Range"] = "bytes={}-{}".format(start, end)
+
+        response = dats_replay.urlopen(urllib.request.Request(self.url, headers=header))
+
+        validator = response_validator(response.headers)
+        if response.status == 206:
+            response_start, response_end, total = parse_content_range(response.headers.get("Content-Range"))
+        else:
+            # The server ignored the Range, or sent the whole response because it changed since the checkpoint
+            length = response.headers.get("Content-Length")
+            total = int(length) if length and length.isdigit() else None
+
+        # Without a validator, a change in size is the only sign that the saved bytes are stale
+        if self.saved and (validator != self.validator or None not in (total, self.total) and total != self.total):
+            response.close()
+            if self.position:
+                self.restart()
+                raise ValueError("{} changed while it was being harvested; the next harvest starts it over"
+                                 .format(self.url))
+            self.restart()
+            return self.open_response()
+
+        if response.status == 206:
+            if complete:
+                response.close()
+                self.done = True
+                return
+            if response_start != start:
+                response.close()
+                raise ValueError("Asked {} for bytes from {} but got them from {}".format(self.url, start,
+                                                                                      response_start))
+            self.response_end = response_end + 1
+            self.skip = 0
+        else:
+            self.ranges = False
+            self.response_end = None
+            self.skip = self.saved
+
+        self.response = response
+        self.total = total
+        self.validator = validator
+        if self.charset is None:
+            self.charset = dats_decode.response_charset(response.headers, None)
+
+    def connect(self):
+        """Opens the next response, retrying failed connections and 5xx statuses with exponential backoff."""
+
+        while True:
+            try:
+                return self.open_response()
+            except (OSError, http.client.HTTPException) as e:
+                if isinstance(e, urllib.error.HTTPError) and e.code < 500:
+                    raise
+                self.retry(e)
+
+    def close_response(self):
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+
+    def retry(self, error):
+        """Waits before the next attempt after a failed request or read, or raises the error once out of retries."""
+
+        self.close_response()
+        if self.saved > self.checkpointed:
+            self.save_checkpoint()
+        if self.attempt >= self.retries:
+            raise error
+        time.sleep(self.backoff * (2 ** self.attempt))
+        self.attempt += 1
+
+    def read(self, size=-1):
+        """Reads up to 'size' bytes: the ones an earlier run saved first, then the rest of the response."""
+
+        if size is None or size < 0:
+            size = DEFAULT_CHUNK_SIZE
+
+        if self.position < self.saved:
+            self.spool.seek(self.position)
+            data = self.spool.read(min(size, self.saved - self.position))
+            self.position += len(data)
+            return data
+
+        while not self.done:
+            if self.total is not None and self.saved >= self.total:
+                self.done = True
+                break
+            if self.response is None:
+                self.connect()
+                continue
+            try:
+                data = self.response.read(size)
+            except (OSError, http.client.HTTPException) as e:
+                if isinstance(e, urllib.error.HTTPError) and e.code < 500:
+                    raise
+                self.retry(e)
+                continue
+
+            if not data:
+                self.close_response()
+                expected = self.response_end if self.response_end is not None else self.total
+                if expected is None:
+                    self.done = True
+                elif self.saved < expected:
+                    self.retry(http.client.IncompleteRead(b"", expected - self.saved))
+                continue
+
+            if self.skip:
+                dropped = min(self.skip, len(data))
+                self.skip -= dropped
+                data = data[dropped:]
+                if not data:
+                    continue
+
+            self.spool.seek(self.saved)
+            self.spool.write(data)
+            self.saved += len(data)
+            self.position += len(data)
+            self.attempt = 0
+            if self.saved - self.checkpointed >= CHECKPOINT_BYTES:
+                self.save_checkpoint()
+            if self.progress is not None:
+                self.progress.add(nbytes=len(data))
+            return data
+
+        if self.saved > self.checkpointed:
+            self.save_checkpoint()
+        return b""
+
+    def close(self):
+        """Closes the response and the spool file, keeping the checkpoint for the next run."""
+
+        self.close_response()
+        if not self.spool.closed:
+            if self.saved > self.checkpointed:
+                self.save_checkpoint()
+            self.spool.close()
+
+    def discard(self):
+        """Closes the download and removes its spool file and checkpoint, once they are no longer needed."""
+
+        self.close_response()
+        self.spool.close()
+        for fname in (self.spool_fname, self.checkpoint_fname):
+            try:
+                os.remove(fname)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def response_validator(headers):
+    """Returns the strong ETag of a response, or its Last-Modified date, which If-Range can compare; or None."""
+
+    etag = headers.get("ETag")
+    if etag and not etag.startswith("W/"):
+        return etag
+    return headers.get("Last-Modified")
+
+
+def parse_content_range(value):
+    """Parses a 'bytes start-end/total' Content-Range into integers, with None for an unknown total."""
+
+    found = CONTENT_RANGE.fullmatch((value or "").strip())
+    if found is None:
+        raise ValueError("Unexpected Content-Range: {!r}".format(value))
+    start, end, total = found.groups()
+    return int(start), int(end), None if total == "*" else int(total)
+
+
+class Downloads:
+    """Where resumable downloads are spooled, how big their chunks are, and the Progress they report to."""
+
+    def __init__(self, spool_dir=DEFAULT_SPOOL_DIR, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+        self.spool_dir = spool_dir
+        self.chunk_size = chunk_size
+        self.progress = progress
+
+    def spool_fname(self, url):
+        """Returns the spool file of a URL, named after its hash so every catalog has its own."""
+
+        return os.path.join(self.spool_dir, "contents-" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:16] + ".json")
+
+    def open(self, url, header):
+        return ContentsDownload(url, header, self.spool_fname(url), self.chunk_size, progress=self.progress)
+
+
+# The Downloads contents responses are retrieved through, or None to stream them in one request as usual
+ACTIVE = None
+
+
+def enable(spool_dir=DEFAULT_SPOOL_DIR, chunk_size=DEFAULT_CHUNK_SIZE, progress=False):
+    """Retrieves contents responses resumably for the rest of the run, and returns the Downloads."""
+
+    global ACTIVE
+    ACTIVE = Downloads(spool_dir, chunk_size, Progress() if progress else None)
+    return ACTIVE
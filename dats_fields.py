@@ -0,0 +1,210 @@
+import re
+from itertools import count
+
+
+# The value of a path that isn't there
+MISSING = object()
+
+IDENTIFIER = re.compile(r"[A-Za-z_][A-Za-z0-9_]*\Z")
+
+
+def split_path(path):
+    """Splits a dotted path such as 'distributions.0.access.landingPage' into its steps: keys as strings and list
+    indexes as integers. A list or tuple of steps is returned as a list unchanged.
+    """
+
+    if isinstance(path, (list, tuple)):
+        return list(path)
+    return [int(step) if step.isdigit() else step for step in path.split(".")]
+
+
+def has_path(field):
+    return "path" in field or "paths" in field
+
+
+def field_paths(field):
+    """Returns the paths of a field as lists of steps."""
+
+    return [split_path(path) for path in field.get("paths") or [field["path"]]]
+
+
+class PathTree:
+    """The paths read by a set of fields, merged on their common prefixes so each prefix is walked once."""
+
+    def __init__(self):
+        self.values = list()
+        self.keys = dict()
+        self.indexes = dict()
+
+    def add(self, steps, value):
+        """Adds a path whose value goes to the variable 'value'."""
+
+        node = self
+        for step in steps:
+            children = node.indexes if isinstance(step, int) else node.keys
+            node = children.setdefault(step, PathTree())
+        node.values.append(value)
+
+    def source(self, node, names, indent=""):
+        """Returns the lines of code that walk the variable 'node' down every path and assign the value at the end of
+        each one to its variable. A step that lands on a value of the wrong type, a missing key, or an index out of
+        range leaves the variables below it MISSING. 'names' numbers the intermediate variables.
+        """
+
+        lines = ["{}{} = {}".format(indent, value, node) for value in self.values]
+        if self.keys:
+            lines.append("{}if type({}) is dict:".format(indent, node))
+            for key, tree in self.keys.items():
+                if tree.is_leaf():
+                    lines.append("{}    {} = {}.get({!r}, MISSING)".format(indent, tree.values[0], node, key))
+                    continue
+                child = "node_{}".format(next(names))
+                lines.append("{}    {} = {}.get({!r}, MISSING)".format(indent, child, node, key))
+                lines.extend(tree.source(child, names, indent + "    "))
+        for index, tree in self.indexes.items():
+            child = "node_{}".format(next(names))
+            lines.append("{}if type({}) is list and len({}) > {}:".format(indent, node, node, index))
+            lines.append("{}    {} = {}[{}]".format(indent, child, node, index))
+            lines.extend(tree.source(child, names, indent + "    "))
+        return lines
+
+    def is_leaf(self):
+        """Tells whether exactly one path ends here and none goes further."""
+
+        return len(self.values) == 1 and not self.keys and not self.indexes
+
+    def walk_source(self, variables):
+        """Returns the lines of code that start every variable as MISSING and then walk the record."""
+
+        return ["{} = MISSING".format(value) for value in variables] + self.source("record", count())
+
+
+def finish_source(field, values, suffix, target="result"):
+    """Returns the lines of code that turn the values of the paths of a field into its column value in 'target'.
+
+    The one exception caught is the TypeError of str.join for a list with an item that isn't a string, since str.join
+    checks its items much faster than generated code could.
+    """
+
+    default = "default_" + suffix
+    if field.get("required"):
+        missing = "raise KeyError({!r})".format(field["column"])
+    else:
+        missing = "{} = {}".format(target, default)
+
+    lines = ["if {}:".format(" or ".join("{} is MISSING".format(value) for value in values)),
+             "    " + missing]
+    if len(values) > 1:
+        lines.append("elif {}:".format(" or ".join("type({}) is not str".format(value) for value in values)))
+        lines.append("    {} = {}".format(target, default))
+        lines.append("else:")
+        lines.append("    {} = separator_{}.join(({},))".format(target, suffix, ", ".join(values)))
+    elif field.get("join") is not None:
+        value = values[0]
+        lines.append("elif type({0}) is not list and type({0}) is not str and type({0}) is not dict:".format(value))
+        lines.append("    {} = {}".format(target, default))
+        lines.append("else:")
+        lines.append("    try:")
+        lines.append("        {} = separator_{}.join({})".format(target, suffix, value))
+        lines.append("    except TypeError:")
+        lines.append("        {} = {}".format(target, default))
+    else:
+        lines.append("else:")
+        lines.append("    {} = {}".format(target, values[0]))
+
+    empty = field.get("empty", ())
+    if empty == "falsy":
+        lines.append("    if not {0}: {0} = {1}".format(target, default))
+    elif empty:
+        lines.append("    if {0} in empty_{1}: {0} = {2}".format(target, suffix, default))
+    return lines
+
+
+def field_namespace(field, suffix):
+    """Returns the constants the code generated for a field refers to."""
+
+    empty = field.get("empty", ())
+    return {"default_" + suffix: field.get("default", "null"),
+            "separator_" + suffix: field.get("join"),
+            "empty_" + suffix: tuple(empty) if empty != "falsy" else ()}
+
+
+def compile_source(name, lines, namespace):
+    """Compiles the body of a function of one argument, 'record', and returns the function, with its source kept in
+    'source'.
+    """
+
+    source = "def {}(record):\n".format(name) + "".join("    " + line + "\n" for line in lines)
+    namespace = dict(namespace, MISSING=MISSING)
+    exec(compile(source, "<dats_fields {}>".format(name), "exec"), namespace)
+    function = namespace[name]
+    function.source = source
+    return function
+
+
+def compile_path(path):
+    """Compiles a path into a function that returns the value at the end of it in a DATS record, or MISSING."""
+
+    tree = PathTree()
+    tree.add(split_path(path), "value")
+    return compile_source("get_path", tree.walk_source(["value"]) + ["return value"], dict())
+
+
+def compile_table(fields, name="extract_fields"):
+    """Compiles every field of a table that has a path into one function that extracts all of their columns from a
+    DATS record and returns them in a dictionary. Paths with a common prefix share the walk down it.
+
+    A field has a 'column' and a 'path', or several 'paths' whose values are joined, and optionally:
+
+    - 'join': the separator a list value, or the values of several paths, are joined with. Every joined value has to
+      be a string.
+    - 'default': the value of the column when a path is missing or its value can't be used ('null' if not given).
+    - 'empty': values that also give the default, or 'falsy' for every false value.
+    - 'required': raise a KeyError instead of giving the default when a path is missing.
+
+    The generated code checks the type of every step instead of catching the exceptions a failed lookup raises, so a
+    record that lacks a field costs no more than one that has it. Fields without a path are skipped; they are filled
+    in by hand-written code.
+    """
+
+    tree = PathTree()
+    namespace = dict()
+    variables = list()
+    finish = list()
+    for index, field in enumerate(field for field in fields if has_path(field)):
+        suffix = str(index)
+        values = ["value_{}_{}".format(index, path_index) for path_index in range(len(field_paths(field)))]
+        for steps, value in zip(field_paths(field), values):
+            tree.add(steps, value)
+        variables.extend(values)
+        namespace.update(field_namespace(field, suffix))
+        finish.extend(finish_source(field, values, suffix))
+        finish.append("row[{!r}] = result".format(field["column"]))
+
+    lines = tree.walk_source(variables) + ["row = dict()"] + finish + ["return row"]
+    return compile_source(name, lines, namespace)
+
+
+def compile_field(field):
+    """Compiles one field of a table, as described in compile_table, into a function that returns its column value
+    for a DATS record.
+    """
+
+    tree = PathTree()
+    values = ["value_{}".format(path_index) for path_index in range(len(field_paths(field)))]
+    for steps, value in zip(field_paths(field), values):
+        tree.add(steps, value)
+
+    name = "extract_" + field["column"].replace("-", "_")
+    if not IDENTIFIER.match(name):
+        name = "extract_field"
+    lines = tree.walk_source(values) + finish_source(field, values, "0") + ["return result"]
+    return compile_source(name, lines, field_namespace(field, "0"))
+
+
+def compile_fields(fields):
+    """Compiles every field of a table that has a path, and returns a dictionary that maps each of their columns to
+    its extractor, in table order.
+    """
+
+    return {field["column"]: compile_field(field) for field in fields if has_path(field)}
@@ -0,0 +1,186 @@
+import time
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import dats_decode
+import dats_replay
+
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_TIMEOUT = 30
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5
+
+# Redirects are followed like urlopen follows them, up to the same number of hops
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 10
+
+
+class ConnectionPool:
+    """Keeps one persistent HTTP connection per host for each thread that uses the pool, so consecutive requests to
+    the MDC API reuse an open socket instead of reconnecting every time.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.opened = list()
+
+    def get_connection(self, scheme, netloc):
+        """Returns this thread's open connection to a host, creating it on first use."""
+
+        if not hasattr(self.local, "connections"):
+            self.local.connections = dict()
+
+        conn = self.local.connections.get((scheme, netloc))
+        if conn is None:
+            if scheme == "https":
+                conn = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+            else:
+                conn = http.client.HTTPConnection(netloc, timeout=self.timeout)
+            self.local.connections[(scheme, netloc)] = conn
+            with self.lock:
+                self.opened.append(conn)
+        return conn
+
+    def discard_connection(self, scheme, netloc):
+        """Closes and forgets this thread's connection to a host after it failed."""
+
+        conn = self.local.__dict__.get("connections", dict()).pop((scheme, netloc), None)
+        if conn is not None:
+            conn.close()
+
+    def request(self, url, header):
+        """Sends a GET request over a pooled connection and returns the status, response headers, and body bytes.
+        The response is recorded or replayed if dats_replay is doing either.
+        """
+
+        return dats_replay.fetch(url, lambda: self.send(url, header))
+
+    def send(self, url, header):
+        """Sends a GET request over a pooled connection, bypassing dats_replay."""
+
+        parts = urllib.parse.urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path = path + "?" + parts.query
+
+        conn = self.get_connection(parts.scheme, parts.netloc)
+        try:
+            conn.request("GET", path, headers=header)
+            response = conn.getresponse()
+            body = response.read()
+        except Exception:
+            self.discard_connection(parts.scheme, parts.netloc)
+            raise
+
+        if response.will_close:
+            self.discard_connection(parts.scheme, parts.netloc)
+        return response.status, response.msg, body
+
+    def close(self):
+        """Closes every connection the pool has opened, from any thread. Call it once no requests are in flight."""
+
+        with self.lock:
+            for conn in self.opened:
+                conn.close()
+            self.opened = list()
+
+
+def send_with_retries(pool, url, header, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """Sends one GET request through the pool and returns the status, response headers, and body bytes. Connection
+    failures and 5xx responses are retried with exponential backoff.
+    """
+
+    attempt = 0
+
+    while True:
+        try:
+            status, headers, body = pool.request(url, header)
+            if status < 500:
+                return status, headers, body
+            error = urllib.error.HTTPError(url, status, "Server error", headers, None)
+        except (OSError, http.client.HTTPException) as e:
+            error = e
+
+        if attempt >= retries:
+            raise error
+        time.sleep(backoff * (2 ** attempt))
+        attempt += 1
+
+
+def fetch_response(pool, url, header, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, max_redirects=MAX_REDIRECTS):
+    """Fetches a URL through the pool and returns the status, response headers, and body bytes. Connection failures
+    and 5xx responses are retried with exponential backoff, and redirects are followed for up to 'max_redirects'
+    hops; 4xx statuses, a redirect without a Location, and too many redirects raise urllib.error.HTTPError like
+    urlopen does. Other 3xx responses, such as a 304 to a conditional request, are returned as they are.
+    """
+
+    for _ in range(max_redirects + 1):
+        status, headers, body = send_with_retries(pool, url, header, retries=retries, backoff=backoff)
+        if status not in REDIRECT_STATUSES:
+            break
+        location = headers.get("Location")
+        if not location:
+            raise urllib.error.HTTPError(url, status, "Redirect without a Location", headers, None)
+        url = urllib.parse.urljoin(url, location)
+    else:
+        raise urllib.error.HTTPError(url, status, "Too many redirects", headers, None)
+
+    if status >= 400:
+        raise urllib.error.HTTPError(url, status, http.client.responses.get(status, ""), headers, None)
+    return status, headers, body
+
+
+def fetch_bytes(pool, url, header, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, cache=None):
+    """Fetches a URL through the pool and returns the response body, going through a ResponseCache if one is
+    given.
+    """
+
+    return fetch_body(pool, url, header, retries=retries, backoff=backoff, cache=cache)[0]
+
+
+def fetch_body(pool, url, header, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, cache=None):
+    """Like fetch_bytes(), but returns the response body together with the charset the response declared, or None."""
+
+    def send(url, header):
+        return fetch_response(pool, url, header, retries=retries, backoff=backoff)
+
+    if cache is not None:
+        return cache.fetch_with_charset(url, header, send)
+    status, headers, body = send(url, header)
+    return body, dats_decode.response_charset(headers, None)
+
+
+def fetch_json(pool, url, header, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, cache=None):
+    """Fetches a URL through the pool and returns the JSON object in the response, decoded from the bytes with the
+    active dats_decode decoder and the response's charset.
+    """
+
+    body, charset = fetch_body(pool, url, header, retries=retries, backoff=backoff, cache=cache)
+    return dats_decode.loads(body, charset)
+
+
+def fetch_all(urls, header, max_workers=DEFAULT_MAX_WORKERS, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+              backoff=DEFAULT_BACKOFF, cache=None):
+    """Fetches the JSON behind every URL with at most 'max_workers' requests in flight at once and returns a
+    dictionary that maps each URL to a (data, error) pair, where exactly one of the two is None.
+    """
+
+    pool = ConnectionPool(timeout=timeout)
+    unique_urls = list(dict.fromkeys(urls))
+
+    def fetch(url):
+        try:
+            return fetch_json(pool, url, header, retries=retries, backoff=backoff, cache=cache), None
+        except Exception as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(unique_urls, executor.map(fetch, unique_urls)))
+    pool.close()
+    return results
@@ -0,0 +1,122 @@
+import os
+import json
+import inspect
+import hashlib
+
+
+# Bump when the saved state changes shape, or when parse_datasets output changes because of a module other than the
+# one the classification rules are defined in, so rows saved by an older version are parsed again
+STATE_VERSION = 2
+
+
+def fingerprint(content):
+    """Returns a stable hash of a DATS record, computed over its canonical JSON form."""
+
+    canonical = json.dumps(content, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def record_key(content, seen, catalog=None):
+    """Returns the key that identifies a DATS record between harvests: its identifier, or its title when it has no
+    identifier, prefixed with the name of its catalog in a multi-catalog harvest. Repeated keys within one harvest get
+    an occurrence suffix so that every record keeps its own entry.
+    """
+
+    try:
+        key = content["identifier"]["identifier"] or "title:" + content.get("title", "")
+    except (KeyError, TypeError):
+        key = "title:" + content.get("title", "")
+    if catalog is not None:
+        key = catalog + "|" + key
+
+    if key in seen:
+        occurrence = 2
+        while "{}#{}".format(key, occurrence) in seen:
+            occurrence += 1
+        key = "{}#{}".format(key, occurrence)
+    return key
+
+
+def code_fingerprint(function):
+    """Returns a hash of the source of the module a function is defined in, or of the function's bytecode and
+    constants if the source can't be read. The module of a classification test also holds the helpers it calls and
+    the parsing code, so editing any of them changes the hash.
+    """
+
+    try:
+        source = inspect.getsource(inspect.getmodule(function))
+    except (OSError, TypeError):
+        code = function.__code__
+        source = repr((code.co_code, code.co_consts, code.co_names))
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def rules_fingerprint(rules):
+    """Returns a hash of a classification table and the code of its tests, so that saved categories and rows are
+    discarded when the rules, or the code that decides them, change.
+    """
+
+    description = list()
+    for rule in rules:
+        test = rule.get("test")
+        description.append([rule["name"],
+                            rule["category"],
+                            sorted(rule.get("identifiers", ())),
+                            test.__name__ if test is not None else None,
+                            code_fingerprint(test) if test is not None else None,
+                            bool(rule.get("exclusive"))])
+    return fingerprint(description)
+
+
+def state_fingerprint(rules, options=None):
+    """Returns a hash of a classification table and of the options that change the rows parsed under it, e.g. a
+    location index and the reference file it was loaded from. 'options' must be JSON-serializable.
+    """
+
+    return fingerprint([rules_fingerprint(rules), options])
+
+
+def load_state(fname, rules, options=None):
+    """Loads the fingerprints, categories, and rows saved by the previous incremental harvest. Returns the saved
+    records and whether their categories and rows can be reused, which they can't if they were written for another
+    state version, classification table, or options (see state_fingerprint).
+    """
+
+    try:
+        with open(fname, encoding="utf-8") as state_f:
+            state = json.load(state_f)
+    except (OSError, ValueError):
+        return dict(), False
+
+    reusable = state.get("version") == STATE_VERSION and state.get("rules") == state_fingerprint(rules, options)
+    return state.get("records", dict()), reusable
+
+
+def save_state(fname, records, rules, options=None):
+    """Saves the fingerprints, categories, and rows of this harvest, replacing the previous state atomically."""
+
+    state = {"version": STATE_VERSION, "rules": state_fingerprint(rules, options), "records": records}
+    tmp_fname = fname + ".tmp"
+
+    with open(tmp_fname, "w", encoding="utf-8") as state_f:
+        json.dump(state, state_f, ensure_ascii=False)
+    os.replace(tmp_fname, fname)
+
+
+def diff_records(previous, current):
+    """Compares the records of two harvests and returns the keys and titles of the added, removed, and modified
+    records.
+    """
+
+    changes = {"added": list(), "removed": list(), "modified": list()}
+
+    for key, record in current.items():
+        if key not in previous:
+            changes["added"].append({"key": key, "title": record["title"]})
+        elif previous[key]["fingerprint"] != record["fingerprint"]:
+            changes["modified"].append({"key": key, "title": record["title"]})
+
+    for key, record in previous.items():
+        if key not in current:
+            changes["removed"].append({"key": key, "title": record["title"]})
+    return changes
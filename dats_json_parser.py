@@ -1,25 +1,219 @@
+import io
 import os
+import sys
 import json
-from csv import DictWriter
+import codecs
+import contextlib
+import argparse
 import datetime as dt
 import urllib.request
 import urllib.parse
 import time
-
-
-def call_api(url, header, identifier=False):
-    """Submits a request to one of the MDC API calls and returns a JSON object that contains the relevant metadata."""
+from itertools import islice
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import dats_archive
+import dats_catalogs
+import dats_columnar
+import dats_crawler
+import dats_decode
+import dats_download
+import dats_fields
+import dats_incremental
+import dats_locations
+import dats_metrics
+import dats_replay
+import dats_writer
+
+
+# The MDC deployment harvested by default; the contents and identifier endpoints all hang off it
+API_URL = "http://betaweb.rods.pitt.edu/digital-commons-dev/api/v1"
+CONTENTS_URL = API_URL + "/contents"
+STREAM_CHUNK_SIZE = 64 * 1024
+PARALLEL_CHUNK_SIZE = 500
+JSON_WHITESPACE = " \t\n\r"
+# Characters that can continue a JSON number, and how far from the end of the buffer a decode error can be caused by
+# a token that was cut off, e.g. '-Infinity' or a '\uXXXX' escape
+NUMBER_CHARS = "0123456789.eE+-"
+TOKEN_LOOKAHEAD = 16
+DEFAULT_STATE_FILE = "dats-fingerprints-dataset.json"
+DATA_STANDARD_TYPE = "edu.pitt.isg.mdc.dats2_2.DataStandard"
+
+
+def call_api(url, header, identifier=False, cache=None):
+    """Submits a request to one of the MDC API calls and returns a JSON object that contains the relevant metadata.
+    Responses are served from and saved to a ResponseCache if one is given.
+    """
 
     if identifier:
         url = url + identifier
-    r = urllib.request.Request(url, headers=header)
-    rhand = urllib.request.urlopen(r)
-    convert_to_string = rhand.read().decode("latin-1")
-    data = json.loads(convert_to_string)
+    if cache is not None:
+        body, charset = cache.fetch_with_charset(url, header)
+    else:
+        r = urllib.request.Request(url, headers=header)
+        with dats_replay.urlopen(r) as rhand:
+            body = rhand.read()
+            charset = dats_decode.response_charset(rhand.headers)
+    data = dats_decode.loads(body, charset)
     #time.sleep(1)
     return data
 
 
+def iter_json_array(fp, encoding=dats_decode.DEFAULT_ENCODING, chunk_size=STREAM_CHUNK_SIZE):
+    """Incrementally decodes a top-level JSON array from a binary file object and yields its elements one at a time,
+    so only the element being decoded and one read chunk are held in memory.
+
+    The array is checked as strictly as json.loads checks it: elements are separated by exactly one ',', and nothing
+    but whitespace may follow the closing ']'. A malformed array raises a json.JSONDecodeError, whose position is
+    counted from the start of the buffered text. An element that fails to decode is only read on while more
+    input could still complete it, so a malformed one fails without buffering the rest of the stream.
+    """
+
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder(encoding)()
+    metrics = dats_metrics.ACTIVE
+    buf = ""
+    pos = 0
+    eof = False
+    # What comes next: the opening '[', an element or the closing ']', an element after a ',', a ',' or the closing
+    # ']' after an element, or only whitespace after the array
+    expecting = "array"
+
+    while True:
+        while pos < len(buf) and buf[pos] in JSON_WHITESPACE:
+            pos += 1
+
+        if pos < len(buf):
+            char = buf[pos]
+            if expecting == "array":
+                if char != "[":
+                    raise json.JSONDecodeError("Expecting '['", buf, pos)
+                expecting = "first"
+                pos += 1
+                continue
+            if expecting == "end":
+                raise json.JSONDecodeError("Extra data", buf, pos)
+            if expecting == "separator":
+                if char == ",":
+                    expecting = "element"
+                    pos += 1
+                    continue
+                if char != "]":
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buf, pos)
+            if char == "]":
+                if expecting == "element":
+                    raise json.JSONDecodeError("Expecting value", buf, pos)
+                expecting = "end"
+                pos += 1
+                continue
+
+            try:
+                if metrics is None:
+                    element, end = decoder.raw_decode(buf, pos)
+                else:
+                    start = time.perf_counter()
+                    element, end = decoder.raw_decode(buf, pos)
+                    metrics.add_time("json", time.perf_counter() - start)
+                # A value that runs to the end of the buffer may have been cut off mid-token, and so may a number
+                # that the buffer ends just after, e.g. '1.' of '1.5', so those are decoded again once the next
+                # chunk has arrived.
+                if eof or end < len(buf) and not (isinstance(element, (int, float)) and buf[end] in NUMBER_CHARS):
+                    pos = end
+                    expecting = "separator"
+                    yield element
+                    continue
+            except json.JSONDecodeError as e:
+                # More input can only help a string that runs to the end of the buffer, or a token cut off near
+                # it, e.g. 'tru' or '\u00'
+                if eof or not (e.msg.startswith("Unterminated string") or e.pos + TOKEN_LOOKAHEAD >= len(buf)):
+                    raise
+        elif eof:
+            if expecting == "end":
+                return
+            raise json.JSONDecodeError("Unexpected end of JSON array", buf, pos)
+
+        start = time.perf_counter()
+        chunk = fp.read(chunk_size)
+        read = time.perf_counter()
+        if chunk:
+            buf = buf[pos:] + text_decoder.decode(chunk)
+        else:
+            eof = True
+            buf = buf[pos:] + text_decoder.decode(b"", final=True)
+        pos = 0
+        if metrics is not None:
+            metrics.add_time("fetch", read - start)
+            metrics.add_time("decode", time.perf_counter() - read)
+
+
+def stream_contents(source, header, encoding=dats_decode.DEFAULT_ENCODING):
+    """Yields each element of the MDC contents payload one at a time, either from the contents API URL or from a
+    saved dump of its response on disk. A response is decoded with the charset it declares and a dump with
+    'encoding'.
+
+    The payload is always streamed with the json module rather than decoded whole with the active decoder: holding
+    every element at once costs more in allocation and garbage collection than a faster decoder saves.
+
+    With dats_download enabled, a URL is retrieved resumably: in Range chunks saved to a spool file, so a harvest
+    that stops part way carries on from the saved bytes next time. The spool file is removed once every element has
+    been read.
+    """
+
+    if dats_download.ACTIVE is not None and (source.startswith("http://") or source.startswith("https://")):
+        progress = dats_download.ACTIVE.progress
+        with dats_download.ACTIVE.open(source, header) as download:
+            for element in iter_json_array(download, download.charset or encoding):
+                if progress is not None:
+                    progress.add(records=1)
+                yield element
+        download.discard()
+    elif source.startswith("http://") or source.startswith("https://"):
+        r = urllib.request.Request(source, headers=header)
+        with dats_replay.urlopen(r) as rhand:
+            yield from iter_json_array(rhand, dats_decode.response_charset(rhand.headers, encoding))
+    else:
+        with open(source, "rb") as dump_f:
+            yield from iter_json_array(dump_f, encoding)
+
+
+def contents_elements(source, header):
+    """Yields (catalog name, element) pairs for every element of a contents source. 'source' is either a single
+    contents source, whose elements have no catalog name, or a list of Catalogs, which are streamed at once by a
+    dats_catalogs.FanIn that is returned so its per-catalog counts and times can be read afterwards.
+    """
+
+    if isinstance(source, str):
+        return ((None, element) for element in stream_contents(source, header))
+    return dats_catalogs.FanIn(source, lambda catalog_source: stream_contents(catalog_source, header))
+
+
+def output_catalogs(source, per_source=False):
+    """Lists the catalogs that get snapshots of their own: each catalog of a multi-catalog harvest with 'per_source',
+    and otherwise just None for one merged set of snapshots.
+    """
+
+    if per_source and not isinstance(source, str):
+        return [catalog.name for catalog in source]
+    return [None]
+
+
+def snapshot_fname(prefix, today, catalog=None):
+    """Returns the file name of a snapshot, with the name of its catalog when snapshots are written per catalog."""
+
+    if catalog is None:
+        return prefix + today + ".txt"
+    return prefix + catalog + "-" + today + ".txt"
+
+
+def sink_name(name, catalog=None):
+    """Returns the name a snapshot is written and reported under, e.g. 'tycho' or 'tycho/dev'."""
+
+    if catalog is None:
+        return name
+    return name + "/" + catalog
+
+
 def parse_authors(jsn):
     """Parses authors' first and last names or an organization's name from the DATS and returns them as a string."""
 
@@ -93,58 +287,31 @@ def parse_dates(jsn):
 def parse_format(jsn):
     """Parses the contents of the 'formats' JSON array in the DATS and returns them as a string."""
 
-    try:
-        s = "; "
-
-        formats = s.join(jsn["distributions"][0]["formats"])
-    except Exception:
-        formats = "null"
-    return formats
+    return DATASET_EXTRACTORS["format"](jsn)
 
 
 def parse_standard(jsn):
     """Parses the name and identifier of the data standard in the DATS and returns each of them as a string."""
 
-    try:
-        standard_name = jsn["distributions"][0]["conformsTo"][0]["name"]
-        standard_identifier = jsn["distributions"][0]["conformsTo"][0]["identifier"]["identifier"]
-        standard = standard_name + "; " + standard_identifier
-    except Exception:
-        standard = "null"
-    return standard
+    return DATASET_EXTRACTORS["conforms_to"](jsn)
 
 
 def parse_landing_page(jsn):
     """Parses the URL of the landing page in the DATS and returns it as a string."""
 
-    try:
-        url = jsn["distributions"][0]["access"]["landingPage"]
-    except Exception:
-        url = "null"
-    return url
+    return DATASET_EXTRACTORS["landing_page"](jsn)
 
 
 def parse_access_page(jsn):
     """Parses the URL of the access page in the DATS and returns it as a string."""
 
-    try:
-        url = jsn["distributions"][0]["access"]["accessURL"]
-    except Exception:
-        url = "null"
-    return url
+    return DATASET_EXTRACTORS["access_page"](jsn)
 
 
 def parse_dataset_id(jsn):
     """Parses the dataset identifier in the DATS and returns it as a string."""
 
-    try:
-        if jsn["identifier"]["identifier"] == "":
-            id = "null"
-        else:
-            id = jsn["identifier"]["identifier"]
-    except Exception:
-        id = "null"
-    return id
+    return DATASET_EXTRACTORS["dataset_identifier"](jsn)
 
 
 def parse_geo(jsn):
@@ -195,6 +362,70 @@ def parse_geo_id(jsn):
     return identifiers
 
 
+def parse_location_iso_codes(attr, iso3166_lst, iso3166_1_lst, iso3166_1_alpha3_lst):
+    """Appends the ISO 3166, ISO 3166-1, and ISO 3166-1 alpha-3 codes of a single 'spatialCoverage' entry in the DATS
+    to the given lists, using 'null' for each code that is missing.
+    """
+
+    try:
+         if not attr["relatedIdentifiers"]:
+             iso3166_lst.append("null")
+             iso3166_1_lst.append("null")
+             iso3166_1_alpha3_lst.append("null")
+         else:
+             iso_lst = list()
+
+             for sub_attr in attr["relatedIdentifiers"]:
+                 if sub_attr["identifierSource"] == "ISO 3166":
+                     iso3166_lst.append(sub_attr["identifier"])
+                     iso_lst.append(sub_attr["identifierSource"])
+                 elif sub_attr["identifierSource"] == "ISO 3166-1 numeric":
+                     iso3166_1_lst.append(sub_attr["identifier"])
+                     iso_lst.append(sub_attr["identifierSource"])
+                 elif sub_attr["identifierSource"] == "ISO 3166-1 alpha-3":
+                     iso3166_1_alpha3_lst.append(sub_attr["identifier"])
+                     iso_lst.append(sub_attr["identifierSource"])
+
+             if "ISO 3166" not in iso_lst:
+                 print("iso list:", iso_lst)
+                 iso3166_lst.append("null")
+             if "ISO 3166-1 numeric" not in iso_lst:
+                 iso3166_1_lst.append("null")
+             if "ISO 3166-1 alpha-3" not in iso_lst:
+                 iso3166_1_alpha3_lst.append("null")
+    except Exception:
+        try:
+            if not attr["alternateIdentifiers"]:
+                iso3166_lst.append("null")
+                iso3166_1_lst.append("null")
+                iso3166_1_alpha3_lst.append("null")
+            else:
+                iso_lst = list()
+
+                for sub_attr in attr["alternateIdentifiers"]:
+                    if sub_attr["identifierSource"] == "ISO 3166":
+                        iso3166_lst.append(sub_attr["identifier"])
+                        iso_lst.append(sub_attr["identifierSource"])
+                    elif sub_attr["identifierSource"] == "ISO 3166-1 numeric":
+                        iso3166_1_lst.append(sub_attr["identifier"])
+                        iso_lst.append(sub_attr["identifierSource"])
+                    elif sub_attr["identifierSource"] == "ISO 3166-1 alpha-3":
+                        iso3166_1_alpha3_lst.append(sub_attr["identifier"])
+                        iso_lst.append(sub_attr["identifierSource"])
+
+                if "ISO 3166" not in iso_lst:
+                    iso3166_lst.append("null")
+                if "ISO 3166-1 numeric" not in iso_lst:
+                    iso3166_1_lst.append("null")
+                if "ISO 3166-1 alpha-3" not in iso_lst:
+                    iso3166_1_alpha3_lst.append("null")
+
+        except Exception:
+            iso3166_lst.append("null")
+            iso3166_1_lst.append("null")
+            iso3166_1_alpha3_lst.append("null")
+
+
 def parse_iso_codes(jsn):
     """Parses ISO 3166, ISO 3166-1, and ISO 3166-1 alpha-3 codes in the DATS and returns it as a string."""
 
@@ -207,63 +438,7 @@ def parse_iso_codes(jsn):
 
     try:
         for attr in jsn["spatialCoverage"]:
-            try:
-                 if not attr["relatedIdentifiers"]:
-                     iso3166_lst.append("null")
-                     iso3166_1_lst.append("null")
-                     iso3166_1_alpha3_lst.append("null")
-                 else:
-                     iso_lst = list()
-
-                     for sub_attr in attr["relatedIdentifiers"]:
-                         if sub_attr["identifierSource"] == "ISO 3166":
-                             iso3166_lst.append(sub_attr["identifier"])
-                             iso_lst.append(sub_attr["identifierSource"])
-                         elif sub_attr["identifierSource"] == "ISO 3166-1 numeric":
-                             iso3166_1_lst.append(sub_attr["identifier"])
-                             iso_lst.append(sub_attr["identifierSource"])
-                         elif sub_attr["identifierSource"] == "ISO 3166-1 alpha-3":
-                             iso3166_1_alpha3_lst.append(sub_attr["identifier"])
-                             iso_lst.append(sub_attr["identifierSource"])
-
-                     if "ISO 3166" not in iso_lst:
-                         print("iso list:", iso_lst)
-                         iso3166_lst.append("null")
-                     if "ISO 3166-1 numeric" not in iso_lst:
-                         iso3166_1_lst.append("null")
-                     if "ISO 3166-1 alpha-3" not in iso_lst:
-                         iso3166_1_alpha3_lst.append("null")
-            except Exception:
-                try:
-                    if not attr["alternateIdentifiers"]:
-                        iso3166_lst.append("null")
-                        iso3166_1_lst.append("null")
-                        iso3166_1_alpha3_lst.append("null")
-                    else:
-                        iso_lst = list()
-
-                        for sub_attr in attr["alternateIdentifiers"]:
-                            if sub_attr["identifierSource"] == "ISO 3166":
-                                iso3166_lst.append(sub_attr["identifier"])
-                                iso_lst.append(sub_attr["identifierSource"])
-                            elif sub_attr["identifierSource"] == "ISO 3166-1 numeric":
-                                iso3166_1_lst.append(sub_attr["identifier"])
-                                iso_lst.append(sub_attr["identifierSource"])
-                            elif sub_attr["identifierSource"] == "ISO 3166-1 alpha-3":
-                                iso3166_1_alpha3_lst.append(sub_attr["identifier"])
-                                iso_lst.append(sub_attr["identifierSource"])
-
-                        if "ISO 3166" not in iso_lst:
-                            iso3166_lst.append("null")
-                        if "ISO 3166-1 numeric" not in iso_lst:
-                            iso3166_1_lst.append("null")
-                        if "ISO 3166-1 alpha-3" not in iso_lst:
-                            iso3166_1_alpha3_lst.append("null")
-
-                except Exception:
-                    iso3166_lst.append("null")
-                    iso3166_1_lst.append("null")
-                    iso3166_1_alpha3_lst.append("null")
+            parse_location_iso_codes(attr, iso3166_lst, iso3166_1_lst, iso3166_1_alpha3_lst)
 
     except KeyError:
         iso3166_lst.append("null")
@@ -276,6 +451,86 @@ def parse_iso_codes(jsn):
     return iso_codes
 
 
+def parse_spatial_coverage(jsn, locations=None):
+    """Walks the 'spatialCoverage' array in the DATS once and returns the location names, Apollo location codes, and
+    ISO 3166, ISO 3166-1, and ISO 3166-1 alpha-3 codes as strings in a dictionary. With a dats_locations.LocationIndex,
+    the ISO codes a location leaves out are filled in from the index by Apollo code; the codes it states are kept.
+
+    Without an index, gives the same results as calling parse_geo, parse_geo_id, and parse_iso_codes one after
+    another, including raising the same error when one of them would have.
+    """
+
+    spatial_info = dict()
+    regions = list()
+    location_codes = list()
+    iso3166_lst = list()
+    iso3166_1_lst = list()
+    iso3166_1_alpha3_lst = list()
+    geo_null = False
+    geo_id_null = False
+    geo_error = None
+    geo_id_error = None
+
+    s = "; "
+
+    try:
+        spatial_coverage = jsn["spatialCoverage"]
+    except KeyError:
+        spatial_info["geography"] = "null"
+        spatial_info["apollo_location_code"] = "null"
+        spatial_info["ISO_3166"] = "null"
+        spatial_info["ISO_3166_1"] = "null"
+        spatial_info["ISO_3166_1_alpha_3"] = "null"
+        return spatial_info
+
+    for attr in spatial_coverage:
+        if not geo_null and geo_error is None:
+            try:
+                regions.append(attr["name"])
+            except KeyError:
+                geo_null = True
+            except Exception as e:
+                geo_error = e
+
+        if not geo_id_null and geo_id_error is None:
+            try:
+                str = attr["identifier"]["identifier"]
+
+                if location_codes and "http" in str:
+                    print(location_codes)
+                    identifier = str.split("=", 1)
+                    location_codes.append(identifier[1])
+                else:
+                    location_codes.append(str)
+            except KeyError:
+                geo_id_null = True
+            except Exception as e:
+                geo_id_error = e
+
+        if locations is None:
+            parse_location_iso_codes(attr, iso3166_lst, iso3166_1_lst, iso3166_1_alpha3_lst)
+        else:
+            codes = (list(), list(), list())
+            parse_location_iso_codes(attr, *codes)
+            locations.fill(attr, codes)
+            iso3166_lst.extend(codes[0])
+            iso3166_1_lst.extend(codes[1])
+            iso3166_1_alpha3_lst.extend(codes[2])
+
+    if geo_error is not None:
+        raise geo_error
+    spatial_info["geography"] = "null" if geo_null else s.join(regions)
+
+    if geo_id_error is not None:
+        raise geo_id_error
+    spatial_info["apollo_location_code"] = "null" if geo_id_null else s.join(location_codes)
+
+    spatial_info["ISO_3166"] = s.join(iso3166_lst)
+    spatial_info["ISO_3166_1"] = s.join(iso3166_1_lst)
+    spatial_info["ISO_3166_1_alpha_3"] = s.join(iso3166_1_alpha3_lst)
+    return spatial_info
+
+
 def parse_nested_attr(jsn, attribute_1, attribute_2):
     """Parses an attribute value that is nested within another attribute value in the DATS and returns it as a
     string.
@@ -430,6 +685,25 @@ def parse_stored_in(jsn):
         return "null"
 
 
+def parse_distributions(jsn):
+    """Walks the 'distributions' array in the DATS once and returns the creation, modification, and access dates
+    along with the repository of the first distribution in a dictionary. The other columns built from the first
+    distribution are plain paths in DATASET_FIELDS.
+    """
+
+    distribution_info = parse_dates(jsn)
+
+    stored_in = get_stored_in(jsn)
+    if stored_in is dats_fields.MISSING:
+        distribution_info["stored_in"] = "null"
+    elif stored_in == "Apollo Library" or stored_in == "MIDAS Digital Commons":
+        distribution_info["stored_in"] = stored_in
+    else:
+        distribution_info["stored_in"] = None
+
+    return distribution_info
+
+
 def check_if_apollo_enabled(s):
     """Checks if the name value for the 'storedIn' JSON attribute is 'Apollo Library'. Returns 'TRUE' or 'FALSE'
     accordingly.
@@ -456,53 +730,98 @@ def check_if_on_olympus(s):
         return "FALSE"
 
 
+# Marks a DatsRecord field that hasn't been computed yet
+UNRESOLVED = object()
+
+
+class DatsRecord:
+    """The DATS content of one dataset as the classification rules see it. The fields that several rules read are
+    resolved the first time one of them asks and then kept, so a dataset that an early rule files never looks at the
+    rest. A field that raises is not kept, so every rule that reads it sees the same error. The view is the
+    classifier's only: parse_datasets takes the raw content, since its columns are extracted by compiled code that
+    reads each path once anyway.
+    """
+
+    __slots__ = ("content", "_identifier", "_information_type", "_is_about", "_extra_category")
+
+    def __init__(self, content):
+        self.content = content
+        self._identifier = self._information_type = self._is_about = self._extra_category = UNRESOLVED
+
+    @property
+    def identifier(self):
+        """The raw identifier. Raises a KeyError or TypeError if the DATS has none."""
+        if self._identifier is UNRESOLVED:
+            self._identifier = self.content["identifier"]["identifier"]
+        return self._identifier
+
+    @property
+    def information_type(self):
+        """The 'information' value of the first entry of the 'types' array."""
+        if self._information_type is UNRESOLVED:
+            self._information_type = check_type(self.content, "information")
+        return self._information_type
+
+    @property
+    def is_about(self):
+        """The name of the first entry of the 'isAbout' array."""
+        if self._is_about is UNRESOLVED:
+            self._is_about = check_is_about(self.content)
+        return self._is_about
+
+    @property
+    def extra_category(self):
+        """The category of the first extra property."""
+        if self._extra_category is UNRESOLVED:
+            self._extra_category = self.content["extraProperties"][0]["category"]
+        return self._extra_category
+
+
 def parse_data_standard(data):
     """Extracts each metadata item from the DATS if the digital object is a data standard."""
 
-    data_info = dict()
+    data_info = extract_data_format_fields(data)
 
-    data_info["identifier"] = parse_nested_attr(data, "identifier", "identifier")
-    data_info["identifier_source"] = parse_nested_attr(data, "identifier", "identifierSource")
-    data_info["name"] = data["name"]
-    data_info["type"] = parse_nested_attr(data, "type", "value")
-    data_info["type_IRI"] = parse_nested_attr(data, "type", "valueIRI")
     data_info["description"] = parse_description(data)
     data_info["licenses"] = parse_licenses(data)
-    data_info["version"] = parse_version(data)
-    data_info["human-readable_data_format_specification_value"] = parse_extra(data).get("human_value")
-    data_info["human-readable_data_format_specification_value_IRI"] = parse_extra(data).get("human_value_IRI")
-    data_info["machine-readable_data_format_specification_value"] = parse_extra(data).get("machine_value")
-    data_info["machine-readable_data_format_specification_value_IRI"] = parse_extra(data).get("machine_value_IRI")
-    data_info["validator_value"] = parse_extra(data).get("validator_value")
-    data_info["validator_value_IRI"] = parse_extra(data).get("validator_value_IRI")
+    extra_properties = parse_extra(data)
+    data_info["human-readable_data_format_specification_value"] = extra_properties.get("human_value")
+    data_info["human-readable_data_format_specification_value_IRI"] = extra_properties.get("human_value_IRI")
+    data_info["machine-readable_data_format_specification_value"] = extra_properties.get("machine_value")
+    data_info["machine-readable_data_format_specification_value_IRI"] = extra_properties.get("machine_value_IRI")
+    data_info["validator_value"] = extra_properties.get("validator_value")
+    data_info["validator_value_IRI"] = extra_properties.get("validator_value_IRI")
     return data_info
 
 
-def parse_datasets(data):
-    """Extracts each metadata item from the DATS if the digital object is a dataset."""
+def parse_datasets(data, locations=None):
+    """Extracts each metadata item from the DATS if the digital object is a dataset.
 
-    dataset_info = dict()
+    The columns with a path in DATASET_FIELDS are extracted together by compiled code; the 'distributions' and
+    'spatialCoverage' arrays are each walked once and shared by the rest of the columns built from them. A
+    dats_locations.LocationIndex, if given, fills in the ISO codes that locations leave out (see
+    parse_spatial_coverage).
+    """
+
+    dataset_info = extract_dataset_fields(data)
 
     dataset_info["title"] = data["title"]
     dataset_info["description"] = parse_description(data)
-    dataset_info["dataset_identifier"] = parse_dataset_id(data)
     dataset_info["authors"] = parse_authors(data)
-    dataset_info["created"] = parse_dates(data).get("creation_date")
-    dataset_info["modified"] = parse_dates(data).get("modification_date")
-    dataset_info["accessed"] = parse_dates(data).get("accessed_date")
-    dataset_info["landing_page"] = parse_landing_page(data)
-    dataset_info["access_page"] = parse_access_page(data)
-    dataset_info["format"] = parse_format(data)
-    dataset_info["conforms_to"] = parse_standard(data)
+    distribution_info = parse_distributions(data)
+    dataset_info["created"] = distribution_info.get("creation_date")
+    dataset_info["modified"] = distribution_info.get("modification_date")
+    dataset_info["accessed"] = distribution_info.get("accessed_date")
     dataset_info["license"] = parse_licenses(data)
-    dataset_info["geography"] = parse_geo(data)
-    dataset_info["apollo_location_code"] = parse_geo_id(data)
-    dataset_info["iso_3166"] = parse_iso_codes(data).get("ISO_3166")
-    dataset_info["iso_3166_1"] = parse_iso_codes(data).get("ISO_3166_1")
-    dataset_info["iso_3166_1_alpha_3"] = parse_iso_codes(data).get("ISO_3166_1_alpha_3")
+    spatial_info = parse_spatial_coverage(data, locations)
+    dataset_info["geography"] = spatial_info["geography"]
+    dataset_info["apollo_location_code"] = spatial_info["apollo_location_code"]
+    dataset_info["iso_3166"] = spatial_info["ISO_3166"]
+    dataset_info["iso_3166_1"] = spatial_info["ISO_3166_1"]
+    dataset_info["iso_3166_1_alpha_3"] = spatial_info["ISO_3166_1_alpha_3"]
     dataset_info["disease"] = parse_disease_name(data)
-    dataset_info["apollo_enabled"] = check_if_apollo_enabled(parse_stored_in(data))
-    dataset_info["on_olympus"] = check_if_on_olympus(parse_stored_in(data))
+    dataset_info["apollo_enabled"] = check_if_apollo_enabled(distribution_info["stored_in"])
+    dataset_info["on_olympus"] = check_if_on_olympus(distribution_info["stored_in"])
     return dataset_info
 
 
@@ -552,311 +871,850 @@ def check_id(jsn):
     return identifier
 
 
-def write_to_file(fname, list_of_dictionaries, content_type):
-    """Writes the metadata for each digital object to a tab-delimited text file."""
-
-    with open(fname, "a") as dats_f:
-        if content_type == "data-format":
-            fieldnames = ["name",
-                          "identifier",
-                          "identifier_source",
-                          "type",
-                          "type_IRI",
-                          "description",
-                          "licenses",
-                          "version",
-                          "human-readable_data_format_specification_value",
-                          "human-readable_data_format_specification_value_IRI",
-                          "machine-readable_data_format_specification_value",
-                          "machine-readable_data_format_specification_value_IRI",
-                          "validator_value",
-                          "validator_value_IRI"]
-
-            dict_writer = DictWriter(dats_f, fieldnames=fieldnames, delimiter="\t")
-            dict_writer.writeheader()
-
-            for dstandard in list_of_dictionaries:
-                dict_writer.writerow(dstandard)
-
-        if content_type == "dataset":
-            fieldnames = ["title",
-                          "description",
-                          "dataset_identifier",
-                          "disease",
-                          "authors",
-                          "created",
-                          "modified",
-                          "accessed",
-                          "landing_page",
-                          "access_page",
-                          "format",
-                          "conforms_to",
-                          "license",
-                          "geography",
-                          "apollo_location_code",
-                          "iso_3166",
-                          "iso_3166_1",
-                          "iso_3166_1_alpha_3",
-                          "apollo_enabled",
-                          "on_olympus"]
-
-            dict_writer = DictWriter(dats_f, fieldnames=fieldnames, delimiter="\t")
-            dict_writer.writeheader()
-
-            for dset in list_of_dictionaries:
-                dict_writer.writerow(dset)
+LOCATION_DATASET_IDS = {"http://data.sfgov.org/api/views/yg87-cd6v",
+                        "http://data.cdc.gov/api/views/cjae-szjv",
+                        "http://data.cityofnewyork.us/api/views/w9ei-idxz",
+                        "http://data.cityofnewyork.us/api/views/kku6-nxdu"}
 
+INFECTIOUS_DISEASE_SCENARIO_DATASET_IDS = {"http://doi.org/10.5281/zenodo.580104"}
 
-if __name__ == "__main__":
-    today = dt.datetime.today().strftime("%Y-%m-%d_T%H-%M")
+MORTALITY_DATASET_IDS = {"MDC:WS-000487"}
 
-    header = { "Accept": "application/json" }
+DISEASE_SURVEILLANCE_DATASET_IDS = {"MDC:WS-000494",
+                                    "https://data.cdc.gov/browse?category=MMWR",
+                                    "MDC:WS-000484",
+                                    "MDC:WS-000486",
+                                    "http://www2.datasus.gov.br/DATASUS/index.php?area=0203",
+                                    "MDC:WS-000023",
+                                    "MDC:allegheny-count-ed-visits-pds-set1",
+                                    "10.5281/zenodo.2583145",
+                                    "10.5281/zenodo.2583143",
+                                    "10.5281/zenodo.2583216",
+                                    "10.5281/zenodo.2644020",
+                                    "10.5281/zenodo.2643814",
+                                    "https://www.moh.gov.sg/diseases-updates"}
 
-    #metadata_type_base_url = "http://betaweb.rods.pitt.edu:80/digital-commons-dev/api/v1/identifiers/metadata-type?identifier="
-    #metadata_base_url = "http://betaweb.rods.pitt.edu:80/digital-commons-dev/api/v1/identifiers/metadata?identifier="
-    #category_type_url = "http://betaweb.rods.pitt.edu:80/digital-commons-dev/api/v1/identifiers/category?identifier="
 
-    #api_url = input("Please enter URL of API: ")
-    content_type = input("Please indicate which content type you would like: [data-format]/[dataset]: ")
+def has_no_identifier(record):
+    """Checks if the DATS has no 'identifier' attribute to classify it by."""
 
-    #get_global_identifiers = call_api(api_url, header)
+    try:
+        record.identifier
+        return False
+    except KeyError:
+        return True
 
-    """Code for processing data formats JSON DATS """
 
-    if content_type == "data-format":
-        dstandard_dicts = list()
-        output_fname = "data-formats-dats-info-" + today + ".txt"
+def is_chikv_epidemic(record):
+    """Checks if the DATS describes Chikungunya epidemic data."""
 
-        r = urllib.request.Request("http://betaweb.rods.pitt.edu/digital-commons-dev/api/v1/contents",
-                                   headers=header)
-        rhand = urllib.request.urlopen(r)
-        convert_to_string = rhand.read().decode("latin-1")
-        data = json.loads(convert_to_string)
+    return "epidemic" in record.information_type and "Chikungunya" in record.is_about
 
-        for element in data:
-            if element["type"] == "edu.pitt.isg.mdc.dats2_2.DataStandard":
-                dstandard_dicts.append(parse_data_standard(element["content"]))
 
-        write_to_file(output_fname, dstandard_dicts, content_type)
-        print("Data formats: ", len(dstandard_dicts))
+def is_zikv_epidemic(record):
+    """Checks if the DATS describes Zika epidemic data."""
 
+    return "epidemic" in record.information_type and "zika" in record.is_about.lower()
 
-    """Code for processing datasets JSON DATS"""
 
-    if content_type == "dataset":
-        tycho_dset_dicts = list()
-        spew_dset_dicts = list()
-        synthia_dset_dicts = list()
-        case_series_dset_dicts = list()
-        chikv_epidemic_dset_dicts = list()
-        ebov_epidemic_dset_dicts = list()
-        zikv_epidemic_dset_dicts = list()
-        ids_dset_dicts = list()
-        mortality_dset_dicts = list()
-        disease_surveillance_dset_dicts = list()
-        web_dset_dicts = list()
-        location_dset_dicts = list()
-
-        tycho_output_fname = "tycho-dats-info-" + today + ".txt"
-        spew_output_fname = "spew-dats-info-" + today + ".txt"
-        synthia_output_fname = "synthia-dats-info-" + today + ".txt"
-        case_series_output_fname = "case-series-dats-info-" + today + ".txt"
-        chikv_output_fname = "chikv-dats-info-" + today + ".txt"
-        ebov_output_fname = "ebola-dats-info-" + today + ".txt"
-        zikv_output_fname = "zika-dats-info-" + today + ".txt"
-        ids_output_fname = "infectious-disease-dats-info-" + today + ".txt"
-        mortality_out_fname = "mortality-dats-info-" + today + ".txt"
-        disease_surveillance_output_fname = "disease-surveillance-dats-info-" + today + ".txt"
-        web_dset_output_fname = "websites-with-data-dats-info-" + today + ".txt"
-        location_dset_output_fname = "location-dats-info-" + today + ".txt"
-
-        datasets_witout_ids = list()
-
-        print("Getting datasets (may take a few minutes)...")
-
-
-        """Code for retrieving metadata using the get-identifiers, get-metadata-type, and get-category API calls
-
-        This code does not include the requests for Chikungunya and Zika epidemic dataset metadata since these
-        do not have unique identifiers.
-        """
-
-        """# Remove identifiers for non-datasets and sort datasets by category
-        for id in get_global_identifiers:
-            if id == "identifier will be created as time of release" : continue
-
-            id = urllib.parse.quote(id, safe="")
-            get_datasets = call_api(metadata_type_base_url, header, identifier=id)
+def is_ebov_epidemic(record):
+    """Checks if the DATS describes Ebola or Sudan virus epidemic data."""
 
+    is_about = record.is_about
+    return "epidemic" in record.information_type and ("ebola" in is_about.lower() or "Sudan virus" in is_about)
+
+
+def is_rabies_case_series(record):
+    """Checks if the DATS title describes rabies cases in the United States."""
+
+    title = record.content["title"].lower()
+    return "rabies" in title and "united states" in title
+
+
+def is_tycho_dataset(record):
+    """Checks if the DATS identifier is a Project Tycho identifier."""
+
+    return "tycho" in record.identifier
+
+
+def is_spew_dataset(record):
+    """Checks if the DATS description mentions SPEW."""
+
+    return "SPEW" in record.content["description"]
+
+
+def is_synthia_dataset(record):
+    """Checks if the third entry of the 'types' array in the DATS names SYNTHIA as its platform."""
+
+    types = record.content["types"]
+    return len(types) > 2 and types[2]["platform"]["value"] == "SYNTHIA"
+
+
+def is_website_with_data(record):
+    """Checks if the first extra property in the DATS is in the 'website' category."""
+
+    return record.extra_category == "website"
+
+
+def is_not_website_with_data(record):
+    """Checks if the first extra property in the DATS is in any category other than 'website'."""
+
+    return record.extra_category != "website"
+
+
+"""Classification table for dataset DATS. Rules are tried in order and a dataset goes into the category of every rule
+it matches, except that matching an exclusive rule stops the search. A rule either lists the identifiers that belong
+to its category or gives a test that takes a DatsRecord; a test that trips over a missing attribute is a miss.
+"""
+DATASET_RULES = [
+    {"name": "no identifier", "category": "disease-surveillance", "test": has_no_identifier, "exclusive": True},
+    {"name": "location identifiers", "category": "location", "identifiers": LOCATION_DATASET_IDS, "exclusive": True},
+    {"name": "infectious disease scenario identifiers", "category": "infectious-disease",
+     "identifiers": INFECTIOUS_DISEASE_SCENARIO_DATASET_IDS},
+    {"name": "mortality identifiers", "category": "mortality", "identifiers": MORTALITY_DATASET_IDS},
+    {"name": "chikungunya epidemic", "category": "chikv", "test": is_chikv_epidemic},
+    {"name": "zika epidemic", "category": "zika", "test": is_zikv_epidemic},
+    {"name": "ebola epidemic", "category": "ebola", "test": is_ebov_epidemic},
+    {"name": "rabies case series", "category": "case-series", "test": is_rabies_case_series},
+    {"name": "tycho identifier", "category": "tycho", "test": is_tycho_dataset},
+    {"name": "spew description", "category": "spew", "test": is_spew_dataset},
+    {"name": "synthia platform", "category": "synthia", "test": is_synthia_dataset},
+    {"name": "disease surveillance identifiers", "category": "disease-surveillance",
+     "identifiers": DISEASE_SURVEILLANCE_DATASET_IDS},
+    {"name": "website extra property", "category": "websites-with-data", "test": is_website_with_data},
+    {"name": "other extra property", "category": "disease-surveillance", "test": is_not_website_with_data},
+]
+
+
+def compile_rules(rules, locations=None):
+    """Compiles a classification table into a dispatcher that resolves every identifier rule with a single hash
+    lookup and keeps a hit count for each rule. The rules are also flattened into (index, test, category, exclusive)
+    steps so classifying a dataset doesn't look anything up in the rule dictionaries. A LocationIndex, if given,
+    travels with the dispatcher to every dataset it parses.
+    """
+
+    by_identifier = dict()
+    steps = list()
+
+    for index, rule in enumerate(rules):
+        for identifier in rule.get("identifiers", ()):
+            by_identifier.setdefault(identifier, set()).add(index)
+        steps.append((index, rule.get("test"), rule["category"], bool(rule.get("exclusive"))))
+
+    return {"rules": rules, "steps": steps, "by_identifier": by_identifier, "hits": [0] * len(rules),
+            "locations": locations}
+
+
+def classify_dataset(jsn, dispatcher):
+    """Returns the categories that a dataset DATS, raw or as a DatsRecord, belongs to, in table order, and counts a
+    hit for each rule that matched.
+    """
+
+    record = jsn if isinstance(jsn, DatsRecord) else DatsRecord(jsn)
+    categories = list()
+    hits = dispatcher["hits"]
+
+    try:
+        identifier_hits = dispatcher["by_identifier"].get(record.identifier, ())
+    except (KeyError, TypeError):
+        identifier_hits = ()
+
+    for index, test, category, exclusive in dispatcher["steps"]:
+        if test is None:
+            matched = index in identifier_hits
+        else:
             try:
-                if get_datasets["datatype"] == "Dataset":
-                    get_dataset_category = call_api(category_type_url, header, identifier=id)
-
-                    if get_dataset_category[2] == "Disease surveillance data":
-                        get_metadata = call_api(metadata_base_url, header, identifier=id)
-
-                        if len(get_dataset_category) == 6:
-                            if get_dataset_category[5] == "[Project Tycho Datasets]":
-                                tycho_dset_dicts.append(parse_datasets(get_metadata))
-                        else:
-                            print(id)
-                            disease_surveillance_dset_dicts.append(parse_datasets(get_metadata))
-
-                    if get_dataset_category[2] == "Case series data":
-                        get_metadata = call_api(metadata_base_url, header, identifier=id)
-                        case_series_dset_dicts.append(parse_datasets(get_metadata))
-
-                    if get_dataset_category[2] == "Epidemic data":
-                        try:
-                            if get_dataset_category[3] == "Ebola epidemics":
-                                get_metadata = call_api(metadata_base_url, header, identifier=id)
-                                ebov_epidemic_dset_dicts.append(parse_datasets(get_metadata))
-                        except IndexError : continue
-
-                    if get_dataset_category[2] == "Infectious disease scenario data":
-                        get_metadata = call_api(metadata_base_url, header, identifier=id)
-                        ids_dset_dicts.append(parse_datasets(get_metadata))
-
-                    if get_dataset_category[2] == "Mortality data":
-                        get_metadata = call_api(metadata_base_url, header, identifier=id)
-                        mortality_dset_dicts.append(parse_datasets(get_metadata))
-
-                    try:
-                        if get_dataset_category[3] == "Synthia? datasets":
-                            get_metadata = call_api(metadata_base_url, header, identifier=id)
-                            synthia_dset_dicts.append(parse_datasets(get_metadata))
-                    except IndexError : continue
-
-                    try:
-                        if get_dataset_category[3] == "SPEW datasets":
-                            get_metadata = call_api(metadata_base_url, header, identifier=id)
-                            spew_dset_dicts.append(parse_datasets(get_metadata))
-                    except IndexError : continue
-
-                    if get_dataset_category[1] == "Websites with data":
-                        get_metadata = call_api(metadata_base_url, header, identifier=id)
-                        web_dset_dicts.append(parse_datasets(get_metadata))
-
-                else : continue
-
-            except ConnectionResetError:
-                print(id)
-        """
-
-        r = urllib.request.Request("http://betaweb.rods.pitt.edu/digital-commons-dev/api/v1/contents", headers=header)
-        rhand = urllib.request.urlopen(r)
-        convert_to_string = rhand.read().decode("latin-1")
-        data = json.loads(convert_to_string)
-
-        for element in data:
+                matched = test(record)
+            except (KeyError, IndexError, TypeError, AttributeError) as e:
+                matched = False
+                dats_metrics.count("rule_fallbacks", rule=dispatcher["rules"][index]["name"], error=type(e).__name__)
+
+        if matched:
+            hits[index] += 1
+            if category not in categories:
+                categories.append(category)
+            if exclusive:
+                break
+    return categories
+
+
+def process_dataset(jsn, dispatcher):
+    """Classifies a dataset DATS and, if it belongs to any category, parses it. Returns the categories and the parsed
+    row, or None for the row if the dataset matched nothing or could not be parsed.
+    """
+
+    record = DatsRecord(jsn)
+    if dats_metrics.ACTIVE is not None:
+        return process_dataset_instrumented(record, dispatcher, dats_metrics.ACTIVE)
+
+    categories = classify_dataset(record, dispatcher)
+    if not categories:
+        return categories, None
+
+    try:
+        dataset_info = parse_datasets(jsn, dispatcher.get("locations"))
+    except KeyError:
+        print("Could not parse dataset: ", jsn.get("title"))
+        return categories, None
+    return categories, dataset_info
+
+
+def process_dataset_instrumented(record, dispatcher, metrics):
+    """process_dataset with the classify and parse stages timed, parse failures counted, and every Nth call run
+    under the profiler if sampling is on.
+    """
+
+    profiler = metrics.sample_profiler()
+    if profiler is not None:
+        profiler.enable()
+
+    try:
+        with metrics.stage("classify"):
+            categories = classify_dataset(record, dispatcher)
+        if not categories:
+            return categories, None
+
+        try:
+            with metrics.stage("parse"):
+                dataset_info = parse_datasets(record.content, dispatcher.get("locations"))
+        except KeyError:
+            print("Could not parse dataset: ", record.content.get("title"))
+            metrics.count("parse_failures", category=categories[0])
+            return categories, None
+        return categories, dataset_info
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+
+def harvest_dataset(jsn, dispatcher, previous=None, incremental=False):
+    """Processes one dataset DATS for a harvest. In incremental mode the DATS is fingerprinted first, and the categories
+    and row saved for it by the previous run are reused when the fingerprint hasn't changed; the rules that matched it
+    then are counted again, so the hits cover every dataset. Returns the categories, the row, the state to save for
+    the dataset (its fingerprint and the indexes of the rules it matched, or None outside incremental mode), and
+    whether the saved row was reused.
+    """
+
+    if not incremental:
+        categories, dataset_info = process_dataset(jsn, dispatcher)
+        return categories, dataset_info, None, False
+
+    hits = dispatcher["hits"]
+    digest = dats_incremental.fingerprint(jsn)
+    if previous is not None and previous["fingerprint"] == digest:
+        for index in previous["rules"]:
+            hits[index] += 1
+        # A location index learns from the rows it would have parsed, so the records after get the same codes
+        if dispatcher.get("locations") is not None and previous["row"] is not None:
+            dispatcher["locations"].add_row(previous["row"])
+        return previous["categories"], previous["row"], {"fingerprint": digest, "rules": previous["rules"]}, True
+
+    before = list(hits)
+    categories, dataset_info = process_dataset(jsn, dispatcher)
+    matched = [index for index, (old, new) in enumerate(zip(before, hits)) if old != new]
+    return categories, dataset_info, {"fingerprint": digest, "rules": matched}, False
+
+
+def harvest_dataset_chunk(chunk, incremental, instrumented=False):
+    """Runs harvest_dataset over a chunk of (DATS, previous) pairs in a worker process. Returns the results along
+    with what the chunk would otherwise leave behind in the worker, so the parent can pass it on: the rule hits, the
+    text the chunk printed, and, if the parent is instrumented, the timings and counters of the chunk.
+    """
+
+    # A forked worker starts with a copy of the parent's metrics, which must not be sent back and added twice
+    dats_metrics.disable()
+    metrics = dats_metrics.enable() if instrumented else None
+
+    dispatcher = compile_rules(DATASET_RULES)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        results = [harvest_dataset(jsn, dispatcher, previous, incremental) for jsn, previous in chunk]
+
+    collected = None
+    if metrics is not None:
+        collected = (metrics.timings, metrics.counters)
+        dats_metrics.disable()
+    return results, dispatcher["hits"], output.getvalue(), collected
+
+
+def harvest_datasets(items, dispatcher, incremental=False, workers=1, chunk_size=PARALLEL_CHUNK_SIZE):
+    """Runs harvest_dataset over a stream of (DATS, previous) pairs and yields the results in input order.
+
+    With more than one worker, chunks of records are processed on a process pool. At most two chunks per worker are
+    in flight at a time so that memory stays flat for a streamed catalog, and the output is the same as the serial
+    path's: what a chunk printed is printed when its results are, and its rule hits, timings, and counters are added
+    to the parent's. A location index can't be split across processes: it fills in codes from the locations of the
+    records before, so workers learning apart would fill in different codes than the serial path, depending on how
+    the chunks are scheduled.
+    """
+
+    if workers > 1 and dispatcher.get("locations") is not None:
+        raise ValueError("A location index can't be used with more than one worker")
+
+    if workers <= 1:
+        for jsn, previous in items:
+            yield harvest_dataset(jsn, dispatcher, previous, incremental)
+        return
+
+    items = iter(items)
+    pending = deque()
+    instrumented = dats_metrics.ACTIVE is not None
+
+    def collect(future):
+        results, hits, output, collected = future.result()
+        for index, count in enumerate(hits):
+            dispatcher["hits"][index] += count
+        sys.stdout.write(output)
+        if collected is not None and dats_metrics.ACTIVE is not None:
+            dats_metrics.ACTIVE.merge(*collected)
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk in iter(lambda: list(islice(items, chunk_size)), []):
+            pending.append(executor.submit(harvest_dataset_chunk, chunk, incremental, instrumented))
+            if len(pending) >= 2 * workers:
+                yield from collect(pending.popleft())
+        while pending:
+            yield from collect(pending.popleft())
+
+
+# The columns of the data format snapshots, in order. A column with a path is extracted by code compiled from its
+# entry (see dats_fields.compile_field); the others are filled in by parse_data_standard.
+DATA_FORMAT_FIELDS = [{"column": "name", "path": "name", "required": True},
+                      {"column": "identifier", "path": "identifier.identifier", "empty": "falsy"},
+                      {"column": "identifier_source", "path": "identifier.identifierSource", "empty": "falsy"},
+                      {"column": "type", "path": "type.value", "empty": "falsy"},
+                      {"column": "type_IRI", "path": "type.valueIRI", "empty": "falsy"},
+                      {"column": "description"},
+                      {"column": "licenses"},
+                      {"column": "version", "path": "version", "required": True, "empty": "falsy"},
+                      {"column": "human-readable_data_format_specification_value"},
+                      {"column": "human-readable_data_format_specification_value_IRI"},
+                      {"column": "machine-readable_data_format_specification_value"},
+                      {"column": "machine-readable_data_format_specification_value_IRI"},
+                      {"column": "validator_value"},
+                      {"column": "validator_value_IRI"}]
+
+# The columns of the dataset snapshots, in order. The ones without a path are filled in by parse_datasets.
+DATASET_FIELDS = [{"column": "title"},
+                  {"column": "description"},
+                  {"column": "dataset_identifier", "path": "identifier.identifier", "empty": [""]},
+                  {"column": "disease"},
+                  {"column": "authors"},
+                  {"column": "created"},
+                  {"column": "modified"},
+                  {"column": "accessed"},
+                  {"column": "landing_page", "path": "distributions.0.access.landingPage"},
+                  {"column": "access_page", "path": "distributions.0.access.accessURL"},
+                  {"column": "format", "path": "distributions.0.formats", "join": "; "},
+                  {"column": "conforms_to", "join": "; ",
+                   "paths": ["distributions.0.conformsTo.0.name",
+                             "distributions.0.conformsTo.0.identifier.identifier"]},
+                  {"column": "license"},
+                  {"column": "geography"},
+                  {"column": "apollo_location_code"},
+                  {"column": "iso_3166"},
+                  {"column": "iso_3166_1"},
+                  {"column": "iso_3166_1_alpha_3"},
+                  {"column": "apollo_enabled"},
+                  {"column": "on_olympus"}]
+
+DATA_FORMAT_FIELDNAMES = [field["column"] for field in DATA_FORMAT_FIELDS]
+DATASET_FIELDNAMES = [field["column"] for field in DATASET_FIELDS]
+
+# Every column with a path, extracted together for the snapshots and one at a time for the parse_* functions
+extract_data_format_fields = dats_fields.compile_table(DATA_FORMAT_FIELDS, "extract_data_format_fields")
+extract_dataset_fields = dats_fields.compile_table(DATASET_FIELDS, "extract_dataset_fields")
+DATA_FORMAT_EXTRACTORS = dats_fields.compile_fields(DATA_FORMAT_FIELDS)
+DATASET_EXTRACTORS = dats_fields.compile_fields(DATASET_FIELDS)
+
+# The repository of the first distribution, which parse_distributions maps to the apollo_enabled and on_olympus columns
+get_stored_in = dats_fields.compile_path("distributions.0.storedIn.name")
+
+# Category, label in the console summary, and output file prefix of every dataset snapshot
+DATASET_OUTPUTS = [("tycho", "Tycho", "tycho-dats-info-"),
+                   ("spew", "SPEW", "spew-dats-info-"),
+                   ("synthia", "Synthia", "synthia-dats-info-"),
+                   ("case-series", "Case series", "case-series-dats-info-"),
+                   ("chikv", "CHIKV", "chikv-dats-info-"),
+                   ("ebola", "Ebola", "ebola-dats-info-"),
+                   ("zika", "Zika", "zika-dats-info-"),
+                   ("infectious-disease", "Infectious disease scenario", "infectious-disease-dats-info-"),
+                   ("mortality", "Mortality", "mortality-dats-info-"),
+                   ("disease-surveillance", "Surveillance", "disease-surveillance-dats-info-"),
+                   ("websites-with-data", "Web", "websites-with-data-dats-info-"),
+                   ("location", "Location", "location-dats-info-")]
+
+
+def content_fieldnames(content_type, tagged=False):
+    """Returns the columns of the snapshot files for a content type, ending with the source column when the rows of a
+    multi-catalog harvest are tagged with their catalog.
+    """
+
+    if content_type == "data-format":
+        fieldnames = DATA_FORMAT_FIELDNAMES
+    elif content_type == "dataset":
+        fieldnames = DATASET_FIELDNAMES
+    else:
+        raise ValueError("Unknown content type: " + content_type)
+    if tagged:
+        return fieldnames + [dats_catalogs.SOURCE_COLUMN]
+    return fieldnames
+
+
+def write_to_file(fname, list_of_dictionaries, content_type, output_format="tsv", tagged=False):
+    """Writes the metadata for each digital object to a tab-delimited text file, or to a Parquet or Arrow file when
+    'output_format' asks for one. The file is replaced atomically, so re-running a harvest within the same minute
+    overwrites the snapshot instead of appending a second header to it. Returns the sink, which holds the number of
+    rows and bytes written.
+    """
+
+    fieldnames = content_fieldnames(content_type, tagged)
+    if output_format == "tsv":
+        sink = dats_writer.SnapshotSink(fname, fieldnames)
+    else:
+        sink = dats_columnar.COLUMNAR_SINKS[output_format](fname, fieldnames)
+    try:
+        for row in list_of_dictionaries:
+            sink.write(row)
+    except BaseException:
+        sink.abort()
+        raise
+    sink.commit()
+    return sink
+
+
+def print_write_report(report):
+    """Prints the rows and bytes written to each snapshot file."""
+
+    print("<-------------------- Snapshot files written -------------------->")
+    for written in report:
+        print("\t", written["fname"] + ": ", written["rows"], "rows,", written["bytes"], "bytes")
+
+
+def count_row(metrics, categories, dataset_info, reused=False):
+    """Counts a written dataset row, and each of its fields that was filled with 'null', for every category it went
+    to.
+    """
+
+    null_fields = [field for field, value in dataset_info.items() if value == "null"]
+    for category in categories:
+        metrics.count("records", category=category)
+        if reused:
+            metrics.count("reused_records", category=category)
+        for field in null_fields:
+            metrics.count("null_fields", category=category, field=field)
+
+
+def harvest_data_formats(source, header, today, columnar=None, archive=None, per_source=False, elements=None):
+    """Parses the data formats in a contents response into their snapshot file, plus a columnar copy and an archive
+    entry if asked for. Returns the write report.
+
+    'source' can also be a list of Catalogs, which are fetched at once. Their rows are tagged with the catalog they
+    came from and written to one merged snapshot, or to one snapshot per catalog with 'per_source'.
+
+    'elements' are (catalog name, element) pairs that were already fetched from 'source', such as the data standards
+    harvest_dataset_categories collects, to parse instead of fetching the contents again.
+    """
+
+    tagged = not isinstance(source, str)
+    outputs = output_catalogs(source, per_source)
+    split = outputs != [None]
+    dstandard_dicts = {output: list() for output in outputs}
+    sinks = list()
+
+    with dats_metrics.stage("data-formats"):
+        if elements is None:
+            elements = contents_elements(source, header)
+        for catalog, element in elements:
+            if element["type"] == DATA_STANDARD_TYPE:
+                with dats_metrics.stage("parse"):
+                    data_info = parse_data_standard(element["content"])
+                if tagged:
+                    data_info[dats_catalogs.SOURCE_COLUMN] = catalog
+                dstandard_dicts[catalog if split else None].append(data_info)
+                dats_metrics.count("records", category="data-formats")
+
+        with dats_metrics.stage("write"):
+            for output in outputs:
+                output_fname = snapshot_fname("data-formats-dats-info-", today, output)
+                sinks.append((output, write_to_file(output_fname, dstandard_dicts[output], "data-format",
+                                                    tagged=tagged)))
+                if columnar:
+                    sinks.append((output, write_to_file(dats_columnar.columnar_fname(output_fname, columnar),
+                                                        dstandard_dicts[output], "data-format", columnar, tagged)))
+        if archive:
+            with dats_metrics.stage("archive"):
+                archive_conn = dats_archive.open_archive(archive)
+                for output in outputs:
+                    dats_archive.archive_snapshot(archive_conn, snapshot_fname("data-formats-dats-info-", today,
+                                                                               output), "data-formats")
+
+    return [{"name": sink_name("data-format", output), "fname": sink.fname, "rows": sink.rows, "bytes": sink.bytes}
+            for output, sink in sinks]
+
+
+def harvest_dataset_categories(source, header, today, incremental=False, state_file=DEFAULT_STATE_FILE, workers=1,
+                               columnar=None, archive=None, locations=None, per_source=False, data_standards=None):
+    """Classifies and parses the datasets in a contents response into one snapshot file per category. In incremental
+    mode, unchanged datasets reuse their rows from the last run and the changes since then are written to
+    'dats-changes-<today>.json'. Returns a summary with the write report, the rows per category, the hits per
+    classification rule, and, in incremental mode, the changes.
+
+    'source' can also be a list of Catalogs, which are fetched at once and fed through the same pass. Their rows are
+    tagged with the catalog they came from and written to merged snapshots per category, or to snapshots per category
+    and catalog with 'per_source'. The summary then also has the records and seconds of each catalog.
+
+    With a 'data_standards' list, the data standards that the pass streams past are added to it as (catalog name,
+    element) pairs, so harvest_data_formats can write them without fetching the contents a second time.
+    """
+
+    tagged = not isinstance(source, str)
+    outputs = output_catalogs(source, per_source)
+    split = outputs != [None]
+    fieldnames = content_fieldnames("dataset", tagged)
+
+    # Every category file is open for the whole pass, so rows go to disk as they are parsed
+    snapshot_writer = dats_writer.SnapshotWriter()
+    for category, label, prefix in DATASET_OUTPUTS:
+        for output in outputs:
+            output_fname = snapshot_fname(prefix, today, output)
+            snapshot_writer.add_sink(sink_name(category, output), output_fname, fieldnames)
+            if columnar:
+                snapshot_writer.add_sink(sink_name(category, output),
+                                         dats_columnar.columnar_fname(output_fname, columnar), fieldnames,
+                                         dats_columnar.COLUMNAR_SINKS[columnar])
+
+    datasets_witout_ids = list()
+    dispatcher = compile_rules(DATASET_RULES, locations)
+
+    # Filling in location codes changes rows, so rows saved with another location index, or none, are parsed again
+    state_options = {"locations": locations.settings() if locations is not None else None}
+    previous_records, reusable = dict(), False
+    if incremental:
+        previous_records, reusable = dats_incremental.load_state(state_file, DATASET_RULES, state_options)
+    current_records = dict()
+    in_flight = deque()
+    summary = {"datasets": 0, "reused": 0}
+    metrics = dats_metrics.ACTIVE
+
+    elements = contents_elements(source, header)
+
+    def dataset_items():
+        for catalog, element in elements:
+            if data_standards is not None and element["type"] == DATA_STANDARD_TYPE:
+                data_standards.append((catalog, element))
             if "Dataset" in element["type"]:
-                title = element["content"]["title"]
+                key = None
+                previous = None
+                if incremental:
+                    key = dats_incremental.record_key(element["content"], current_records, catalog)
+                    current_records[key] = None
+                    if reusable:
+                        previous = previous_records.get(key)
+                in_flight.append((catalog, key, element["content"]))
+                yield element["content"], previous
+
+    with snapshot_writer, dats_metrics.stage("datasets"):
+        for categories, dataset_info, state, was_reused in harvest_datasets(dataset_items(), dispatcher,
+                                                                            incremental=incremental,
+                                                                            workers=workers):
+            catalog, key, content = in_flight.popleft()
+            summary["datasets"] += 1
+            if tagged and dataset_info is not None:
+                dataset_info[dats_catalogs.SOURCE_COLUMN] = catalog
+
+            if incremental:
+                summary["reused"] += was_reused
+                current_records[key] = {"fingerprint": state["fingerprint"],
+                                        "rules": state["rules"],
+                                        "title": content.get("title"),
+                                        "categories": categories,
+                                        "row": dataset_info}
+
+            if dataset_info is None:
+                if metrics is not None:
+                    metrics.count("unwritten", reason="unclassified" if not categories else "unparsed")
+                continue
 
-                try:
-                    identifier = element["content"]["identifier"]["identifier"]
-                except KeyError:
-                    disease_surveillance_dset_dicts.append(parse_datasets(element["content"]))
-                    continue
+            if "chikv" in categories and check_id(content) == "null":
+                datasets_witout_ids.append(dataset_info["title"])
 
+            if split:
+                categories = [sink_name(category, catalog) for category in categories]
+            if metrics is None:
+                for category in categories:
+                    snapshot_writer.write(category, dataset_info)
+            else:
+                start = time.perf_counter()
+                for category in categories:
+                    snapshot_writer.write(category, dataset_info)
+                metrics.add_time("write", time.perf_counter() - start)
+                count_row(metrics, categories, dataset_info, was_reused)
+
+        with dats_metrics.stage("commit"):
+            summary["report"] = snapshot_writer.commit()
+
+        if tagged:
+            summary["catalogs"] = {name: {"records": records, "seconds": elements.seconds.get(name)}
+                                   for name, records in elements.records.items()}
+            for name, seconds in elements.seconds.items():
+                dats_metrics.add_time("catalogs/" + name, seconds)
+
+    if archive:
+        with dats_metrics.stage("archive"):
+            archive_conn = dats_archive.open_archive(archive)
+            for category, label, prefix in DATASET_OUTPUTS:
+                for output in outputs:
+                    dats_archive.archive_snapshot(archive_conn, snapshot_fname(prefix, today, output), category)
+
+    summary["rows"] = {category: sum(snapshot_writer.rows(sink_name(category, output)) for output in outputs)
+                       for category, label, prefix in DATASET_OUTPUTS}
+    summary["hits"] = {rule["name"]: hits for rule, hits in zip(dispatcher["rules"], dispatcher["hits"])}
+
+    if incremental:
+        summary["changes"] = dats_incremental.diff_records(previous_records, current_records)
+        summary["changes_fname"] = "dats-changes-" + today + ".json"
+        with open(summary["changes_fname"], "w", encoding="utf-8") as changes_f:
+            json.dump(summary["changes"], changes_f, indent=2, ensure_ascii=False)
+        dats_incremental.save_state(state_file, current_records, DATASET_RULES, state_options)
+
+    return summary
+
+
+def harvest_crawled_categories(crawler, today, columnar=None, archive=None, locations=None):
+    """Parses the datasets a dats_crawler.Crawler finds by walking the API's identifiers into the same snapshot files
+    as harvest_dataset_categories, filed by their category paths instead of the classification table. Returns a
+    summary with the write report, the rows per category, the hits per category rule, the identifiers that could not
+    be crawled, and the calls made to each endpoint.
+    """
 
-                if identifier == "http://data.sfgov.org/api/views/yg87-cd6v" \
-                        or identifier == "http://data.cdc.gov/api/views/cjae-szjv" \
-                        or identifier == "http://data.cityofnewyork.us/api/views/w9ei-idxz" \
-                        or identifier == "http://data.cityofnewyork.us/api/views/kku6-nxdu":
-                    location_dset_dicts.append(parse_datasets(element["content"]))
-                    continue
+    fieldnames = content_fieldnames("dataset")
+    snapshot_writer = dats_writer.SnapshotWriter()
+    for category, label, prefix in DATASET_OUTPUTS:
+        output_fname = snapshot_fname(prefix, today)
+        snapshot_writer.add_sink(category, output_fname, fieldnames)
+        if columnar:
+            snapshot_writer.add_sink(category, dats_columnar.columnar_fname(output_fname, columnar), fieldnames,
+                                     dats_columnar.COLUMNAR_SINKS[columnar])
+
+    summary = {"datasets": 0, "errors": dict()}
+    metrics = dats_metrics.ACTIVE
+
+    with snapshot_writer, dats_metrics.stage("crawl"):
+        for identifier, categories, content, error in crawler.crawl():
+            summary["datasets"] += 1
+            if error is not None:
+                summary["errors"][identifier] = str(error)
+                dats_metrics.count("crawl_errors", error=type(error).__name__)
+                continue
+            if content is None:
+                continue
 
-                if identifier == "http://doi.org/10.5281/zenodo.580104":
-                    ids_dset_dicts.append(parse_datasets(element["content"]))
-
-                if identifier == "MDC:WS-000487":
-                    mortality_dset_dicts.append(parse_datasets(element["content"]))
-
-                if "epidemic" in check_type(element["content"], "information") and "Chikungunya" in check_is_about(element["content"]):
-                    if check_id(element["content"]) == "null":
-                        datasets_witout_ids.append(title)
-                    chikv_epidemic_dset_dicts.append(parse_datasets(element["content"]))
-
-                if "epidemic" in check_type(element["content"], "information") and "zika" in check_is_about(element["content"]).lower():
-                    zikv_epidemic_dset_dicts.append(parse_datasets(element["content"]))
-
-                if "epidemic" in check_type(element["content"], "information") and ("ebola" in check_is_about(element["content"]).lower() or "Sudan virus" in check_is_about(element["content"])):
-                    ebov_epidemic_dset_dicts.append(parse_datasets(element["content"]))
-
-                if "rabies" in title.lower() and "united states" in title.lower():
-                    case_series_dset_dicts.append(parse_datasets(element["content"]))
-
-                try:
-                    if "tycho" in element["content"]["identifier"]["identifier"]:
-                        tycho_dset_dicts.append(parse_datasets(element["content"]))
-                except KeyError : continue
-
-                if "SPEW" in element["content"]["description"]:
-                    spew_dset_dicts.append(parse_datasets(element["content"]))
-
-                try:
-                    if len(element["content"]["types"]) > 2:
-                        if element["content"]["types"][2]["platform"]["value"] == "SYNTHIA":
-                            synthia_dset_dicts.append(parse_datasets(element["content"]))
-                except KeyError : continue
-
-                if identifier == "MDC:WS-000494" \
-                        or identifier == "https://data.cdc.gov/browse?category=MMWR" \
-                        or identifier == "MDC:WS-000484" \
-                        or identifier == "MDC:WS-000486" \
-                        or identifier == "http://www2.datasus.gov.br/DATASUS/index.php?area=0203" \
-                        or identifier == "MDC:WS-000023" \
-                        or identifier == "MDC:allegheny-count-ed-visits-pds-set1" \
-                        or identifier == "10.5281/zenodo.2583145" \
-                        or identifier == "10.5281/zenodo.2583143" \
-                        or identifier == "10.5281/zenodo.2583216" \
-                        or identifier == "10.5281/zenodo.2644020" \
-                        or identifier == "10.5281/zenodo.2643814" \
-                        or identifier == "https://www.moh.gov.sg/diseases-updates":
-                    disease_surveillance_dset_dicts.append(parse_datasets(element["content"]))
-
-                try:
-                    if element["content"]["extraProperties"][0]["category"] == "website":
-                            web_dset_dicts.append(parse_datasets(element["content"]))
-                    else:
-                        disease_surveillance_dset_dicts.append(parse_datasets(element["content"]))
-                except KeyError : continue
-
-        print("Writing output from Project Tycho dataset DATS to file...")
-        #write_to_file(tycho_output_fname, tycho_dset_dicts, content_type)
-        print("Writing output from SPEW dataset DATS to file...")
-        #write_to_file(spew_output_fname, spew_dset_dicts, content_type)
-        print("Writing output from Synthia dataset DATS to file...")
-        #write_to_file(synthia_output_fname, synthia_dset_dicts, content_type)
-        print("Writing output from Case Series dataset DATS to file...")
-        #write_to_file(case_series_output_fname, case_series_dset_dicts, content_type)
-        print("Writing output from Chikungunya dataset DATS to file...")
-        #write_to_file(chikv_output_fname, chikv_epidemic_dset_dicts, content_type)
-        print("Writing output from Ebola dataset DATS to file...")
-        #write_to_file(ebov_output_fname, ebov_epidemic_dset_dicts, content_type)
-        print("Writing output from Zika dataset DATS to file...")
-        #write_to_file(zikv_output_fname, zikv_epidemic_dset_dicts, content_type)
-        print("Writing output from Infectious Disease Scenario dataset DATS to file...")
-        #write_to_file(ids_output_fname, ids_dset_dicts, content_type)
-        print("Writing output from Mortality dataset DATS to file...")
-        write_to_file(mortality_out_fname, mortality_dset_dicts, content_type)
-        print("Writing output from Disease Surveillance dataset DATS to file...")
-        write_to_file(disease_surveillance_output_fname, disease_surveillance_dset_dicts, content_type)
-        print("Writing output from Websites with data DATS to file...")
-        #write_to_file(web_dset_output_fname, web_dset_dicts, content_type)
-        print("Writing output from Location dataset DATS to file...")
-        #write_to_file(location_dset_output_fname, location_dset_dicts, content_type)
+            try:
+                with dats_metrics.stage("parse"):
+                    dataset_info = parse_datasets(content, locations)
+            except KeyError:
+                print("Could not parse dataset: ", identifier)
+                continue
+
+            for category in categories:
+                snapshot_writer.write(category, dataset_info)
+            if metrics is not None:
+                count_row(metrics, categories, dataset_info)
+
+        with dats_metrics.stage("commit"):
+            summary["report"] = snapshot_writer.commit()
+
+    for endpoint, requests in crawler.requests.items():
+        dats_metrics.count("requests", requests, endpoint=endpoint)
+
+    if archive:
+        with dats_metrics.stage("archive"):
+            archive_conn = dats_archive.open_archive(archive)
+            for category, label, prefix in DATASET_OUTPUTS:
+                dats_archive.archive_snapshot(archive_conn, snapshot_fname(prefix, today), category)
+
+    summary["rows"] = {category: snapshot_writer.rows(category) for category, label, prefix in DATASET_OUTPUTS}
+    summary["hits"] = {rule["name"]: hits for rule, hits in zip(crawler.rules, crawler.hits)}
+    summary["requests"] = dict(crawler.requests)
+    return summary
+
+
+if __name__ == "__main__":
+    today = dt.datetime.today().strftime("%Y-%m-%d_T%H-%M")
 
+    header = { "Accept": "application/json" }
+
+    arg_parser = argparse.ArgumentParser(description="Parses the DATS in the MIDAS Digital Commons into tab-delimited "
+                                                     "text files.")
+    arg_parser.add_argument("source", nargs="*", default=[CONTENTS_URL],
+                            help="contents API URL, or the path of a saved contents response to parse instead; give "
+                                 "several, optionally as NAME=SOURCE, to harvest those catalogs at once into snapshots "
+                                 "whose rows are tagged with their source")
+    arg_parser.add_argument("--per-source", action="store_true",
+                            help="with several sources, write separate snapshots for each one instead of merging them")
+    arg_parser.add_argument("--content-type", choices=["data-format", "dataset"],
+                            help="what to harvest; asked for interactively if left out")
+    arg_parser.add_argument("--incremental", action="store_true",
+                            help="only parse datasets whose DATS changed since the last incremental run")
+    arg_parser.add_argument("--state-file", default=DEFAULT_STATE_FILE,
+                            help="where the incremental mode keeps its fingerprints and rows between runs")
+    arg_parser.add_argument("--workers", type=int, default=1,
+                            help="number of processes that classify and parse datasets (default: 1)")
+    arg_parser.add_argument("--columnar", choices=sorted(dats_columnar.COLUMNAR_FORMATS),
+                            help="also write each snapshot as a Parquet or Arrow file (needs pyarrow)")
+    arg_parser.add_argument("--archive", metavar="ARCHIVE",
+                            help="add the text snapshots to this deduplicated archive, e.g. dats-archive.sqlite")
+    arg_parser.add_argument("--location-index", action="store_true",
+                            help="fill in the ISO codes a location leaves out from other locations with the same "
+                                 "Apollo code; the codes a location states are kept. Changes those rows rather than "
+                                 "speeding anything up, and runs in one process, since what gets filled in depends on "
+                                 "the records before (not with --workers)")
+    arg_parser.add_argument("--locations", metavar="REFERENCE",
+                            help="pre-load the location index from a reference file built by dats_locations.py; "
+                                 "implies --location-index")
+    arg_parser.add_argument("--metrics", nargs="?", const="-", metavar="FILE",
+                            help="time each stage and count records, fallbacks, and null fields; written to FILE at "
+                                 "the end of the run, or to stderr")
+    arg_parser.add_argument("--metrics-format", choices=["json", "prometheus"], default="json")
+    arg_parser.add_argument("--profile-every", type=int, default=0, metavar="N",
+                            help="with --metrics, run every Nth dataset under cProfile and print the parse_* "
+                                 "functions' profile")
+    arg_parser.add_argument("--json-decoder", choices=["auto"] + sorted(dats_decode.DECODERS), default="json",
+                            help="JSON decoder for API responses; 'auto' uses orjson when it is installed "
+                                 "(default: %(default)s)")
+    fixture_options = arg_parser.add_mutually_exclusive_group()
+    fixture_options.add_argument("--record", metavar="FIXTURES",
+                                 help="save every API response into this fixture archive, e.g. dats-fixtures.sqlite")
+    fixture_options.add_argument("--replay", metavar="FIXTURES",
+                                 help="serve every API response from this fixture archive instead of the network")
+    arg_parser.add_argument("--replay-latency", type=float, default=0.0, metavar="SECONDS",
+                            help="with --replay, wait this long before serving each response (default: 0)")
+    arg_parser.add_argument("--resumable", action="store_true",
+                            help="retrieve contents URLs in HTTP Range chunks saved under --spool-dir, so an "
+                                 "interrupted harvest resumes where it stopped")
+    arg_parser.add_argument("--chunk-size", type=int, default=dats_download.DEFAULT_CHUNK_SIZE // (1024 * 1024),
+                            metavar="MB", help="size of each Range request with --resumable; 0 streams the response in "
+                                               "one request, resuming from the saved bytes (default: %(default)s)")
+    arg_parser.add_argument("--spool-dir", default=dats_download.DEFAULT_SPOOL_DIR,
+                            help="where --resumable keeps partial downloads and their checkpoints "
+                                 "(default: %(default)s)")
+    arg_parser.add_argument("--progress", action="store_true",
+                            help="show the download and parse rates while harvesting; implies --resumable")
+    arg_parser.add_argument("--crawl", nargs="?", const=API_URL, metavar="API",
+                            help="find the datasets by walking the identifiers of the API (default: %(const)s) and "
+                                 "file them by their category paths, instead of classifying the contents payload")
+    arg_parser.add_argument("--crawl-workers", type=int, default=dats_crawler.DEFAULT_WORKERS, metavar="N",
+                            help="with --crawl, number of identifiers whose API calls are in flight at once "
+                                 "(default: %(default)s)")
+    args = arg_parser.parse_args()
+    if args.crawl and (args.incremental or args.per_source or args.workers > 1):
+        arg_parser.error("--crawl can't be combined with --incremental, --per-source, or --workers")
+    if (args.location_index or args.locations) and args.workers > 1:
+        arg_parser.error("--location-index and --locations can't be combined with --workers")
+    metrics = dats_metrics.enable(args.profile_every) if args.metrics else None
+    if args.resumable or args.progress:
+        dats_download.enable(args.spool_dir, args.chunk_size * 1024 * 1024, args.progress)
+    dats_decode.use_decoder(args.json_decoder)
+    if args.record:
+        dats_replay.record(args.record)
+    elif args.replay:
+        dats_replay.replay(args.replay, args.replay_latency)
+    if len(args.source) == 1 and "=" not in args.source[0]:
+        contents_source = args.source[0]
+    else:
+        contents_source = dats_catalogs.parse_catalogs(args.source)
+
+    content_type = args.content_type
+    if content_type is None:
+        content_type = input("Please indicate which content type you would like: [data-format]/[dataset]: ")
+    if args.crawl and content_type != "dataset":
+        arg_parser.error("--crawl only harvests datasets")
+
+    """Code for processing data formats JSON DATS """
+
+    if content_type == "data-format":
+        report = harvest_data_formats(contents_source, header, today, columnar=args.columnar, archive=args.archive,
+                                      per_source=args.per_source)
+        if args.progress:
+            dats_download.ACTIVE.progress.finish()
+        # A columnar copy is reported under the same name as its text snapshot
+        print("Data formats: ", sum({written["name"]: written["rows"] for written in report}.values()))
+        print_write_report(report)
+
+
+    """Code for processing datasets JSON DATS"""
+
+    if content_type == "dataset":
+        location_index = None
+        if args.location_index or args.locations:
+            location_index = dats_locations.LocationIndex()
+            if args.locations:
+                location_index.load(args.locations)
+
+        print("Writing output from dataset DATS to files...")
+        if args.crawl:
+            cache, category_cache = dats_crawler.crawler_caches()
+            crawler = dats_crawler.Crawler(args.crawl, header, workers=args.crawl_workers, cache=cache,
+                                           category_cache=category_cache)
+            summary = harvest_crawled_categories(crawler, today, columnar=args.columnar, archive=args.archive,
+                                                 locations=location_index)
+            crawler.close()
+        else:
+            summary = harvest_dataset_categories(contents_source, header, today, incremental=args.incremental,
+                                                 state_file=args.state_file, workers=args.workers,
+                                                 columnar=args.columnar, archive=args.archive,
+                                                 locations=location_index, per_source=args.per_source)
+        if args.progress:
+            dats_download.ACTIVE.progress.finish()
+
+        print_write_report(summary["report"])
+        if args.archive:
+            print("Added the snapshots to", args.archive)
         print("<-------------------- Number of resources parsed for each dataset category -------------------->")
-        print("\t", "Tycho: ", len(tycho_dset_dicts))
-        print("\t", "SPEW: ", len(spew_dset_dicts))
-        print("\t", "Synthia: ", len(synthia_dset_dicts))
-        print("\t", "Case series: ", len(case_series_dset_dicts))
-        print("\t", "CHIKV: ", len(chikv_epidemic_dset_dicts))
-        print("\t", "Ebola: ", len(ebov_epidemic_dset_dicts))
-        print("\t", "Zika: ", len(zikv_epidemic_dset_dicts))
-        print("\t", "Infectious disease scenario: ", len(ids_dset_dicts))
-        print("\t", "Mortality: ", len(mortality_dset_dicts))
-        print("\t", "Surveillance: ", len(disease_surveillance_dset_dicts))
-        print("\t", "Web: ", len(web_dset_dicts))
-        print("\t", "Location: ", len(location_dset_dicts))
\ No newline at end of file
+        for category, label, prefix in DATASET_OUTPUTS:
+            print("\t", label + ": ", summary["rows"][category])
+        print("<-------------------- Number of datasets matched by each classification rule -------------------->")
+        for name, hits in summary["hits"].items():
+            print("\t", name + ": ", hits)
+        if args.crawl:
+            print("<-------------------- Identifier crawl -------------------->")
+            print("\t", "Datasets: ", summary["datasets"], "in", round(crawler.seconds, 2), "seconds")
+            for endpoint, requests in summary["requests"].items():
+                print("\t", endpoint + " calls: ", requests)
+            print("\t", "Category lookups reused: ", crawler.category_reuses)
+            print("\t", "Not crawled: ", len(summary["errors"]))
+            for identifier, error in summary["errors"].items():
+                print("\t\t", identifier + ": ", error)
+        if "catalogs" in summary:
+            print("<-------------------- Catalogs -------------------->")
+            for name, catalog in summary["catalogs"].items():
+                print("\t", name + ": ", catalog["records"], "records in", round(catalog["seconds"] or 0.0, 2),
+                      "seconds")
+        if location_index is not None:
+            print("<-------------------- Location index -------------------->")
+            print("\t", "Locations: ", len(location_index))
+            print("\t", "Filled in by Apollo code: ", location_index.filled)
+            print("\t", "Missing codes not in the index: ", location_index.unknown)
+
+        if args.incremental:
+            changes = summary["changes"]
+            print("<-------------------- Incremental harvest -------------------->")
+            print("\t", "Unchanged (rows carried forward): ", summary["reused"])
+            print("\t", "Parsed: ", summary["datasets"] - summary["reused"])
+            print("\t", "Added: ", len(changes["added"]))
+            print("\t", "Modified: ", len(changes["modified"]))
+            print("\t", "Removed: ", len(changes["removed"]))
+            print("\t", "Changes written to ", summary["changes_fname"])
+
+    if args.record:
+        print("Recorded", dats_replay.ACTIVE.recorded, "responses to", args.record)
+    elif args.replay:
+        print("Replayed", dats_replay.ACTIVE.replayed, "responses from", args.replay, "with",
+              dats_replay.ACTIVE.missing, "not recorded")
+
+    if metrics is not None:
+        metrics.write(None if args.metrics == "-" else args.metrics, args.metrics_format)
+        if args.profile_every:
+            print(metrics.profile_stats(), file=sys.stderr)
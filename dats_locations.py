@@ -0,0 +1,176 @@
+import os
+import csv
+import glob
+import hashlib
+import argparse
+
+import dats_snapshot_reader
+import dats_snapshot_store
+
+
+DEFAULT_REFERENCE = "apollo-locations.tsv"
+REFERENCE_FIELDNAMES = ["apollo_location_code", "geography", "iso_3166", "iso_3166_1", "iso_3166_1_alpha_3"]
+
+
+class LocationIndex:
+    """Maps Apollo location codes to their ISO 3166, ISO 3166-1 numeric, and ISO 3166-1 alpha-3 codes, to fill in the
+    ISO codes that a 'spatialCoverage' entry leaves out.
+
+    Filling is opt-in because it changes the rows of those entries; it doesn't make parsing faster, since every entry
+    is still parsed to keep the codes it states. The index can be pre-loaded from a reference file and learns every
+    location the harvest parses with exactly one of each code, so which codes get filled depends on the records
+    parsed before. 'filled' counts the locations that had codes filled in and 'unknown' those whose missing codes the
+    index doesn't have.
+    """
+
+    def __init__(self, codes=None, learn=True):
+        self.codes = dict(codes or ())
+        self.names = dict()
+        self.learn = learn
+        self.references = list()
+        self.filled = 0
+        self.unknown = 0
+
+    def __len__(self):
+        return len(self.codes)
+
+    def lookup(self, apollo_code):
+        """Returns the ISO codes of an Apollo location code, or None if the index doesn't know it."""
+
+        return self.codes.get(apollo_code)
+
+    def add(self, apollo_code, codes, name=None):
+        """Adds a location to the index. Codes already in the index are kept."""
+
+        self.codes.setdefault(apollo_code, tuple(codes))
+        if name:
+            self.names.setdefault(apollo_code, name)
+
+    def fill(self, attr, codes):
+        """Fills in the ISO codes that a 'spatialCoverage' entry leaves out. 'codes' holds the lists of ISO 3166, ISO
+        3166-1 numeric, and ISO 3166-1 alpha-3 codes parse_location_iso_codes found in the entry; a list that is just
+        'null' gets the code the index has for the entry's Apollo code, and the others are left alone. An entry with
+        exactly one of each code is learned instead.
+        """
+
+        try:
+            apollo_code = attr["identifier"]["identifier"]
+        except (KeyError, TypeError):
+            apollo_code = None
+        if not isinstance(apollo_code, str):
+            apollo_code = None
+
+        missing = [position for position, values in enumerate(codes) if values == ["null"]]
+        if not missing:
+            if self.learn and apollo_code is not None and all(len(values) == 1 for values in codes):
+                self.add(apollo_code, [values[0] for values in codes], attr.get("name"))
+            return
+
+        known = self.codes.get(apollo_code) if apollo_code is not None else None
+        if known is None:
+            self.unknown += 1
+            return
+
+        self.filled += 1
+        for position in missing:
+            codes[position][0] = known[position]
+
+    def settings(self):
+        """Returns what decides the codes the index fills in, to tell whether rows parsed with another index can be
+        reused: whether it learns, and a hash of each reference file it was loaded from.
+        """
+
+        return {"learn": self.learn, "references": list(self.references)}
+
+    def load(self, fname=DEFAULT_REFERENCE):
+        """Adds the locations in a reference file written by save()."""
+
+        with open(fname, "rb") as reference_f:
+            self.references.append(hashlib.sha256(reference_f.read()).hexdigest())
+        with open(fname, encoding="utf-8", newline="") as reference_f:
+            for row in csv.DictReader(reference_f, dialect="excel-tab"):
+                self.add(row["apollo_location_code"],
+                         (row["iso_3166"], row["iso_3166_1"], row["iso_3166_1_alpha_3"]),
+                         row.get("geography"))
+        return self
+
+    def save(self, fname=DEFAULT_REFERENCE):
+        """Writes the index to a tab-delimited reference file, sorted by Apollo code."""
+
+        tmp_fname = "{}.{}.tmp".format(fname, os.getpid())
+        with open(tmp_fname, "w", encoding="utf-8", newline="") as reference_f:
+            dict_writer = csv.DictWriter(reference_f, fieldnames=REFERENCE_FIELDNAMES, dialect="excel-tab")
+            dict_writer.writeheader()
+            for apollo_code in sorted(self.codes):
+                codes = self.codes[apollo_code]
+                dict_writer.writerow({"apollo_location_code": apollo_code,
+                                      "geography": self.names.get(apollo_code, ""),
+                                      "iso_3166": codes[0],
+                                      "iso_3166_1": codes[1],
+                                      "iso_3166_1_alpha_3": codes[2]})
+        os.replace(tmp_fname, fname)
+
+    def add_snapshot(self, fname):
+        """Adds the locations of a snapshot file. Its location columns hold '; '-separated lists that line up entry by
+        entry; locations with a 'null' code are skipped.
+        """
+
+        # Only the location columns are decoded, not the titles and descriptions around them
+        with dats_snapshot_reader.SnapshotReader(fname) as reader:
+            if "apollo_location_code" not in reader.positions or "iso_3166" not in reader.positions:
+                return
+            wanted = ["apollo_location_code", "iso_3166", "iso_3166_1", "iso_3166_1_alpha_3"]
+            if "geography" in reader.positions:
+                wanted.append("geography")
+            columns = reader.columns(wanted)
+
+        names = columns.get("geography", [""] * len(columns["apollo_location_code"]))
+        for values in zip(columns["apollo_location_code"], names, columns["iso_3166"], columns["iso_3166_1"],
+                          columns["iso_3166_1_alpha_3"]):
+            self.add_row_values(*values)
+
+    def add_row(self, row):
+        """Learns the locations of a snapshot row, e.g. one an incremental harvest reuses instead of parsing it
+        again.
+        """
+
+        if self.learn:
+            self.add_row_values(row.get("apollo_location_code"), row.get("geography"), row.get("iso_3166"),
+                                row.get("iso_3166_1"), row.get("iso_3166_1_alpha_3"))
+
+    def add_row_values(self, *values):
+        """Adds the locations in the Apollo code, geography, and ISO code values of a row, which are '; '-separated
+        lists that line up entry by entry. Locations with a 'null' code are skipped, and so are all of a row's if its
+        lists don't line up.
+        """
+
+        split_values = [(value or "").split("; ") for value in values]
+        if len(set(len(value) for value in split_values)) != 1:
+            return
+        for apollo_code, name, *codes in zip(*split_values):
+            if apollo_code and "null" not in codes and "" not in codes:
+                self.add(apollo_code, codes, name)
+
+
+def build_from_history(root="."):
+    """Builds an index from every snapshot in the '*-dats-info' directories under 'root', newest first, so a location
+    whose codes changed gets its current ones.
+    """
+
+    index = LocationIndex()
+    fnames = glob.glob(os.path.join(root, "*-dats-info", "*.txt"))
+    for fname in sorted(fnames, key=lambda f: dats_snapshot_store.snapshot_timestamp(f) or "", reverse=True):
+        index.add_snapshot(fname)
+    return index
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Builds the Apollo location code reference file from the "
+                                                     "snapshot history.")
+    arg_parser.add_argument("root", nargs="?", default=".", help="directory that holds the '*-dats-info' directories")
+    arg_parser.add_argument("-o", "--output", default=DEFAULT_REFERENCE)
+    args = arg_parser.parse_args()
+
+    location_index = build_from_history(args.root)
+    location_index.save(args.output)
+    print("Wrote", len(location_index), "locations to", args.output)
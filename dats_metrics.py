@@ -0,0 +1,194 @@
+import io
+import sys
+import json
+import time
+import cProfile
+import pstats
+import threading
+from contextlib import contextmanager
+
+
+# The Metrics instance the harvest reports to, or None when instrumentation is off. Hot paths check it once and skip
+# all of their bookkeeping when it is None.
+ACTIVE = None
+
+
+class Metrics:
+    """Collects hierarchical wall-clock timings and labelled counters for one run.
+
+    Timings are keyed by a '/'-separated stage path: stage() opens a nested stage for a block of code, and add_time()
+    records time measured by the caller under the stage that is currently open. A cProfile profiler can be switched on
+    for every Nth call of a hot function through sample_profiler(). Times and counts can be added from several
+    threads, e.g. the ones fetching catalogs at once; stages are only opened by the main thread.
+    """
+
+    def __init__(self, profile_every=0):
+        self.stack = list()
+        self.timings = dict()
+        self.counters = dict()
+        self.started = time.perf_counter()
+        self.profile_every = profile_every
+        self.profile_calls = 0
+        self.profiler = cProfile.Profile() if profile_every else None
+        self.lock = threading.Lock()
+
+    def path(self, name=None):
+        """Returns the path of the open stage, or of a stage named 'name' inside it."""
+
+        if name is None:
+            return "/".join(self.stack)
+        return "/".join(self.stack + [name])
+
+    def add_time(self, name, seconds, calls=1):
+        """Adds time to a stage inside the one that is open."""
+
+        path = self.path(name)
+        with self.lock:
+            timing = self.timings.setdefault(path, [0.0, 0])
+            timing[0] += seconds
+            timing[1] += calls
+
+    @contextmanager
+    def stage(self, name):
+        """Times a block of code as a stage nested in the one that is open."""
+
+        self.stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stack.pop()
+            self.add_time(name, elapsed)
+
+    def count(self, name, value=1, **labels):
+        """Adds to a counter, e.g. count("records", category="tycho")."""
+
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def merge(self, timings, counters):
+        """Adds the timings and counters of another Metrics, such as one a worker process collected, to this one. Its
+        stages are nested in the stage that is open here.
+        """
+
+        with self.lock:
+            for path, (seconds, calls) in timings.items():
+                timing = self.timings.setdefault(self.path(path), [0.0, 0])
+                timing[0] += seconds
+                timing[1] += calls
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def sample_profiler(self):
+        """Returns the profiler if this call should be profiled, or None."""
+
+        if self.profiler is None:
+            return None
+        self.profile_calls += 1
+        if self.profile_calls % self.profile_every:
+            return None
+        return self.profiler
+
+    def profile_stats(self, pattern="parse_|classify|check_", limit=25):
+        """Returns the profiled functions matching 'pattern', by cumulative time, as text."""
+
+        if self.profiler is None:
+            return ""
+        out = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=out)
+        stats.sort_stats("cumulative").print_stats(pattern, limit)
+        return out.getvalue()
+
+    def to_dict(self):
+        """Returns the timings and counters as a JSON-serializable dictionary."""
+
+        counters = dict()
+        for (name, labels), value in sorted(self.counters.items()):
+            counters.setdefault(name, list()).append({"labels": dict(labels), "value": value})
+
+        return {"elapsed_seconds": round(time.perf_counter() - self.started, 6),
+                "stages": {path: {"seconds": round(seconds, 6), "calls": calls}
+                           for path, (seconds, calls) in sorted(self.timings.items())},
+                "counters": counters}
+
+    def to_prometheus(self, prefix="dats"):
+        """Returns the timings and counters in the Prometheus text exposition format."""
+
+        lines = ["# TYPE {}_stage_seconds_total counter".format(prefix)]
+        for path, (seconds, calls) in sorted(self.timings.items()):
+            lines.append('{}_stage_seconds_total{{stage="{}"}} {:.6f}'.format(prefix, escape_label(path), seconds))
+        lines.append("# TYPE {}_stage_calls_total counter".format(prefix))
+        for path, (seconds, calls) in sorted(self.timings.items()):
+            lines.append('{}_stage_calls_total{{stage="{}"}} {}'.format(prefix, escape_label(path), calls))
+
+        names = sorted(set(name for name, labels in self.counters))
+        for name in names:
+            lines.append("# TYPE {}_{}_total counter".format(prefix, name))
+            for (counter_name, labels), value in sorted(self.counters.items()):
+                if counter_name != name:
+                    continue
+                label_text = ",".join('{}="{}"'.format(key, escape_label(value)) for key, value in labels)
+                lines.append("{}_{}_total{} {}".format(prefix, name, "{" + label_text + "}" if labels else "", value))
+        return "\n".join(lines) + "\n"
+
+    def write(self, fname=None, output_format="json"):
+        """Writes the metrics to a file, or to stderr if no file name is given."""
+
+        if output_format == "prometheus":
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.to_dict(), indent=2) + "\n"
+
+        if fname is None:
+            sys.stderr.write(text)
+        else:
+            with open(fname, "w", encoding="utf-8") as metrics_f:
+                metrics_f.write(text)
+
+
+def escape_label(value):
+    """Escapes a Prometheus label value."""
+
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def enable(profile_every=0):
+    """Turns instrumentation on for the rest of the run and returns the Metrics that collects it."""
+
+    global ACTIVE
+    ACTIVE = Metrics(profile_every)
+    return ACTIVE
+
+
+def disable():
+    """Turns instrumentation off."""
+
+    global ACTIVE
+    ACTIVE = None
+
+
+@contextmanager
+def stage(name):
+    """Times a block of code under the active Metrics, if there is one."""
+
+    if ACTIVE is None:
+        yield None
+    else:
+        with ACTIVE.stage(name) as metrics:
+            yield metrics
+
+
+def add_time(name, seconds, calls=1):
+    """Adds time to a stage of the active Metrics, if there is one."""
+
+    if ACTIVE is not None:
+        ACTIVE.add_time(name, seconds, calls)
+
+
+def count(name, value=1, **labels):
+    """Adds to a counter of the active Metrics, if there is one."""
+
+    if ACTIVE is not None:
+        ACTIVE.count(name, value, **labels)
@@ -0,0 +1,210 @@
+import io
+import json
+import time
+import zlib
+import sqlite3
+import argparse
+import threading
+import http.client
+import urllib.error
+import urllib.request
+import datetime as dt
+
+
+DEFAULT_FIXTURES = "dats-fixtures.sqlite"
+COMPRESSION_LEVEL = 6
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url TEXT PRIMARY KEY,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    recorded_at TEXT NOT NULL
+);
+"""
+
+
+def make_headers(pairs):
+    """Builds a response header object, with get_content_charset() and friends, from (name, value) pairs."""
+
+    headers = http.client.HTTPMessage()
+    for name, value in pairs:
+        headers[name] = value
+    return headers
+
+
+class FixtureArchive:
+    """Recorded API responses in a SQLite file, one row per URL with its status, headers, and zlib-compressed body.
+    Safe to share between the threads of a concurrent fetch.
+    """
+
+    def __init__(self, fname=DEFAULT_FIXTURES):
+        self.fname = fname
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(fname, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def lookup(self, url):
+        """Returns the status, headers, and body recorded for a URL, or None if it wasn't recorded."""
+
+        with self.lock:
+            found = self.conn.execute("SELECT status, headers, body FROM responses WHERE url = ?", (url,)).fetchone()
+        if found is None:
+            return None
+        status, headers, body = found
+        return status, make_headers(json.loads(headers)), zlib.decompress(body)
+
+    def store(self, url, status, headers, body):
+        """Records the response for a URL, replacing any earlier one."""
+
+        pairs = list(headers.items()) if headers is not None else list()
+        compressed = zlib.compress(body, COMPRESSION_LEVEL)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO responses (url, status, headers, body, size, recorded_at) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                              (url, status, json.dumps(pairs), compressed, len(body),
+                               dt.datetime.now().isoformat(timespec="seconds")))
+
+    def responses(self):
+        """Lists the URL, status, body size, compressed size, and recording time of every response."""
+
+        with self.lock:
+            return self.conn.execute("SELECT url, status, size, LENGTH(body), recorded_at FROM responses "
+                                     "ORDER BY url").fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class Recorder:
+    """Sends every request to the network and records its response. A 304 is passed through without being recorded,
+    since it has no body to replay.
+    """
+
+    mode = "record"
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.recorded = 0
+
+    def fetch(self, url, send):
+        """Calls 'send', which returns the status, headers, and body of the response for 'url', and records it."""
+
+        status, headers, body = send()
+        if status != 304:
+            self.archive.store(url, status, headers, body)
+            self.recorded += 1
+        return status, headers, body
+
+
+class Replayer:
+    """Serves every request from the archive, after 'latency' seconds, without touching the network. A URL that
+    wasn't recorded is answered with an empty 404, so callers neither retry it nor mistake it for a network error.
+    """
+
+    mode = "replay"
+
+    def __init__(self, archive, latency=0.0):
+        self.archive = archive
+        self.latency = latency
+        self.replayed = 0
+        self.missing = 0
+
+    def fetch(self, url, send):
+        """Returns the status, headers, and body recorded for 'url'; 'send' is never called."""
+
+        if self.latency:
+            time.sleep(self.latency)
+        found = self.archive.lookup(url)
+        if found is None:
+            self.missing += 1
+            return 404, make_headers([]), b""
+        self.replayed += 1
+        return found
+
+
+# The Recorder or Replayer requests go through, or None to use the network as usual
+ACTIVE = None
+
+
+def record(fname=DEFAULT_FIXTURES):
+    """Records every response for the rest of the run into a fixture archive, and returns the Recorder."""
+
+    global ACTIVE
+    ACTIVE = Recorder(FixtureArchive(fname))
+    return ACTIVE
+
+
+def replay(fname=DEFAULT_FIXTURES, latency=0.0):
+    """Serves every request for the rest of the run from a fixture archive, and returns the Replayer."""
+
+    global ACTIVE
+    ACTIVE = Replayer(FixtureArchive(fname), latency)
+    return ACTIVE
+
+
+def fetch(url, send):
+    """Returns the status, headers, and body of the response for a URL: from 'send' when neither recording nor
+    replaying, and through the active Recorder or Replayer otherwise.
+    """
+
+    if ACTIVE is None:
+        return send()
+    return ACTIVE.fetch(url, send)
+
+
+class RecordedResponse(io.BytesIO):
+    """A response body held in memory, with the status, headers, and url attributes of a urlopen response."""
+
+    def __init__(self, url, status, headers, body):
+        super().__init__(body)
+        self.url = url
+        self.status = status
+        self.headers = headers
+
+    def getcode(self):
+        return self.status
+
+
+def urlopen(request):
+    """Opens a urllib Request like urllib.request.urlopen, recording or replaying its response if either is on.
+    Statuses outside 2xx raise an HTTPError, as they do with urlopen.
+    """
+
+    if ACTIVE is None:
+        return urllib.request.urlopen(request)
+
+    def send():
+        try:
+            with urllib.request.urlopen(request) as rhand:
+                return rhand.status, rhand.headers, rhand.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    url = request.full_url
+    status, headers, body = ACTIVE.fetch(url, send)
+    if not 200 <= status < 300:
+        raise urllib.error.HTTPError(url, status, http.client.responses.get(status, ""), headers, io.BytesIO(body))
+    return RecordedResponse(url, status, headers, body)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Lists the API responses recorded in a fixture archive.")
+    arg_parser.add_argument("fixtures", nargs="?", default=DEFAULT_FIXTURES)
+    args = arg_parser.parse_args()
+
+    archive = FixtureArchive(args.fixtures)
+    total_size = 0
+    total_compressed = 0
+    for url, status, size, compressed, recorded_at in archive.responses():
+        print(status, size, compressed, recorded_at, url, sep="\t")
+        total_size += size
+        total_compressed += compressed
+    print(len(archive), "responses,", total_size, "bytes compressed to", total_compressed)
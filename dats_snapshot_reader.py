@@ -0,0 +1,319 @@
+import os
+import csv
+import mmap
+import glob
+import argparse
+
+import dats_diff
+import dats_snapshot_store
+
+
+# latin-1 maps every byte to a character, so values round-trip unchanged whatever encoding they were written in
+DEFAULT_ENCODING = "latin-1"
+
+
+def decode_field(field, encoding=DEFAULT_ENCODING):
+    """Decodes the bytes of a field, and unquotes one that starts with a quote the way csv does, turning doubled
+    quotes into single ones.
+    """
+
+    value = field.decode(encoding)
+    if value[:1] == '"':
+        return next(csv.reader([value], dialect="excel-tab"))[0]
+    return value
+
+
+class SnapshotReader:
+    """Random access to the rows of a '*-dats-info-*.txt' snapshot without reading it all. The file is memory-mapped
+    and indexed once: where every row starts and ends, and, on the first lookup, which row holds each identifier. A
+    value is only decoded when it is asked for, so reading one column of a few rows never touches the long
+    'description' of the others.
+
+    Rows are read as csv's excel-tab dialect reads them: blank lines are skipped, a quoted field may hold line
+    breaks, and it is unquoted when it is decoded. The rare row whose quotes hold tabs can't be split on them, so it is
+    handed to the csv module whole. Short rows read as None in their missing columns, as they do to csv.DictReader.
+    Columns can be asked for by today's names or by the camelCase ones of older snapshots (see
+    dats_diff.COLUMN_ALIASES).
+    """
+
+    def __init__(self, fname, encoding=DEFAULT_ENCODING):
+        self.fname = fname
+        self.encoding = encoding
+        self.file = open(fname, "rb")
+        if os.fstat(self.file.fileno()).st_size:
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b""
+        self.starts = list()
+        self.ends = list()
+        self.quoted = set()
+        self.keys = None
+        self.next_cr = self.next_lf = -1
+        self.index_rows()
+
+        # The first record is the header
+        self.fieldnames = list()
+        if self.starts:
+            self.fieldnames = self.fields(0)
+            del self.starts[0], self.ends[0]
+            self.quoted = {index - 1 for index in self.quoted if index}
+
+        # A name that heads several columns means the last of them, as it does to csv.DictReader
+        self.positions = {name: position for position, name in enumerate(self.fieldnames)}
+        for old_name, name in dats_diff.COLUMN_ALIASES.items():
+            if old_name in self.positions:
+                self.positions.setdefault(name, self.positions[old_name])
+            elif name in self.positions:
+                self.positions.setdefault(old_name, self.positions[name])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def line_end(self, pos):
+        """Returns where the line that starts at 'pos' ends, after its line break. Like a file opened with newline='',
+        which is how csv reads snapshots, a line ends at '\n', '\r', or '\r\n'. The next of each is remembered, so
+        scanning a file whose lines all end the same way doesn't search for the other one again and again.
+        """
+
+        data = self.data
+        size = len(data)
+        if self.next_cr < pos:
+            self.next_cr = data.find(b"\r", pos)
+            if self.next_cr < 0:
+                self.next_cr = size
+        if self.next_lf < pos:
+            self.next_lf = data.find(b"\n", pos)
+            if self.next_lf < 0:
+                self.next_lf = size
+        if self.next_cr < self.next_lf:
+            return self.next_cr + 2 if self.next_lf == self.next_cr + 1 else self.next_cr + 1
+        return min(self.next_lf + 1, size)
+
+    def index_rows(self):
+        """Finds where every record, the header included, starts and ends, leaving out its line break."""
+
+        data = self.data
+        size = len(data)
+        pos = 0
+        self.next_cr = self.next_lf = -1
+
+        while pos < size:
+            end = self.line_end(pos)
+            quoted = data.find(b'"', pos, end) >= 0
+            if quoted:
+                end, fields = self.quoted_record(pos)
+
+            content_end = end
+            while content_end > pos and data[content_end - 1] in b"\r\n":
+                content_end -= 1
+            # The first line is the header even if it is blank, as it is to csv.DictReader
+            if content_end > pos or pos == 0:
+                if quoted and len(fields) != data[pos:content_end].count(b"\t") + 1:
+                    self.quoted.add(len(self.starts))
+                self.starts.append(pos)
+                self.ends.append(content_end)
+            pos = end
+
+    def quoted_record(self, pos):
+        """Returns where the record that starts at 'pos' ends, letting the csv module decide which of the line breaks
+        after it are inside quotes, and the fields csv reads from it.
+        """
+
+        data = self.data
+        size = len(data)
+        end = [pos]
+
+        def lines():
+            while end[0] < size:
+                stop = self.line_end(end[0])
+                line = data[end[0]:stop].decode(self.encoding)
+                end[0] = stop
+                yield line
+
+        fields = next(csv.reader(lines(), dialect="excel-tab"), list())
+        return end[0], fields
+
+    def fields(self, index):
+        """Decodes every field of a record with the csv module. Only used for the header and for rows whose quotes
+        hold tabs.
+        """
+
+        text = self.data[self.starts[index]:self.ends[index]].decode(self.encoding)
+        return next(csv.reader([text], dialect="excel-tab"), list())
+
+    def position(self, column):
+        """Returns the position of a column, and raises a KeyError if the snapshot doesn't have it."""
+
+        return self.positions[column]
+
+    def field_span(self, index, position):
+        """Returns where a field of a row that splits on tabs starts and ends, or None if the row is too short to have
+        it.
+        """
+
+        data = self.data
+        start, end = self.starts[index], self.ends[index]
+        for _ in range(position):
+            tab = data.find(b"\t", start, end)
+            if tab < 0:
+                return None
+            start = tab + 1
+        tab = data.find(b"\t", start, end)
+        return start, end if tab < 0 else tab
+
+    def value(self, index, column):
+        """Decodes one value of a row, or returns None if the row is too short to have it."""
+
+        position = self.position(column)
+        if index in self.quoted:
+            fields = self.fields(index)
+            return fields[position] if position < len(fields) else None
+
+        span = self.field_span(index, position)
+        if span is None:
+            return None
+        return decode_field(self.data[span[0]:span[1]], self.encoding)
+
+    def row(self, index, columns=None):
+        """Decodes the given columns of a row, every column by default, into a dictionary keyed by the names they
+        were asked for by.
+        """
+
+        if columns is None:
+            columns = self.fieldnames
+        positions = [self.position(column) for column in columns]
+        wanted = set(positions)
+
+        if index in self.quoted:
+            fields = self.fields(index)
+        elif len(positions) == 1:
+            return {columns[0]: self.value(index, columns[0])}
+        else:
+            fields = self.data[self.starts[index]:self.ends[index]].split(b"\t")
+            fields = [decode_field(field, self.encoding) if position in wanted else None
+                      for position, field in enumerate(fields)]
+        return {column: fields[position] if position < len(fields) else None
+                for column, position in zip(columns, positions)}
+
+    def rows(self, columns=None):
+        """Yields the given columns of every row, as row() decodes them."""
+
+        for index in range(len(self)):
+            yield self.row(index, columns)
+
+    def columns(self, columns):
+        """Decodes the given columns of every row into lists, in a dictionary keyed by the names they were asked for
+        by. Each row is split once, from the first of the columns on.
+        """
+
+        positions = [self.position(column) for column in columns]
+        first, last = min(positions), max(positions)
+        data = self.data
+        encoding = self.encoding
+        quoted = self.quoted
+        lists = [list() for _ in columns]
+
+        for index, (start, end) in enumerate(zip(self.starts, self.ends)):
+            if index in quoted:
+                row = self.row(index, columns)
+                for values, column in zip(lists, columns):
+                    values.append(row[column])
+                continue
+
+            for _ in range(first):
+                tab = data.find(b"\t", start, end)
+                if tab < 0:
+                    start = end + 1
+                    break
+                start = tab + 1
+            if start > end:
+                fields = list()
+            elif first == last:
+                tab = data.find(b"\t", start, end)
+                fields = [data[start:end if tab < 0 else tab]]
+            else:
+                fields = data[start:end].split(b"\t", last - first + 1)
+
+            for values, position in zip(lists, positions):
+                offset = position - first
+                values.append(decode_field(fields[offset], encoding) if offset < len(fields) else None)
+        return dict(zip(columns, lists))
+
+    def column(self, column):
+        """Decodes one column of every row into a list."""
+
+        return self.columns([column])[column]
+
+    def key_index(self):
+        """Returns a dictionary that maps the identifier of every row to its index, building it on first use. The
+        identifiers are those dats_snapshot_store files the rows under, so repeated ones get an occurrence suffix.
+        """
+
+        if self.keys is None:
+            columns = [column for column in dats_snapshot_store.IDENTIFIER_COLUMNS if column in self.fieldnames]
+            fallback = [column for column in ("title", "name") if column in self.fieldnames]
+            identifiers = zip(*[self.column(column) for column in columns]) if columns else [()] * len(self)
+
+            self.keys = dict()
+            for index, values in enumerate(identifiers):
+                row = dict(zip(columns, values))
+                # Only the rows without an identifier are keyed by their title, so only theirs is decoded
+                if not any(value and value != "null" for value in values):
+                    row = self.row(index, fallback)
+                self.keys[dats_snapshot_store.row_key(row, self.keys)] = index
+        return self.keys
+
+    def lookup(self, identifier, columns=None):
+        """Decodes the given columns of the row for an identifier, or returns None if the snapshot has no such row."""
+
+        index = self.key_index().get(identifier)
+        if index is None:
+            return None
+        return self.row(index, columns)
+
+
+def identifier_history(directory, identifier, columns=None):
+    """Looks an identifier up in every snapshot in a '*-dats-info' directory, oldest first, and returns a list of
+    (harvest timestamp, row) pairs with the given columns of its row, or None for the row in harvests without it.
+    Snapshots that don't have one of the columns are skipped.
+    """
+
+    fnames = [fname for fname in glob.glob(os.path.join(directory, "*"))
+              if dats_snapshot_store.snapshot_timestamp(fname) is not None]
+    history = list()
+    for fname in sorted(fnames, key=dats_snapshot_store.snapshot_timestamp):
+        with SnapshotReader(fname) as reader:
+            try:
+                row = reader.lookup(identifier, columns)
+            except KeyError:
+                continue
+        history.append((dats_snapshot_store.snapshot_timestamp(fname), row))
+    return history
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Shows the values an identifier had in every harvest of a "
+                                                     "snapshot directory.")
+    arg_parser.add_argument("directory", help="'*-dats-info' directory, e.g. tycho-dats-info")
+    arg_parser.add_argument("identifier", help="dataset identifier, or 'title:<title>' for rows without one")
+    arg_parser.add_argument("-c", "--column", action="append", dest="columns",
+                            help="column to show; give it several times for several columns (default: title)")
+    args = arg_parser.parse_args()
+
+    columns = args.columns or ["title"]
+    for harvested_at, row in identifier_history(args.directory, args.identifier, columns):
+        if row is None:
+            print(harvested_at, "(not harvested)", sep="\t")
+        else:
+            print(harvested_at, *(row[column] for column in columns), sep="\t")
@@ -0,0 +1,179 @@
+import os
+import re
+import csv
+import glob
+import json
+import sqlite3
+
+
+DEFAULT_STORE = "dats-snapshots.sqlite"
+SNAPSHOT_TIMESTAMP = re.compile(r"(\d{4})[-_](\d{2})-(\d{2})_T(\d{2})-(\d{2})")
+IDENTIFIER_COLUMNS = ("dataset_identifier", "datasetIdentifier", "identifier")
+
+# The harvest names some categories differently from the '*-dats-info' directories that hold their history
+HISTORY_CATEGORIES = {"infectious-disease": "infectious-disease-scenario",
+                      "websites-with-data": "web-data"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS harvests (
+    category TEXT NOT NULL,
+    harvested_at TEXT NOT NULL,
+    source TEXT,
+    fieldnames TEXT NOT NULL,
+    PRIMARY KEY (category, harvested_at)
+);
+CREATE TABLE IF NOT EXISTS records (
+    category TEXT NOT NULL,
+    harvested_at TEXT NOT NULL,
+    identifier TEXT NOT NULL,
+    row_number INTEGER NOT NULL,
+    row TEXT NOT NULL,
+    PRIMARY KEY (category, harvested_at, identifier)
+);
+"""
+
+
+def open_store(fname=DEFAULT_STORE):
+    """Opens the snapshot store, creating its tables if needed, and returns the SQLite connection."""
+
+    conn = sqlite3.connect(fname)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def snapshot_timestamp(fname):
+    """Parses the harvest timestamp out of a snapshot file name and returns it as 'YYYY-MM-DDTHH:MM', or None if
+    the name has no timestamp. Handles the older '_2017-05-15_T14-41' and '_2017_05-15_T14-56' spellings too.
+    """
+
+    match = SNAPSHOT_TIMESTAMP.search(os.path.basename(fname))
+    if match is None:
+        return None
+    return "{}-{}-{}T{}:{}".format(*match.groups())
+
+
+def snapshot_category(fname):
+    """Returns the category of a snapshot file, which is the name of its '*-dats-info' directory without the suffix."""
+
+    directory = os.path.basename(os.path.dirname(os.path.abspath(fname)))
+    if directory.endswith("-dats-info"):
+        return directory[:-len("-dats-info")]
+    return directory
+
+
+def history_category(category):
+    """Returns the category that the history files a harvest category's snapshots under, which is the name of its
+    '*-dats-info' directory without the suffix.
+    """
+
+    return HISTORY_CATEGORIES.get(category, category)
+
+
+def row_key(row, seen):
+    """Returns the identifier a snapshot row is stored under: its dataset identifier, or its title when it has none.
+    Repeated keys within one snapshot get an occurrence suffix.
+    """
+
+    key = ""
+    for column in IDENTIFIER_COLUMNS:
+        if row.get(column) and row[column] != "null":
+            key = row[column]
+            break
+    if not key:
+        key = "title:" + (row.get("title") or row.get("name") or "")
+
+    if key in seen:
+        occurrence = 2
+        while "{}#{}".format(key, occurrence) in seen:
+            occurrence += 1
+        key = "{}#{}".format(key, occurrence)
+    return key
+
+
+def import_rows(conn, category, harvested_at, fieldnames, rows, source=None):
+    """Adds one harvest of a category to the store. Returns the number of rows stored, or 0 if that harvest was
+    already in the store.
+    """
+
+    with conn:
+        try:
+            conn.execute("INSERT INTO harvests (category, harvested_at, source, fieldnames) VALUES (?, ?, ?, ?)",
+                         (category, harvested_at, source, json.dumps(fieldnames)))
+        except sqlite3.IntegrityError:
+            return 0
+
+        seen = set()
+        records = list()
+        for row_number, row in enumerate(rows):
+            key = row_key(row, seen)
+            seen.add(key)
+            records.append((category, harvested_at, key, row_number, json.dumps(row, ensure_ascii=False)))
+
+        conn.executemany("INSERT INTO records (category, harvested_at, identifier, row_number, row) "
+                         "VALUES (?, ?, ?, ?, ?)", records)
+    return len(records)
+
+
+def import_snapshot(conn, fname):
+    """Imports a '*-dats-info-*.txt' snapshot file into the store. Returns the number of rows stored."""
+
+    harvested_at = snapshot_timestamp(fname)
+    if harvested_at is None:
+        return 0
+
+    # latin-1 maps every byte to a character, so rows round-trip unchanged whatever encoding they were written in
+    with open(fname, encoding="latin-1", newline="") as t_name:
+        reader = csv.DictReader(t_name, dialect="excel-tab")
+        rows = list(reader)
+        fieldnames = reader.fieldnames or list()
+
+    return import_rows(conn, snapshot_category(fname), harvested_at, fieldnames, rows, source=fname)
+
+
+def import_history(conn, root="."):
+    """Imports every snapshot in the '*-dats-info' directories under 'root' that isn't in the store yet. Returns the
+    number of rows stored.
+    """
+
+    imported = 0
+    for fname in sorted(glob.glob(os.path.join(root, "*-dats-info", "*.txt"))):
+        imported += import_snapshot(conn, fname)
+    return imported
+
+
+def categories(conn):
+    """Lists the categories in the store."""
+
+    return [category for (category,) in conn.execute("SELECT DISTINCT category FROM harvests ORDER BY category")]
+
+
+def harvests(conn, category):
+    """Lists the harvest timestamps stored for a category, oldest first."""
+
+    return [harvested_at for (harvested_at,) in conn.execute(
+        "SELECT harvested_at FROM harvests WHERE category = ? ORDER BY harvested_at", (category,))]
+
+
+def latest_harvest(conn, category):
+    """Returns the timestamp of the newest harvest of a category, or None if it has none."""
+
+    (harvested_at,) = conn.execute("SELECT MAX(harvested_at) FROM harvests WHERE category = ?", (category,)).fetchone()
+    return harvested_at
+
+
+def harvest_rows(conn, category, harvested_at=None):
+    """Returns the rows of one harvest of a category in their original order, defaulting to the newest harvest."""
+
+    if harvested_at is None:
+        harvested_at = latest_harvest(conn, category)
+    cursor = conn.execute("SELECT row FROM records WHERE category = ? AND harvested_at = ? ORDER BY row_number",
+                          (category, harvested_at))
+    return [json.loads(row) for (row,) in cursor]
+
+
+if __name__ == "__main__":
+    store = open_store()
+    print("Imported", import_history(store), "rows into", DEFAULT_STORE)
+    for category in categories(store):
+        print("\t", category + ": ", len(harvests(store, category)), "harvests, latest",
+              latest_harvest(store, category))
@@ -0,0 +1,104 @@
+import os
+from csv import DictWriter
+
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class SnapshotSink:
+    """A tab-delimited snapshot file that is written through a large buffer to a temporary file next to its final
+    name, and only renamed into place once it is committed. A crash leaves the previous file, if any, untouched.
+    """
+
+    def __init__(self, fname, fieldnames, buffer_size=WRITE_BUFFER_SIZE):
+        self.fname = fname
+        self.tmp_fname = "{}.{}.tmp".format(fname, os.getpid())
+        self.rows = 0
+        self.bytes = 0
+
+        self.file = open(self.tmp_fname, "w", buffering=buffer_size)
+        self.dict_writer = DictWriter(self.file, fieldnames=fieldnames, delimiter="\t")
+        self.dict_writer.writeheader()
+
+    def write(self, row):
+        """Writes one row."""
+
+        self.dict_writer.writerow(row)
+        self.rows += 1
+
+    def commit(self):
+        """Flushes the file and atomically replaces the snapshot with it."""
+
+        self.file.close()
+        self.bytes = os.path.getsize(self.tmp_fname)
+        os.replace(self.tmp_fname, self.fname)
+
+    def abort(self):
+        """Discards everything written so far."""
+
+        self.file.close()
+        try:
+            os.remove(self.tmp_fname)
+        except OSError:
+            pass
+
+
+class SnapshotWriter:
+    """Writes a set of snapshot files, for example one per dataset category, from a single pass over the parsed rows.
+    Every sink stays open for the whole pass, and they are all committed together at the end or all discarded if the
+    pass fails. A name can have several sinks, e.g. a text snapshot and a columnar copy of it.
+    """
+
+    def __init__(self, buffer_size=WRITE_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.sinks = list()
+        self.routes = dict()
+
+    def add_sink(self, name, fname, fieldnames, sink_class=SnapshotSink):
+        """Opens a sink that the rows for 'name' are written to."""
+
+        if sink_class is SnapshotSink:
+            sink = SnapshotSink(fname, fieldnames, self.buffer_size)
+        else:
+            sink = sink_class(fname, fieldnames)
+        self.sinks.append((name, sink))
+        self.routes.setdefault(name, list()).append(sink)
+        return sink
+
+    def write(self, name, row):
+        """Writes a row to every sink for 'name'."""
+
+        for sink in self.routes[name]:
+            sink.write(row)
+
+    def rows(self, name):
+        """Returns the number of rows written for 'name'."""
+
+        return self.routes[name][0].rows
+
+    def commit(self):
+        """Commits every sink and returns the report."""
+
+        for name, sink in self.sinks:
+            sink.commit()
+        return self.report()
+
+    def abort(self):
+        """Discards every sink."""
+
+        for name, sink in self.sinks:
+            sink.abort()
+
+    def report(self):
+        """Returns the name, file name, rows written, and bytes written of every sink."""
+
+        return [{"name": name, "fname": sink.fname, "rows": sink.rows, "bytes": sink.bytes}
+                for name, sink in self.sinks]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        return False
@@ -0,0 +1,56 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "check-json-for-changes.py")
+
+
+class DataFormatsCheckTest(unittest.TestCase):
+    """Runs the checker in batch mode against a saved contents dump and a data-formats snapshot in a scratch
+    directory.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.root, "data-formats-dats-info"))
+        with open(os.path.join(self.root, "contents.json"), "w", encoding="utf-8") as contents_f:
+            json.dump([{"content": {"identifier": {"identifier": "other"}}}], contents_f)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def write_snapshot(self, rows):
+        fname = os.path.join(self.root, "data-formats-dats-info", "data-formats-dats-info-2020-01-02_T03-04.txt")
+        with open(fname, "w", encoding="latin-1") as snapshot_f:
+            snapshot_f.write("identifier\tname\n")
+            for row in rows:
+                snapshot_f.write("\t".join(row) + "\n")
+
+    def check(self):
+        return subprocess.run([sys.executable, SCRIPT, "--check", "data formats", "--batch", "--contents",
+                               "contents.json"], cwd=self.root, capture_output=True, text=True, timeout=60)
+
+    def test_rows_without_an_identifier_are_reported(self):
+        self.write_snapshot([("null", "Unnamed"), ("", "Blank"), ("gone", "Removed")])
+        result = self.check()
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("No identifier stored for  Unnamed  in data-formats", result.stdout)
+        self.assertIn("No identifier stored for  Blank  in data-formats", result.stdout)
+        self.assertIn("404 not found for  gone", result.stdout)
+
+    def test_unreleased_records_are_skipped(self):
+        self.write_snapshot([("identifier will be created at time of release", "Upcoming"), ("gone", "Removed")])
+        result = self.check()
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertNotIn("Upcoming", result.stdout)
+        self.assertNotIn("time of release", result.stdout)
+        self.assertIn("404 not found for  gone", result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+import json
+import time
+import socket
+import threading
+import unittest
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import dats_http
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers the stub server's requests from the paths below, and notes the path and client port of each one."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, self.client_address[1]))
+            count = sum(path == self.path for path, port in server.requests)
+
+        if self.path == "/ok":
+            self.reply(200, {"ok": True})
+        elif self.path == "/flaky" and count <= 2:
+            # Fails twice before it answers
+            self.reply(503, {"error": "unavailable"})
+        elif self.path == "/flaky":
+            self.reply(200, {"attempt": count})
+        elif self.path == "/down":
+            self.reply(500, {"error": "down"})
+        elif self.path == "/missing":
+            self.reply(404, {"error": "not found"})
+        elif self.path == "/slow":
+            time.sleep(0.5)
+            self.reply(200, {"slow": True})
+        elif self.path == "/moved":
+            self.reply(301, None, {"Location": "/ok"})
+        elif self.path == "/loop":
+            self.reply(302, None, {"Location": "/loop"})
+        elif self.path == "/no-location":
+            self.reply(302, None)
+        else:
+            self.reply(404, None)
+
+    def reply(self, status, data, headers=None):
+        body = json.dumps(data).encode("utf-8") if data is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or dict()).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # The client hangs up on the slow path before it is answered
+        pass
+
+
+class FetchTest(unittest.TestCase):
+    """Runs dats_http against a stub HTTP server on localhost."""
+
+    def setUp(self):
+        self.server = StubServer(("127.0.0.1", 0), StubHandler)
+        self.server.lock = threading.Lock()
+        self.server.requests = list()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = "http://127.0.0.1:{}".format(self.server.server_address[1])
+        self.pool = dats_http.ConnectionPool(timeout=5)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def fetch(self, path, **kwargs):
+        return dats_http.fetch_json(self.pool, self.base_url + path, {"Accept": "application/json"}, backoff=0.01,
+                                    **kwargs)
+
+    def requested(self, path):
+        return [port for requested_path, port in self.server.requests if requested_path == path]
+
+    def test_5xx_is_retried_with_backoff(self):
+        start = time.perf_counter()
+        self.assertEqual(self.fetch("/flaky"), {"attempt": 3})
+        self.assertEqual(len(self.requested("/flaky")), 3)
+        # Two retries, after 0.01 and 0.02 seconds
+        self.assertGreaterEqual(time.perf_counter() - start, 0.03)
+
+    def test_5xx_raises_once_retries_run_out(self):
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            self.fetch("/down", retries=2)
+        self.assertEqual(raised.exception.code, 500)
+        self.assertEqual(len(self.requested("/down")), 3)
+
+    def test_4xx_raises_without_retrying(self):
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            self.fetch("/missing")
+        self.assertEqual(raised.exception.code, 404)
+        self.assertEqual(len(self.requested("/missing")), 1)
+
+    def test_timeout_raises(self):
+        self.pool = dats_http.ConnectionPool(timeout=0.1)
+        with self.assertRaises(socket.timeout):
+            self.fetch("/slow", retries=1)
+        self.assertEqual(len(self.requested("/slow")), 2)
+
+    def test_connection_is_reused(self):
+        for _ in range(3):
+            self.assertEqual(self.fetch("/ok"), {"ok": True})
+        self.assertEqual(len(set(self.requested("/ok"))), 1)
+
+    def test_connection_is_replaced_after_a_failure(self):
+        self.pool = dats_http.ConnectionPool(timeout=0.1)
+        with self.assertRaises(socket.timeout):
+            self.fetch("/slow", retries=0)
+        self.assertEqual(self.fetch("/ok"), {"ok": True})
+
+    def test_redirect_is_followed(self):
+        self.assertEqual(self.fetch("/moved"), {"ok": True})
+        self.assertEqual(len(self.requested("/moved")), 1)
+        self.assertEqual(len(self.requested("/ok")), 1)
+
+    def test_redirect_loop_raises(self):
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            self.fetch("/loop")
+        self.assertEqual(raised.exception.code, 302)
+        self.assertEqual(len(self.requested("/loop")), dats_http.MAX_REDIRECTS + 1)
+
+    def test_redirect_without_location_raises(self):
+        with self.assertRaises(urllib.error.HTTPError):
+            self.fetch("/no-location")
+
+    def test_fetch_all_returns_data_or_error_per_url(self):
+        urls = [self.base_url + "/ok", self.base_url + "/missing", self.base_url + "/ok"]
+        results = dats_http.fetch_all(urls, {"Accept": "application/json"}, max_workers=2, backoff=0.01)
+        self.assertEqual(results[self.base_url + "/ok"], ({"ok": True}, None))
+        data, error = results[self.base_url + "/missing"]
+        self.assertIsNone(data)
+        self.assertEqual(error.code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
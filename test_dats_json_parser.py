@@ -0,0 +1,37 @@
+import io
+import json
+import unittest
+
+import dats_json_parser
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    """Decodes arrays with iter_json_array in chunks small enough to cut every token, and checks them against
+    json.loads.
+    """
+
+    def decode(self, text, chunk_size):
+        return list(dats_json_parser.iter_json_array(io.BytesIO(text.encode("utf-8")), "utf-8", chunk_size))
+
+    def test_valid_arrays_match_json_loads(self):
+        for text in ("[]", " [ ] \n", "[1.5, -2e3, 3]", '[{"a": [1, 2]}, "x", true, null, false]',
+                     '["\\u00e9\\ud834\\udd1e", {"b": "c\\"d"}]', "[-Infinity, 12345678901234567890]"):
+            for chunk_size in range(1, 9):
+                self.assertEqual(self.decode(text, chunk_size), json.loads(text), (text, chunk_size))
+
+    def test_malformed_arrays_raise(self):
+        for text in ("[1,,2]", "[1 2]", "[1,]", "[,1]", "[1] x", "[1][2]", '{"a": 1}', "[1,", "[tru]"):
+            for chunk_size in (1, 3, 4096):
+                with self.assertRaises(json.JSONDecodeError, msg=(text, chunk_size)):
+                    self.decode(text, chunk_size)
+
+    def test_malformed_element_fails_before_the_end_of_the_stream(self):
+        text = '[{"a": 1}, {"a" 1}, ' + ", ".join('{"b": 2}' for _ in range(10000)) + "]"
+        dump_f = io.BytesIO(text.encode("utf-8"))
+        with self.assertRaises(json.JSONDecodeError):
+            list(dats_json_parser.iter_json_array(dump_f, "utf-8", 1024))
+        self.assertLess(dump_f.tell(), len(text))
+
+
+if __name__ == "__main__":
+    unittest.main()